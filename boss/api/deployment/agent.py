@@ -0,0 +1,96 @@
+'''
+Remote release agent.
+
+The release agent (misc/release_agent.py) is uploaded to the remote host
+once for each version of it, and is then run to do multiple remote
+operations of a deployment in a single round trip.
+'''
+
+import json
+from pipes import quote
+
+from boss import BASE_PATH
+from boss.api import fs, runner
+from boss.core import hashing
+from boss.core.output import halt
+from boss.core.util.string import strip_ansi
+
+AGENT_SCRIPT = BASE_PATH + '/misc/release_agent.py'
+AGENT_DIRECTORY = '/.boss'
+
+# Exit codes of the agent command if the agent is yet to be uploaded,
+# or if there's no python on the remote to run it with.
+AGENT_MISSING = 90
+PYTHON_MISSING = 91
+
+# The agent prints its result after this marker, as the login shell could
+# print other things (eg: from the profile scripts) before it.
+RESULT_MARKER = '__boss_agent_result__'
+
+AGENT_CMD = (
+    '[ -f {agent} ] || exit {agent_missing}; '
+    'PY=$(command -v python3 || command -v python) || exit {python_missing}; '
+    '$PY {agent} {command} {payload}'
+)
+
+
+def get_agent_path(deploy_dir):
+    '''
+    Get the remote path of the agent, which is versioned
+    by the contents of the agent script.
+    '''
+    with open(AGENT_SCRIPT, 'rb') as f:
+        version = hashing.md5(f.read())[:8]
+
+    return '{}{}/release-agent-{}.py'.format(deploy_dir, AGENT_DIRECTORY, version)
+
+
+def upload(deploy_dir):
+    ''' Upload the agent to the remote host. '''
+    agent_path = get_agent_path(deploy_dir)
+
+    fs.mkdir(deploy_dir + AGENT_DIRECTORY, nested=True)
+    fs.upload(AGENT_SCRIPT, agent_path)
+
+
+def parse_result(output):
+    ''' Parse the JSON result printed by the agent after the marker. '''
+    (_, marker, data) = strip_ansi(output).rpartition(RESULT_MARKER)
+
+    if not marker:
+        raise ValueError('No result printed by the release agent')
+
+    return json.loads(data.strip())
+
+
+def run(deploy_dir, command, payload):
+    '''
+    Run an agent command on the remote host and return its result,
+    uploading the agent first if it hasn't been uploaded yet.
+    Returns None if the agent couldn't be run on the remote host.
+    '''
+    cmd = AGENT_CMD.format(
+        agent=get_agent_path(deploy_dir),
+        command=command,
+        payload=quote(json.dumps(payload)),
+        agent_missing=AGENT_MISSING,
+        python_missing=PYTHON_MISSING
+    )
+    result = runner.run(cmd, quiet=True)
+
+    if result.return_code == AGENT_MISSING:
+        upload(deploy_dir)
+        result = runner.run(cmd, quiet=True)
+
+    if result.return_code == PYTHON_MISSING:
+        return None
+
+    try:
+        data = parse_result(result)
+    except ValueError:
+        halt('Failed running the release agent: {}'.format(result))
+
+    if result.return_code != 0:
+        halt('Failed running the release agent: {}'.format(data.get('error')))
+
+    return data
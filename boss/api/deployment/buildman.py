@@ -7,21 +7,34 @@ import json
 import time
 from datetime import datetime
 
-from terminaltables import SingleTable
-from fabric.api import cd, hide, shell_env
+from fabric.api import cd, hide
 
-from boss import BASE_PATH, __version__ as BOSS_VERSION
-from boss.config import get as get_config, get_stage_config
+from boss import BASE_PATH, state, __version__ as BOSS_VERSION
+from boss.config import get as get_config, get_stage_config, inject_secrets
+from boss.constants import BOSS_BUILD_CACHE_PATH
 from boss.util import remote_info, remote_print
-from boss.api import fs, shell, runner
-from boss.core import env
+from boss.api import fs, shell, runner, git
+from boss.core import env, cache, hashing
 from boss.core.util import ts
-from boss.core.output import info
+from boss.core.output import info, warn
 from boss.core.util.object import merge
 from boss.core.util.colors import green, cyan
 from boss.core.constants import presets, known_scripts
+from . import agent
 
 LOCAL_BUILD_DIRECTORIES = ['build/', 'dist/']
+LOCKFILES = [
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml'
+]
+BUILD_SCRIPTS = [
+    known_scripts.PRE_INSTALL, known_scripts.INSTALL, known_scripts.POST_INSTALL,
+    known_scripts.PRE_BUILD, known_scripts.BUILD, known_scripts.POST_BUILD
+]
+# Env vars that change between the shell sessions and don't affect the build.
+VOLATILE_ENV_VARS = [
+    '_', 'PWD', 'OLDPWD', 'SHLVL', 'TERM_SESSION_ID', 'WINDOWID',
+    'SSH_AUTH_SOCK', 'SSH_AGENT_PID', 'SSH_CLIENT', 'SSH_CONNECTION', 'SSH_TTY'
+]
 INITIAL_BUILD_HISTORY = {
     'bossVersion': BOSS_VERSION,
     'preset': None,
@@ -30,8 +43,12 @@ INITIAL_BUILD_HISTORY = {
 }
 BUILDS_DIRECTORY = '/builds'
 BUILDS_META_FILE = '/builds.json'
+MANIFEST_FILE = '/manifest.json'
 CURRENT_BUILD_LINK = '/current'
+STAGING_DIRECTORY = '/.boss/pipeline'
 DEFAULT_HTML_PATH = '/default_html'
+# The phases of a deployment that are timed, in the order they're run.
+TIMED_PHASES = ['build', 'compress', 'upload', 'extract', 'install', 'reload']
 TS_FORMAT = '%Y-%m-%d %H:%M:%S (UTC)'
 TS_FORMAT_LOCAL = '%Y-%m-%d %I:%M:%S %p'
 
@@ -75,11 +92,21 @@ def get_current_path():
     return get_deploy_dir() + CURRENT_BUILD_LINK
 
 
+def get_staging_dir():
+    ''' Get the directory of the builds staged in the pipeline mode. '''
+    return get_deploy_dir() + STAGING_DIRECTORY
+
+
 def get_builds_file():
     ''' Get the build metadata file. '''
     return get_deploy_dir() + BUILDS_META_FILE
 
 
+def get_manifest_file():
+    ''' Get the manifest file of the current release. '''
+    return get_deploy_dir() + MANIFEST_FILE
+
+
 def get_build_name(id):
     ''' Get build name using id. '''
     return 'build-{id}'.format(id=id)
@@ -98,6 +125,28 @@ def save_history(data):
     fs.save_remote_file(get_builds_file(), json.dumps(data))
 
 
+def load_manifest():
+    '''
+    Load the manifest of the last uploaded release.
+    Returns None if no manifest has been recorded yet.
+    '''
+    manifest_file = get_manifest_file()
+
+    with hide('everything'):
+        if not fs.exists(manifest_file):
+            return None
+
+        data = fs.read_remote_file(manifest_file)
+
+        return json.loads(data)
+
+
+def save_manifest(data):
+    ''' Save the manifest of the last uploaded release. '''
+    with hide('everything'):
+        fs.save_remote_file(get_manifest_file(), json.dumps(data))
+
+
 def local_timestamp(timestamp, tz=True):
     '''
     Get the corresponding local timestamp for the
@@ -110,8 +159,57 @@ def local_timestamp(timestamp, tz=True):
     return timestamp_local.strftime(TS_FORMAT_LOCAL) + tz_name
 
 
+def get_deploy_timings():
+    '''
+    Get the timings of the deployment in progress on the current host,
+    to be recorded in the build history: the seconds each of the phases took,
+    the total and the number of bytes uploaded.
+    '''
+    timings = state.get_timings()
+    result = dict(
+        (x, round(timings[x], 2)) for x in TIMED_PHASES + ['total'] if x in timings
+    )
+
+    if 'upload_bytes' in timings:
+        result['uploadBytes'] = timings['upload_bytes']
+
+    return result
+
+
+def with_timings(build_info):
+    ''' Add the timings of the deployment in progress to the build info. '''
+    timings = get_deploy_timings()
+
+    return merge(build_info, {'timings': timings}) if timings else build_info
+
+
+def format_duration(timings, phase):
+    ''' Format the time taken by the phase of a recorded build, if it's timed. '''
+    if phase not in (timings or {}):
+        return '-'
+
+    return '{:.1f}s'.format(timings[phase])
+
+
+def format_upload(timings):
+    ''' Format the size and the throughput of the upload of a recorded build. '''
+    uploaded = float(timings.get('uploadBytes', 0)) / (1024 * 1024)
+    duration = timings.get('upload')
+
+    if not uploaded:
+        return format_duration(timings, 'upload')
+
+    return '{} ({:.1f} MB at {:.1f} MB/s)'.format(
+        format_duration(timings, 'upload'),
+        uploaded,
+        uploaded / max(duration, 0.01)
+    )
+
+
 def display(id):
     ''' Display build information by build id. '''
+    from terminaltables import SingleTable
+
     history = load_history()
     build = get_build_info(history, id or history['current'])
     is_current = build['id'] == history['current']
@@ -128,11 +226,24 @@ def display(id):
         ['Current Build: ' + green('Yes' if is_current else 'No')],
         ['Timestamp: ' + green(timestamp)]
     ])
+    timings = build.get('timings')
+
+    # The builds deployed before the timings were recorded don't have them.
+    if timings:
+        table.table_data.extend(
+            ['{} Time: {}'.format(x.title(), green(
+                format_upload(timings) if x == 'upload' else format_duration(timings, x)
+            ))]
+            for x in TIMED_PHASES + ['total'] if x in timings
+        )
+
     print(table.table)
 
 
 def display_list(history):
     ''' Display build history. '''
+    from terminaltables import SingleTable
+
     if not history['builds']:
         remote_info('No builds have been deployed yet.')
         return
@@ -145,7 +256,8 @@ def display_list(history):
     # Prepend heading rows
     data.insert(0, [
         ' ', 'ID', 'Commit',
-        'Branch', 'Created By', 'Timestamp'
+        'Branch', 'Created By', 'Timestamp',
+        'Build', 'Upload', 'Total'
     ])
 
     table = SingleTable(data)
@@ -160,10 +272,14 @@ def row_mapper_wrt(current):
         is_current = data['id'] == current
         pointer = u'➜' if is_current else ' '
         timestamp = local_timestamp(data['timestamp'])
+        timings = data.get('timings')
 
         row = [
             pointer, data['id'], data['commit'],
-            data['branch'], data['createdBy'], timestamp
+            data['branch'], data['createdBy'], timestamp,
+            format_duration(timings, 'build'),
+            format_duration(timings, 'upload'),
+            format_duration(timings, 'total')
         ]
 
         # Regular row if not a current build row.
@@ -260,11 +376,20 @@ def delete_old_builds(history):
         )
 
 
+def delete_staged_builds():
+    '''
+    Delete the builds left staged on the remote by the deployments in the
+    pipeline mode that didn't finish. The current build has been moved already.
+    '''
+    fs.rm_rf(get_staging_dir() + '/*')
+
+
 def record_history(build_info):
     ''' Record a new build in the history. '''
     config = get_config()
     keep_builds = int(config['deployment']['keep_builds'])
     build_history = load_history()
+    build_info = with_timings(build_info)
 
     build_history['current'] = build_info['id']
     build_history['builds'].insert(0, build_info)
@@ -278,6 +403,65 @@ def record_history(build_info):
     # Delete the previous builds more than the value of `keep_builds`.
     delete_old_builds(build_history)
 
+    if get_stage_config(shell.get_stage())['deployment']['pipeline']:
+        delete_staged_builds()
+
+
+def activate_release(release_path, build_info, owner=None):
+    '''
+    Activate a release: change its ownership to the owner if provided,
+    point the current symlink to it and record it in the build history.
+
+    If the release agent is enabled, all of these are done by the agent
+    in a single round trip to the remote host.
+    '''
+    config = get_stage_config(shell.get_stage())
+    build_info = with_timings(merge(build_info, {'path': release_path}))
+
+    if config['deployment']['release_agent']:
+        result = agent.run(get_deploy_dir(), 'activate', {
+            'owner': '{0}:{0}'.format(owner) if owner else None,
+            'release_path': release_path,
+            'release_dir': get_release_dir(),
+            'current_path': get_current_path(),
+            'builds_file': get_builds_file(),
+            'staging_dir': get_staging_dir(),
+            'keep_builds': get_config()['deployment']['keep_builds'],
+            'build': build_info
+        })
+
+        if result is not None:
+            remote_info('Activated build {} and saved the build history'.format(
+                result['current']
+            ))
+
+            if result['pruned']:
+                remote_info('Deleted {} old build(s) from the remote'.format(
+                    len(result['pruned'])
+                ))
+
+            if result.get('unstaged'):
+                remote_info('Deleted {} staged build(s) left on the remote'.format(
+                    len(result['unstaged'])
+                ))
+
+            for warning in result.get('warnings') or []:
+                warn('Failed deleting an old build: {}'.format(warning))
+            return
+
+        remote_info('Python is not available on the remote to run the release agent')
+
+    if owner:
+        remote_info(
+            'Changing ownership of {} to user {}'.format(get_deploy_dir(), owner)
+        )
+        fs.chown(release_path, owner, owner)
+
+    remote_info('Pointing the current symlink to the latest build')
+    fs.update_symlink(release_path, get_current_path())
+
+    record_history(build_info)
+
 
 def get_current_build_index(history):
     ''' Get the current build index. '''
@@ -377,6 +561,7 @@ def get_build_env_vars(stage, config):
     # via an environment variable STAGE.
     # This could be useful for creating specific builds for
     # different environments.
+    inject_secrets()
     env_vars = merge(os.environ, {
         'STAGE': stage
     })
@@ -393,10 +578,54 @@ def get_build_env_vars(stage, config):
     return merge(remote_vars, env_vars)
 
 
-def build(stage, config):
+def get_cache_key(stage, config, build_dir, env_vars):
+    '''
+    Get the build cache key from the inputs of the build: the commit, the
+    lockfiles, the stage, the build scripts and the env vars the build
+    script is run with. Returns None if the build could not be cached,
+    ie: if there are uncommitted changes.
+    '''
+    if git.has_changes(remote=False):
+        info('Skipping the build cache as there are uncommitted changes')
+        return None
+
+    scripts = config['scripts']
+    inputs = {
+        'commit': git.last_commit(remote=False),
+        'stage': stage,
+        'build_dir': build_dir,
+        'lockfiles': dict(
+            (x, hashing.md5_file(x)) for x in LOCKFILES if os.path.exists(x)
+        ),
+        'scripts': dict((x, scripts.get(x)) for x in BUILD_SCRIPTS),
+        'env': dict(
+            (k, v) for (k, v) in env_vars.items() if k not in VOLATILE_ENV_VARS
+        )
+    }
+
+    return cache.get_key(inputs)
+
+
+def build(stage, config, build_dir=None):
     '''
     Trigger build script to prepare a build for the given stage.
+
+    If the build cache is enabled and the build directory is provided,
+    the build is restored from the cache if it has been built already
+    with the same inputs, or cached after it's built otherwise.
     '''
+    cache_key = None
+    env_vars = get_build_env_vars(stage, config)
+    # The build cache could be configured for each of the stages.
+    deployment = build_dir and get_stage_config(stage)['deployment']
+
+    if deployment and deployment['cache']:
+        cache_key = get_cache_key(stage, config, build_dir, env_vars)
+
+    if cache_key and cache.restore(BOSS_BUILD_CACHE_PATH, cache_key, build_dir):
+        info('Restored the build from the cache')
+        return
+
     info('Getting the build ready for deployment')
 
     # Trigger the install script
@@ -404,9 +633,18 @@ def build(stage, config):
     runner.run_script_safely(known_scripts.INSTALL, remote=False)
     runner.run_script_safely(known_scripts.POST_INSTALL, remote=False)
 
-    env_vars = get_build_env_vars(stage, config)
-
-    with shell_env(**env_vars):
+    # The env vars are set for the local process rather than with fabric's
+    # shell_env(), which would also export them to the remote commands run
+    # by the other deploy phases in the meantime.
+    with env.override(env_vars):
         runner.run_script_safely(known_scripts.PRE_BUILD, remote=False)
         runner.run_script_safely(known_scripts.BUILD, remote=False)
         runner.run_script_safely(known_scripts.POST_BUILD, remote=False)
+
+    if cache_key and os.path.isdir(build_dir):
+        info('Caching the build')
+        cache.store(BOSS_BUILD_CACHE_PATH, cache_key, build_dir)
+        cache.evict(
+            BOSS_BUILD_CACHE_PATH,
+            int(deployment['cache_max_size']) * 1024 * 1024
+        )
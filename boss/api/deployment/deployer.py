@@ -1,7 +1,17 @@
 ''' Deployer module. '''
 
-from boss.core.output import halt
+from fabric.api import env, execute, parallel
+
+from boss import state
+from boss.api import notif, shell
+from boss.config import get_stage_config
+from boss.core import scheduler
+from boss.core.output import halt, info
+from boss.core.util.colors import green, red
+from boss.core.util.string import strip_ansi
+from boss.core.util.types import is_string
 from boss.core.constants import presets
+from . import transfer
 
 
 def import_preset(config):
@@ -18,3 +28,136 @@ def import_preset(config):
         halt('Unsupported boss preset "{}".'.format(preset))
 
     return module
+
+
+def get_workers():
+    ''' Get the number of hosts to be deployed to concurrently. '''
+    config = get_stage_config(shell.get_stage())
+
+    return int(config['deployment']['workers'])
+
+
+def deploy_to_hosts(func, *args):
+    '''
+    Run the deployment function on each of the hosts of the current stage,
+    concurrently with the configured number of workers.
+
+    Halts after displaying the result for each of the hosts,
+    if the deployment failed on any of them.
+    '''
+    hosts = env.hosts
+    workers = get_workers()
+    stage = shell.get_stage()
+
+    def deploy_to_host():
+        '''
+        Deploy to the current host and return the error if it fails, along
+        with the scripts run, as they're recorded for the notifications by
+        the worker process itself if the hosts are deployed to in parallel.
+        '''
+        error = None
+
+        try:
+            func(*args)
+        except SystemExit as e:
+            # Fabric aborts with an exit code after printing the error,
+            # whereas halt() exits with the error message itself.
+            error = strip_ansi(e.code) if is_string(e.code) else 'Aborted'
+        except Exception as e:
+            error = str(e)
+
+        return {'error': error, 'scripts': notif.get_scripts(stage)}
+
+    if len(hosts) > 1 and workers > 1:
+        deploy_to_host = parallel(pool_size=workers)(deploy_to_host)
+
+    results = {}
+
+    for (host, result) in execute(deploy_to_host, hosts=hosts).items():
+        results[host] = result['error']
+        notif.add_scripts(stage, result['scripts'])
+
+    failed = [host for host in hosts if results.get(host)]
+
+    # There's no need for a summary if deployed to a single host.
+    if len(hosts) > 1:
+        display_results(hosts, results)
+
+    if failed:
+        halt('Deployment failed on {} of {} host(s).'.format(
+            len(failed), len(hosts)
+        ))
+
+    return results
+
+
+def prepare_hosts(hosts):
+    '''
+    Connect to each of the hosts, one after another. It's run alongside the
+    local build, so that the connections opened are reused by the deployment.
+
+    The connections are opened with paramiko rather than by running fabric
+    tasks, as fabric's env and output settings are global and would change
+    how the local commands of the build are run in the meantime, ie: a build
+    failing in a `quiet()` context would only warn instead of aborting.
+    The hosts themselves are set up by the deployment.
+    '''
+    for host_string in hosts:
+        state.get_connection(host_string)
+
+
+def timed(name, func):
+    ''' Run a local phase of the deployment, recording the time it takes. '''
+    with state.timed(name, local=True):
+        return func()
+
+
+def build_and_deploy(build, package, release, *release_args):
+    '''
+    Build and package the artifact locally, prepare the hosts, and release
+    the artifact to the hosts, as a graph of phases. The hosts are prepared
+    (ie: connected to) while the build is running, as neither depends on
+    the other.
+
+    `build()` builds the code, `package()` returns the artifact of the build,
+    and `release(artifact, *args)` is deployed to the hosts.
+    Returns the timings of the phases. The timings recorded for the history
+    are started by the caller, see state.start_timings().
+    '''
+    hosts = list(env.hosts)
+    phases = [
+        scheduler.phase('build', lambda _: timed('build', build)),
+        scheduler.phase('package', lambda _: timed('compress', package), ['build']),
+        scheduler.phase('prepare', lambda _: prepare_hosts(hosts)),
+        scheduler.phase(
+            'release',
+            lambda x: deploy_to_hosts(release, x['package'], *release_args),
+            ['package', 'prepare']
+        )
+    ]
+    results = {}
+
+    try:
+        timings = scheduler.run(phases, results)
+    finally:
+        if results.get('package'):
+            transfer.cleanup(results['package'])
+
+    info(scheduler.format_timings(phases, timings))
+
+    return timings
+
+
+def display_results(hosts, results):
+    ''' Display the deployment result of each of the hosts. '''
+    from terminaltables import SingleTable
+
+    data = [['Host', 'Status']]
+
+    for host in hosts:
+        error = results.get(host)
+        status = red('Failed: ' + error) if error else green('Succeeded')
+        data.append([host, status])
+
+    info('Deployed to {} host(s)'.format(len(hosts)))
+    print(SingleTable(data).table)
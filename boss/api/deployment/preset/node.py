@@ -8,14 +8,21 @@ is started on restarted on the remote server.
 '''
 
 from datetime import datetime
-from fabric.api import task, cd
+from fabric.api import task, cd, runs_once
 
+from boss import state
 from boss.util import remote_info
 from boss.api import shell, notif, runner, fs, git
-from boss.config import get as get_config
+from boss.config import get as get_config, get_stage_config
+from boss.core import hashing
 from boss.core.output import halt, info
-from boss.core.constants import known_scripts, notification_types
-from .. import buildman
+from boss.core.util.object import merge
+from boss.core.constants import known_scripts, notification_types, copy_modes
+from .. import buildman, deployer, transfer
+
+# Files that determine the installed dependencies.
+DEPENDENCY_FILES = ['package.json'] + buildman.LOCKFILES
+NODE_MODULES = '/node_modules'
 
 
 @task
@@ -47,6 +54,59 @@ def setup():
     buildman.setup_remote(quiet=False)
 
 
+def get_dependencies_fingerprint(files):
+    '''
+    Get the fingerprint of the dependencies from the files to be included.
+    Returns None if none of the lockfiles are to be included.
+    '''
+    files = [
+        x for x in files
+        if x in DEPENDENCY_FILES and fs.exists(x, remote=False)
+    ]
+
+    if not any(x in buildman.LOCKFILES for x in files):
+        return None
+
+    return hashing.md5(' '.join(
+        x + ':' + hashing.md5_file(x) for x in sorted(files)
+    ))
+
+
+def reuse_dependencies(fingerprint, release_path):
+    '''
+    Reuse the node_modules of the current release in the new release,
+    if the dependencies haven't changed since. Returns True if reused.
+    '''
+    deployment = get_stage_config(shell.get_stage())['deployment']
+    mode = deployment['reuse_dependencies']
+
+    if not mode or not fingerprint:
+        return False
+
+    history = buildman.load_history()
+    current = buildman.get_build_by_id(history, history['current'])
+
+    if not current or current.get('dependencies') != fingerprint:
+        return False
+
+    modules_path = current['path'] + NODE_MODULES
+
+    if not fs.exists(modules_path):
+        return False
+
+    remote_info('Reusing the dependencies of build {} as they haven\'t changed'.format(
+        current['id']
+    ))
+    fs.copy_dir(
+        modules_path,
+        release_path + NODE_MODULES,
+        link=mode == copy_modes.HARDLINK,
+        reflink=mode == copy_modes.REFLINK
+    )
+
+    return True
+
+
 def upload_included_files(files, remote_path):
     ''' Upload the local files if they were to be included. '''
     for filename in files:
@@ -67,11 +127,11 @@ def build():
 
 
 @task
+@runs_once
 def deploy():
     ''' Zero-Downtime deployment for the backend. '''
     config = get_config()
     stage = shell.get_stage()
-    is_first_deployment = not buildman.is_remote_setup()
 
     branch = git.current_branch(remote=False)
     commit = git.last_commit(remote=False, short=True)
@@ -81,10 +141,7 @@ def deploy():
         stage=stage
     ))
 
-    tmp_path = fs.get_temp_filename()
     build_dir = buildman.resolve_local_build_dir()
-    included_files = config['deployment']['include_files']
-
     deployer_user = shell.get_user()
 
     notif.send(notification_types.DEPLOYMENT_STARTED, {
@@ -93,78 +150,93 @@ def deploy():
         'branch': branch,
         'stage': stage
     })
-    runner.run_script_safely(known_scripts.PRE_DEPLOY)
-
-    (release_dir, current_path) = buildman.setup_remote()
 
     timestamp = datetime.utcnow()
     build_id = timestamp.strftime('%Y%m%d%H%M%S')
     build_name = buildman.get_build_name(build_id)
-    build_compressed = build_name + '.tar.gz'
-    release_path = release_dir + '/' + build_name
-    dist_path = build_name + '/dist'
 
-    buildman.build(stage, config)
+    # Build and prepare the artifact only once for all the hosts,
+    # while the hosts are being prepared for the deployment; and upload
+    # the build while it's being built, in the pipeline mode.
+    # The timings are started first, as the pipeline times the uploads.
+    state.start_timings()
+    pipelined = transfer.start_pipeline(build_dir, build_name)
+
+    try:
+        deployer.build_and_deploy(
+            lambda: buildman.build(stage, config, build_dir),
+            lambda: transfer.prepare(build_dir, build_name, pipelined),
+            release,
+            {
+                'id': build_id,
+                'branch': branch,
+                'commit': commit,
+                'stage': stage,
+                'createdBy': deployer_user,
+                'timestamp': timestamp.strftime(buildman.TS_FORMAT)
+            }
+        )
+    finally:
+        transfer.stop_pipeline(pipelined)
+        state.stop_timings()
+
+    # Send deployment finished notification.
+    notif.send(notification_types.DEPLOYMENT_FINISHED, {
+        'user': deployer_user,
+        'branch': branch,
+        'commit': commit,
+        'stage': stage
+    })
 
-    info('Compressing the build')
-    fs.tar_archive(build_compressed, build_dir, remote=False)
+    remote_info('Deployment Completed')
 
-    info('Uploading the build {} to {}'.format(build_compressed, tmp_path))
-    fs.upload(build_compressed, tmp_path)
 
-    # Remove the compressed build from the local directory.
-    fs.rm(build_compressed, remote=False)
+def release(artifact, build_info):
+    ''' Release the prepared build artifact on the current host. '''
+    config = get_config()
+    # The remote is set up beforehand (while building), so the first
+    # deployment is the one without a current release to point to yet.
+    is_first_deployment = not fs.exists(buildman.get_current_path())
+    included_files = config['deployment']['include_files']
+
+    runner.run_script_safely(known_scripts.PRE_DEPLOY)
 
-    # Once, the build is uploaded to the remote,
-    # set things up in the remote server.
-    with cd(release_dir):
-        remote_info('Extracting the build {}'.format(build_compressed))
-        # Create a new directory for the build in the remote.
-        fs.mkdir(dist_path, nested=True)
+    (release_dir, current_path) = buildman.setup_remote()
+    release_path = release_dir + '/' + artifact['build_name']
+    dist_path = release_path + '/dist'
 
-        # Extract the build.
-        fs.tar_extract(tmp_path, dist_path)
+    # Upload the build and extract it to the dist path on the remote.
+    transfer.upload(artifact, dist_path)
 
-        # Remove the uploaded archived from the temp path.
-        fs.rm_rf(tmp_path)
+    # Upload the files to be included eg: package.json file
+    # to the remote build location.
+    upload_included_files(included_files, release_path)
 
-        # Upload the files to be included eg: package.json file
-        # to the remote build location.
-        upload_included_files(included_files, release_path)
+    # Reuse the dependencies of the current release if unchanged,
+    # before the current symlink is pointed to the new release.
+    fingerprint = get_dependencies_fingerprint(included_files)
+    reused = reuse_dependencies(fingerprint, release_path)
 
-        remote_info('Pointing the current symlink to the latest build')
-        fs.update_symlink(release_path, current_path)
+    remote_info('Pointing the current symlink to the latest build')
+    fs.update_symlink(release_path, current_path)
 
     # Change directory to the release path.
-    with cd(current_path):
-        install_remote_dependencies()
+    if not reused:
+        with cd(current_path), state.timed('install'):
+            install_remote_dependencies()
 
     # Start or restart the application service.
-    start_or_reload_service(is_first_deployment)
+    with state.timed('reload'):
+        start_or_reload_service(is_first_deployment)
 
     # Save build history
-    buildman.record_history({
-        'id': build_id,
+    buildman.record_history(merge(build_info, {
         'path': release_path,
-        'branch': branch,
-        'commit': commit,
-        'stage': stage,
-        'createdBy': deployer_user,
-        'timestamp': timestamp.strftime(buildman.TS_FORMAT)
-    })
+        'dependencies': fingerprint
+    }))
 
     runner.run_script_safely(known_scripts.POST_DEPLOY)
 
-    # Send deployment finished notification.
-    notif.send(notification_types.DEPLOYMENT_FINISHED, {
-        'user': deployer_user,
-        'branch': branch,
-        'commit': commit,
-        'stage': stage
-    })
-
-    remote_info('Deployment Completed')
-
 
 def install_remote_dependencies():
     ''' Install dependencies on the remote host. '''
@@ -120,12 +120,17 @@ def status():
 def check():
     ''' Check the current remote branch and the last commit. '''
     with cd(get_repo_path()):
-        with hide('running'):
-            # Show the current branch
-            remote_branch = git.current_branch()
-            remote_print('Branch: {}'.format(remote_branch))
-            # Show the last commit
-            git.show_last_commit()
+        with hide('everything'):
+            # Get both of them in a single round trip with the shell runner.
+            (remote_branch, last_commit) = runner.run_all([
+                'git rev-parse --abbrev-ref HEAD',
+                'git log -1'
+            ])
+
+    # Show the current branch
+    remote_print('Branch: {}'.format(remote_branch.strip()))
+    # Show the last commit
+    remote_print(last_commit)
 
 
 def resolve_deployment_branch(stage):
@@ -9,14 +9,15 @@ The source code is built locally and only the dist is uploaded and deployed to t
 
 from datetime import datetime
 
-from fabric.api import task, cd
+from fabric.api import task, runs_once
 
+from boss import state
 from boss.util import remote_info
-from boss.api import shell, notif, fs, git, runner
+from boss.api import shell, notif, git, runner
 from boss.config import get_stage_config, get as get_config
 from boss.core.output import info
 from boss.core.constants import notification_types, known_scripts
-from .. import buildman
+from .. import buildman, deployer, transfer
 
 
 @task
@@ -55,11 +56,11 @@ def build():
 
 
 @task
+@runs_once
 def deploy():
     ''' Zero-Downtime deployment for the web. '''
     config = get_config()
     stage = shell.get_stage()
-    user = get_stage_config(stage)['user']
 
     # Get the current branch and commit (locally).
     branch = git.current_branch(remote=False)
@@ -70,10 +71,7 @@ def deploy():
         stage=stage
     ))
 
-    tmp_path = fs.get_temp_filename()
     build_dir = buildman.resolve_local_build_dir()
-
-    deploy_dir = buildman.get_deploy_dir()
     deployer_user = shell.get_user()
 
     notif.send(notification_types.DEPLOYMENT_STARTED, {
@@ -83,60 +81,34 @@ def deploy():
         'stage': stage
     })
 
-    runner.run_script_safely(known_scripts.PRE_DEPLOY)
-
-    (release_dir, current_path) = buildman.setup_remote()
-
     timestamp = datetime.utcnow()
     build_id = timestamp.strftime('%Y%m%d%H%M%S')
     build_name = buildman.get_build_name(build_id)
-    build_compressed = build_name + '.tar.gz'
-    release_path = release_dir + '/' + build_name
-
-    buildman.build(stage, config)
-
-    info('Compressing the build')
-    fs.tar_archive(build_compressed, build_dir, remote=False)
 
-    info('Uploading the build {} to {}'.format(build_compressed, tmp_path))
-    fs.upload(build_compressed, tmp_path)
-
-    # Remove the compressed build from the local directory.
-    fs.rm(build_compressed, remote=False)
-
-    # Once, the build is uploaded to the remote,
-    # set things up in the remote server.
-    with cd(release_dir):
-        remote_info('Extracting the build {}'.format(build_compressed))
-        # Create a new directory for the build in the remote.
-        fs.mkdir(build_name)
-
-        # Extract the build.
-        fs.tar_extract(tmp_path, build_name)
-
-        # Remove the uploaded archived from the temp path.
-        fs.rm_rf(tmp_path)
-
-        remote_info(
-            'Changing ownership of {} to user {}'.format(deploy_dir, user)
+    # Build and prepare the artifact only once for all the hosts,
+    # while the hosts are being prepared for the deployment; and upload
+    # the build while it's being built, in the pipeline mode.
+    # The timings are started first, as the pipeline times the uploads.
+    state.start_timings()
+    pipelined = transfer.start_pipeline(build_dir, build_name)
+
+    try:
+        deployer.build_and_deploy(
+            lambda: buildman.build(stage, config, build_dir),
+            lambda: transfer.prepare(build_dir, build_name, pipelined),
+            release,
+            {
+                'id': build_id,
+                'branch': branch,
+                'commit': commit,
+                'stage': stage,
+                'createdBy': deployer_user,
+                'timestamp': timestamp.strftime(buildman.TS_FORMAT)
+            }
         )
-        fs.chown(release_path, user, user)
-
-        remote_info('Pointing the current symlink to the latest build')
-        fs.update_symlink(release_path, current_path)
-
-    # Save build history
-    buildman.record_history({
-        'id': build_id,
-        'path': release_path,
-        'branch': branch,
-        'commit': commit,
-        'stage': stage,
-        'createdBy': deployer_user,
-        'timestamp': timestamp.strftime(buildman.TS_FORMAT)
-    })
-
-    runner.run_script_safely(known_scripts.POST_DEPLOY)
+    finally:
+        transfer.stop_pipeline(pipelined)
+        state.stop_timings()
 
     # Send deployment finished notification.
     notif.send(notification_types.DEPLOYMENT_FINISHED, {
@@ -147,3 +119,22 @@ def deploy():
     })
 
     remote_info('Deployment Completed')
+
+
+def release(artifact, build_info):
+    ''' Release the prepared build artifact on the current host. '''
+    stage = shell.get_stage()
+    user = get_stage_config(stage)['user']
+
+    runner.run_script_safely(known_scripts.PRE_DEPLOY)
+
+    (release_dir, _) = buildman.setup_remote()
+    release_path = release_dir + '/' + artifact['build_name']
+
+    # Upload the build and extract it to the release path on the remote.
+    transfer.upload(artifact, release_path)
+
+    # Point the current symlink to the release and save the build history.
+    buildman.activate_release(release_path, build_info, owner=user)
+
+    runner.run_script_safely(known_scripts.POST_DEPLOY)
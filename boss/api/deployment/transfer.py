@@ -0,0 +1,466 @@
+'''
+Build transfer module for deployment.
+
+Takes care of getting a local build onto the remote host, either by
+uploading the whole build or only the files that have changed (delta)
+since the previous release. The archive could either be uploaded as a
+file or streamed straight over SSH (stream).
+
+In the hardlink release mode, the new release is seeded from the previous
+release with hard links and only the changed files are written, so the
+unchanged files share the same inodes across the releases.
+
+The archives are compressed with the configured codec (gzip, zstd, lz4 or
+none). In the `auto` mode, the codec and level are chosen by measuring the
+local compression speed against the throughput of the link to the remote.
+
+The local build is prepared only once with `prepare()` and the same
+artifact is then uploaded to each of the hosts with `upload()`.
+
+In the pipeline mode, the files of the build are streamed to a staging
+directory on each of the hosts while the build is still running, and only
+the rest of the build is uploaded once it's done, before the staging
+directory is moved to the release path.
+'''
+
+import os
+import time
+from pipes import quote
+from tempfile import mkstemp
+from threading import Thread, Event
+
+from fabric.api import cd, env
+
+from boss import state
+from boss.util import remote_info
+from boss.api import fs, shell, ssh
+from boss.config import get_stage_config
+from boss.core import fs as local_fs, manifest, compression, pipeline
+from boss.core.output import info
+from boss.core.constants import release_modes, codecs
+from . import buildman
+
+# Number of files to be removed with a single remote command.
+REMOVAL_CHUNK_SIZE = 500
+
+# Interval (in seconds) the build directory is scanned at in the pipeline mode.
+PIPELINE_SCAN_INTERVAL = 1
+
+
+def get_deployment_config():
+    ''' Get the deployment configuration for the current stage. '''
+    return get_stage_config(shell.get_stage())['deployment']
+
+
+def is_delta_enabled():
+    ''' Check if delta uploads are enabled for the current stage. '''
+    return bool(get_deployment_config()['delta'])
+
+
+def is_stream_enabled():
+    ''' Check if the build is to be streamed over SSH for the current stage. '''
+    return bool(get_deployment_config()['stream'])
+
+
+def is_hardlink_enabled():
+    ''' Check if the releases are to be hard linked for the current stage. '''
+    return get_deployment_config()['release_mode'] == release_modes.HARDLINK
+
+
+def is_pipeline_enabled():
+    '''
+    Check if the build is to be uploaded while it's being built for the
+    current stage. It's used only for the full uploads, ie: not if delta
+    uploads or hard linked releases are enabled.
+    '''
+    config = get_deployment_config()
+
+    return bool(config['pipeline']) and not (
+        is_delta_enabled() or is_hardlink_enabled()
+    )
+
+
+def resolve_codec(build_dir=None):
+    '''
+    Resolve the codec to compress the build with. In the auto mode, the
+    codec is chosen out of the ones available both locally and on the remote,
+    by sampling the build; or the default codec is used if there's no build
+    to sample yet (ie: in the pipeline mode, before it's built).
+    '''
+    config = get_deployment_config()
+    name = config['codec']
+
+    if name != codecs.AUTO:
+        return compression.get_codec(name, config['codec_level'])
+
+    if build_dir is None:
+        codec = compression.get_codec()
+        info('Using {} to upload the build while building'.format(codec['name']))
+
+        return codec
+
+    info('Choosing the archive codec')
+    programs = fs.which([x['program'] for x in codecs.CODECS.values() if x['program']])
+    candidates = compression.get_candidates(programs)
+    throughput = ssh.measure_throughput()
+    codec = compression.choose(build_dir, candidates, throughput)
+
+    info('Using {} (level {}) at {:.2f} MB/s'.format(
+        codec['name'], codec['level'], throughput / (1024 * 1024)
+    ))
+
+    return codec
+
+
+def prepare(build_dir, build_name, pipelined=None):
+    '''
+    Prepare the local build artifact to be uploaded to the hosts.
+
+    The manifest of the build is generated if delta uploads or hard linked
+    releases are enabled, otherwise the whole build is compressed unless
+    it is to be streamed, or has been uploaded while building (pipelined).
+    '''
+    staged = finish_pipeline(pipelined) if pipelined else None
+    codec = pipelined['codec'] if staged else resolve_codec(build_dir)
+    artifact = {
+        'build_dir': build_dir,
+        'build_name': build_name,
+        'codec': codec,
+        'archive': None,
+        'files': None
+    }
+
+    if staged:
+        artifact['staged'] = staged
+        info('Uploaded {} file(s) while building, {} left to upload'.format(
+            staged['uploaded'], len(staged['changed'])
+        ))
+
+    elif is_delta_enabled() or is_hardlink_enabled():
+        info('Generating the build manifest')
+        artifact['files'] = manifest.generate(build_dir)
+
+    elif not is_stream_enabled():
+        archive = build_name + compression.get_extension(codec)
+
+        info('Compressing the build')
+        fs.tar_archive(archive, build_dir, remote=False, codec=codec)
+        artifact['archive'] = archive
+
+    return artifact
+
+
+def cleanup(artifact):
+    ''' Remove the compressed build from the local directory. '''
+    if artifact['archive']:
+        fs.rm(artifact['archive'], remote=False)
+
+
+def upload(artifact, dest_path):
+    '''
+    Upload the prepared build artifact and extract it to the remote
+    destination path.
+
+    If the manifest of the build is available (delta or hardlink) and the
+    previous release is available on the remote, only the new or changed
+    files are uploaded and the rest of the release is created from the
+    previous release.
+    '''
+    files = artifact['files']
+    staged = artifact.get('staged')
+
+    if staged and env.host_string in staged['hosts']:
+        upload_staged(artifact, dest_path)
+        return
+
+    if files is None:
+        upload_full(artifact, dest_path)
+        return
+
+    previous = buildman.load_manifest()
+
+    if previous and fs.exists(previous['path']):
+        upload_delta(artifact, dest_path, previous)
+    else:
+        upload_full(artifact, dest_path)
+
+    # Record the manifest of this release for the next deployment.
+    buildman.save_manifest({
+        'path': dest_path,
+        'files': files
+    })
+
+
+def upload_staged(artifact, dest_path):
+    '''
+    Upload the rest of the build that was staged while building, and move
+    the staging directory to the destination path.
+    '''
+    staged = artifact['staged']
+    staging_path = staged['path']
+
+    if staged['changed']:
+        info('Streaming the rest of the build to {}'.format(staging_path))
+        ssh.extract_stream(
+            artifact['build_dir'],
+            staging_path,
+            staged['changed'],
+            codec=artifact['codec']
+        )
+
+    # Remove the files staged that are no longer in the build.
+    with cd(staging_path):
+        removed = staged['removed']
+
+        for i in range(0, len(removed), REMOVAL_CHUNK_SIZE):
+            chunk = removed[i:i + REMOVAL_CHUNK_SIZE]
+            fs.rm_rf([quote(x) for x in chunk])
+
+    remote_info('Moving the staged build to {}'.format(dest_path))
+    fs.mkdir(os.path.dirname(dest_path), nested=True)
+    fs.move(staging_path, dest_path)
+
+
+def upload_full(artifact, dest_path):
+    ''' Upload the whole build to the remote. '''
+    build_dir = artifact['build_dir']
+    codec = artifact['codec']
+
+    if is_stream_enabled():
+        info('Streaming the build to {}'.format(dest_path))
+        ssh.extract_stream(build_dir, dest_path, codec=codec)
+        return
+
+    # Use the build compressed while preparing the artifact if available.
+    if artifact['archive']:
+        upload_archive(artifact['archive'], dest_path, codec=codec)
+        return
+
+    (fd, archive) = mkstemp(suffix=compression.get_extension(codec))
+    os.close(fd)
+
+    info('Compressing the build')
+    fs.tar_archive(archive, build_dir, remote=False, codec=codec)
+    upload_archive(archive, dest_path, codec=codec)
+    fs.rm(archive, remote=False)
+
+
+def upload_delta(artifact, dest_path, previous):
+    '''
+    Upload only the files that have changed since the previous release,
+    and create the rest of the release from the previous release.
+    '''
+    build_dir = artifact['build_dir']
+    codec = artifact['codec']
+    link = is_hardlink_enabled()
+    (changed, removed) = manifest.diff(previous['files'], artifact['files'])
+
+    info('Uploading {} changed file(s), {} removed since the last release'.format(
+        len(changed), len(removed)
+    ))
+
+    if link:
+        remote_info('Hard linking the build from {}'.format(previous['path']))
+    else:
+        remote_info('Creating the build from {}'.format(previous['path']))
+
+    fs.mkdir(dest_path, nested=True)
+    fs.copy_dir(previous['path'], dest_path, link=link)
+
+    # Remove the files that no longer exist in the new build.
+    with cd(dest_path):
+        for i in range(0, len(removed), REMOVAL_CHUNK_SIZE):
+            chunk = removed[i:i + REMOVAL_CHUNK_SIZE]
+            fs.rm_rf([quote(x) for x in chunk])
+
+    if link:
+        remote_info('Reusing {} unchanged file(s) from the previous release'.format(
+            len(artifact['files']) - len(changed)
+        ))
+
+    # Skip the upload if nothing has changed.
+    if not changed:
+        return
+
+    # The changed files that are hard linked to the previous release are
+    # unlinked before extraction, so that the previous release is intact.
+    if is_stream_enabled():
+        info('Streaming the changes to {}'.format(dest_path))
+        ssh.extract_stream(
+            build_dir,
+            dest_path,
+            changed,
+            unlink=link,
+            codec=codec
+        )
+        return
+
+    (fd, archive) = mkstemp(suffix=compression.get_extension(codec))
+    os.close(fd)
+
+    info('Compressing the changes')
+    local_fs.compress_files(
+        build_dir,
+        archive,
+        changed,
+        **compression.get_archive_options(codec)
+    )
+    upload_archive(archive, dest_path, unlink=link, codec=codec)
+    fs.rm(archive, remote=False)
+
+
+def upload_archive(archive, dest_path, unlink=False, codec=None):
+    ''' Upload a local archive and extract it to the destination. '''
+    tmp_path = fs.get_temp_filename()
+
+    info('Uploading the build {} to {}'.format(archive, tmp_path))
+
+    with state.timed('upload', upload_bytes=local_fs.get_size(archive)):
+        fs.upload(archive, tmp_path)
+
+    remote_info('Extracting the build {}'.format(archive))
+
+    with state.timed('extract'):
+        fs.mkdir(dest_path, nested=True)
+        fs.tar_extract(tmp_path, dest_path, unlink=unlink, codec=codec)
+
+    # Remove the uploaded archived from the temp path.
+    fs.rm_rf(tmp_path)
+
+
+def start_pipeline(build_dir, build_name):
+    '''
+    Start uploading the build to the staging directory on each of the hosts,
+    in the background, as its files are written by the build.
+    Returns None if the pipeline mode isn't enabled.
+    '''
+    if not is_pipeline_enabled():
+        return None
+
+    manifest_path = get_deployment_config()['pipeline_manifest']
+    pipelined = {
+        'build_dir': build_dir,
+        'path': buildman.get_staging_dir() + '/' + build_name,
+        'hosts': list(env.hosts or [env.host_string]),
+        'codec': resolve_codec(),
+        'manifest': manifest_path,
+        'started_at': time.time(),
+        'uploaded': {},
+        'error': None,
+        'stopped': Event()
+    }
+
+    info('Uploading the build while building')
+    thread = Thread(target=run_pipeline, args=(pipelined,))
+    thread.daemon = True
+    thread.start()
+    pipelined['thread'] = thread
+
+    return pipelined
+
+
+def run_pipeline(pipelined):
+    '''
+    Scan the build directory at intervals and upload the files that have
+    settled to each of the hosts, until the pipeline is stopped.
+    '''
+    previous = {}
+
+    while not pipelined['stopped'].is_set():
+        # The files left over from the previous builds aren't picked up.
+        current = pipeline.scan(pipelined['build_dir'], pipelined['started_at'])
+        listed = None
+
+        if pipelined['manifest']:
+            listed = pipeline.read_manifest(pipelined['manifest'])
+
+        files = pipeline.get_settled(
+            previous, current, pipelined['uploaded'], listed
+        )
+
+        if files and not upload_pipelined(pipelined, files, current):
+            return
+
+        previous = current
+        pipelined['stopped'].wait(PIPELINE_SCAN_INTERVAL)
+
+
+def upload_pipelined(pipelined, files, stats):
+    '''
+    Stream the files to the staging directory on each of the hosts.
+    The connections to the hosts are used directly, rather than through
+    fabric's current host, as it's done alongside the other deploy phases.
+    '''
+    try:
+        for host_string in pipelined['hosts']:
+            ssh.extract_stream(
+                pipelined['build_dir'],
+                pipelined['path'],
+                files,
+                codec=pipelined['codec'],
+                host_string=host_string
+            )
+    except BaseException as e:
+        # Including SystemExit from halt(); the build is uploaded
+        # as usual after it's done, instead.
+        pipelined['error'] = e
+        return False
+
+    for name in files:
+        pipelined['uploaded'][name] = stats[name]
+
+    return True
+
+
+def stop_uploading(pipelined):
+    ''' Stop uploading the build, waiting for the current upload. '''
+    pipelined['stopped'].set()
+    pipelined['thread'].join()
+
+
+def remove_staged(pipelined):
+    '''
+    Remove the build staged on each of the hosts, if it's still there,
+    ie: if the deployment failed or the build was uploaded as usual.
+    '''
+    for host_string in pipelined['hosts']:
+        try:
+            ssh.exec_command('rm -rf ' + pipelined['path'], host_string)
+        except BaseException:
+            # Including SystemExit from a failed connection; whatever's left
+            # is removed along with the old builds by the next deployment.
+            pass
+
+
+def stop_pipeline(pipelined):
+    ''' Stop uploading the build, and remove what's left staged on the hosts. '''
+    if not pipelined:
+        return
+
+    stop_uploading(pipelined)
+    remove_staged(pipelined)
+
+
+def finish_pipeline(pipelined):
+    '''
+    Stop uploading the build once it's done, and get what's staged on the
+    hosts: the staging path, the number of files uploaded and the files still
+    to be uploaded or removed. Returns None if the pipeline failed.
+    '''
+    stop_uploading(pipelined)
+
+    if pipelined['error']:
+        info('Failed uploading the build while building, uploading it now')
+        remove_staged(pipelined)
+        return None
+
+    final = pipeline.scan(pipelined['build_dir'])
+    (changed, removed) = pipeline.get_remaining(final, pipelined['uploaded'])
+
+    return {
+        'path': pipelined['path'],
+        'hosts': pipelined['hosts'],
+        'uploaded': len(pipelined['uploaded']),
+        'changed': changed,
+        'removed': removed
+    }
@@ -4,10 +4,11 @@ import os
 import time
 from StringIO import StringIO
 
-from fabric.api import hide, put, get
-from fabric.contrib import files, project
+from fabric.api import hide, put, get, settings
+from fabric.contrib import project
 
 from . import runner
+from boss.core import compression
 from boss.core.util.string import strip_ansi
 from boss.core.util.types import is_iterable, is_string
 
@@ -44,6 +45,29 @@ def rm_rf(path, remote=True):
     runner.run('rm -rf {}'.format(removal_path), remote=remote)
 
 
+def move(src, dest, remote=True):
+    ''' Move (rename) a file or a directory. '''
+    runner.run('mv {} {}'.format(src, dest), remote=remote)
+
+
+def copy_dir(src, dest, remote=True, link=False, reflink=False):
+    '''
+    Copy the contents of a directory into another, preserving attributes.
+    If `link` is True, files are hard linked instead of being copied.
+    If `reflink` is True, files are copied on write where the file system
+    supports it, falling back to a regular copy otherwise.
+    '''
+    if link:
+        options = '-al'
+    elif reflink:
+        options = '-a --reflink=auto'
+    else:
+        options = '-a'
+
+    cmd = 'cp {0} {1}/. {2}'.format(options, src.rstrip('/'), dest)
+    runner.run(cmd, remote=remote)
+
+
 def chown(path, user, group=None, remote=True):
     ''' Change ownership of a path recursively to the specified user and group. '''
     if group:
@@ -54,20 +78,35 @@ def chown(path, user, group=None, remote=True):
     runner.run(cmd, remote=remote)
 
 
-def tar_archive(name, path, remote=True):
-    ''' Compress the source path into a tar archive. '''
-    cmd = 'tar -czvf {} {}'.format(name, path)
+def tar_archive(name, path, remote=True, codec=None):
+    '''
+    Compress the source path into a tar archive,
+    with the given codec (gzip by default).
+    '''
+    cmd = compression.archive_command(name, path, codec)
 
     with hide('stdout'):
         runner.run(cmd, remote=remote)
 
 
-def tar_extract(src, dest, remote=True):
-    ''' Extract a source tar archive to the specified destination path. '''
-    cmd = 'tar zxvf {} --strip-components=1 -C {}'.format(src, dest)
+def tar_extract(src, dest, remote=True, unlink=False, codec=None):
+    '''
+    Extract a source tar archive to the specified destination path.
+    If `unlink` is True, existing files are removed before extracting over
+    them, so that the files hard linked elsewhere are left untouched.
+    '''
+    cmd = compression.extract_command(src, dest, codec, unlink=unlink)
     runner.run(cmd, remote=remote)
 
 
+def which(programs):
+    ''' Get the programs (out of the given ones) available on the remote host. '''
+    with hide('everything'), settings(warn_only=True):
+        result = runner.run('command -v {}'.format(' '.join(programs)))
+
+    return [os.path.basename(x) for x in strip_ansi(result).split()]
+
+
 def glob(path, remote=True):
     ''' Glob a directory path to get the list of files. '''
     with hide('everything'):
@@ -82,7 +121,9 @@ def exists(path, remote=True):
     '''
 
     if remote:
-        return files.exists(path)
+        cmd = 'test -e "$(echo {})"'.format(path)
+
+        return runner.run(cmd, quiet=True).succeeded
 
     return os.path.exists(path)
 
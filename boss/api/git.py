@@ -1,4 +1,18 @@
-from fabric.api import run, hide, local
+from fabric.api import hide
+
+
+def run(command, remote=True, **params):
+    '''
+    Run a git command on the remote host or locally with the runner.
+    The output of the local commands is captured and returned.
+    '''
+    # Imported here as the runner depends on this module via notif.
+    from boss.api import runner
+
+    if not remote:
+        params['capture'] = True
+
+    return runner.run(command, remote=remote, **params)
 
 
 def fetch(prune=True):
@@ -48,11 +62,27 @@ def last_commit(remote=True, short=False):
     cmd = 'git rev-parse{}HEAD'.format(' --short ' if short else ' ')
 
     with hide('everything'):
-        result = run(cmd) if remote else local(cmd, capture=True)
+        result = run(cmd, remote=remote)
 
         return result.strip()
 
 
+def has_changes(remote=True):
+    '''
+    Check if the git repository has any uncommitted changes.
+
+    Note: This assumes the current working directory (on remote or local host)
+    to be a git repository. So, make sure current directory is set before using this.
+    '''
+
+    cmd = 'git status --porcelain'
+
+    with hide('everything'):
+        result = run(cmd, remote=remote)
+
+        return bool(result.strip())
+
+
 def get_local_ref():
     ''' Get the current branch name or ref / commit if not available. '''
     branch = current_branch(remote=False)
@@ -74,7 +104,7 @@ def current_branch(remote=True):
     cmd = 'git rev-parse --abbrev-ref HEAD'
 
     with hide('everything'):
-        result = run(cmd) if remote else local(cmd, capture=True)
+        result = run(cmd, remote=remote)
 
         return result.strip()
 
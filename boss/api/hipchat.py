@@ -2,9 +2,8 @@
 Module for hipchat API.
 '''
 
-import requests
 from ..config import get as get_config
-from boss.core import notification
+from boss.core import notification, http
 
 
 API_BASE_URL = 'https://{company_name}.hipchat.com/v2/room/{room_id}/notification?auth_token={auth_token}'
@@ -12,7 +11,6 @@ API_BASE_URL = 'https://{company_name}.hipchat.com/v2/room/{room_id}/notificatio
 
 def send(notif_type, **params):
     ''' Send hipchat notifications. '''
-
     url = API_BASE_URL.format(
         company_name=config()['company_name'],
         room_id=config()['room_id'],
@@ -34,7 +32,7 @@ def send(notif_type, **params):
         'message_format': 'html'
     }
 
-    requests.post(url, json=payload)
+    http.post(url, json=payload)
 
 
 def config():
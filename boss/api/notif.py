@@ -2,16 +2,36 @@
 Notification API module.
 '''
 
+import atexit
+from threading import Lock
+from collections import OrderedDict
+
+from boss import state
+from boss.core import dispatcher
 from boss.core.output import warn
 from boss.api import slack, hipchat, git
-from boss.config import get_stage_config, get as get_config
+from boss.config import get_stage_config, get_hosts, get as get_config, inject_secrets
+from boss.core.constants.notification_types import (
+    DEPLOYMENT_STARTED,
+    DEPLOYMENT_FINISHED,
+    RUNNING_SCRIPT_STARTED,
+    RUNNING_SCRIPT_FINISHED,
+    RUNNING_SCRIPTS_FINISHED
+)
 
 # Notification Services
 notifiers = [slack, hipchat]
 
+# The deployments in progress and the scripts run by them,
+# by the stage, when the notifications are coalesced.
+_deployments = OrderedDict()
+_lock = Lock()
+
 
 def send(notif_type, params):
     ''' Send deployment notifications. '''
+    # The notifiers could be configured with the secrets from vault.
+    inject_secrets()
 
     enabled_services = [s for s in notifiers if s.is_enabled()]
 
@@ -19,29 +39,143 @@ def send(notif_type, params):
     if not enabled_services:
         return
 
+    if is_coalesced():
+        for (summary_type, summary_params) in coalesce(notif_type, params):
+            notify(enabled_services, summary_type, summary_params)
+    else:
+        notify(enabled_services, notif_type, params)
+
+
+def is_coalesced():
+    ''' Check if the script notifications are to be coalesced. '''
+    return get_config()['notified_hooks']['coalesce']
+
+
+def coalesce(notif_type, params):
+    '''
+    Coalesce the notifications of the scripts run during a deployment into
+    a single summary of the scripts, sent before the deployment finished
+    notification. Returns the list of notifications to send right away.
+    '''
+    stage = params['stage']
+
+    with _lock:
+        if notif_type == DEPLOYMENT_STARTED:
+            _deployments[stage] = dict(params, scripts=[])
+        elif notif_type == DEPLOYMENT_FINISHED:
+            return summarize(_deployments.pop(stage, None)) + [
+                (notif_type, params)
+            ]
+        elif stage in _deployments:
+            if notif_type == RUNNING_SCRIPT_FINISHED:
+                record_script(stage, params['script'])
+
+            if notif_type in [RUNNING_SCRIPT_STARTED, RUNNING_SCRIPT_FINISHED]:
+                return []
+
+    return [(notif_type, params)]
+
+
+def record_script(stage, script):
+    ''' Record a script run by the deployment on the stage, only once. '''
+    scripts = _deployments[stage]['scripts']
+
+    # The same script is run on each of the hosts.
+    if script not in scripts:
+        scripts.append(script)
+
+
+def get_scripts(stage):
+    ''' Get the scripts run so far by the deployment on the stage, if any. '''
+    with _lock:
+        deployment = _deployments.get(stage)
+
+        return list(deployment['scripts']) if deployment else []
+
+
+def add_scripts(stage, scripts):
+    '''
+    Add the scripts run by the deployment on the stage in another process,
+    ie: in fabric's parallel workers, which record them in their own copy
+    of the deployments, to be coalesced with the rest of them.
+    '''
+    with _lock:
+        if stage not in _deployments:
+            return
+
+        for script in scripts:
+            record_script(stage, script)
+
+
+def summarize(deployment):
+    ''' Get the summary notification of the scripts run by the deployment. '''
+    if not deployment or not deployment['scripts']:
+        return []
+
+    return [(RUNNING_SCRIPTS_FINISHED, {
+        'user': deployment['user'],
+        'stage': deployment['stage'],
+        'scripts': deployment['scripts']
+    })]
+
+
+def notify(enabled_services, notif_type, params):
+    ''' Send the notification with each of the enabled services. '''
     notif_params = extract_notification_params(params)
 
+    # The notifications are delivered in the background,
+    # so that the deployment doesn't wait on them.
+    for service in enabled_services:
+        dispatcher.dispatch(
+            service.__name__, deliver, service, notif_type, notif_params
+        )
+
+
+def deliver(service, notif_type, notif_params):
+    ''' Deliver the notification with the service. '''
     try:
-        for service in enabled_services:
-            service.send(notif_type, **notif_params)
+        service.send(notif_type, **notif_params)
     except:
         # Should still proceed if error sending notification,
         # printing an warning message.
         warn('Warning: Failed sending notifications.')
 
 
+@atexit.register
+def flush():
+    '''
+    Send the summaries of the scripts run by the deployments that
+    didn't finish, and wait until the notifications sent are delivered.
+    '''
+    with _lock:
+        deployments = _deployments.values()
+        _deployments.clear()
+
+    if not deployments:
+        return dispatcher.flush()
+
+    enabled_services = [s for s in notifiers if s.is_enabled()]
+
+    for deployment in deployments:
+        for (notif_type, params) in summarize(deployment):
+            notify(enabled_services, notif_type, params)
+
+    return dispatcher.flush()
+
+
 def extract_notification_params(params):
     ''' Extract parameters for notification. '''
     config = get_config()
     stage_config = get_stage_config(params['stage'])
-    fallback_public_url = 'http://' + stage_config.get('host')
+    hosts = get_hosts(stage_config, **state.get('host_filter'))
+    fallback_public_url = 'http://' + hosts[0] if hosts else None
     public_url = stage_config.get('public_url') or fallback_public_url
     repository_url = config.get('repository_url')
 
     notif_params = dict(
         public_url=public_url,
         repository_url=repository_url,
-        host=stage_config['host'],
+        host=', '.join(hosts),
         server_name=params['stage'],
         project_name=config['project_name'],
         project_description=config['project_description'],
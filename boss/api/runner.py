@@ -1,22 +1,59 @@
 
 from fabric.api import run as _run, local as _local, hide
 
-from boss.api import notif, shell
+from boss.api import notif, shell, ssh
 from boss.util import host_info
-from boss.config import get as _get_config
+from boss.config import get as _get_config, get_stage_config, inject_secrets
 from boss.core.util.colors import cyan
+from boss.core.constants import runners
 from boss.core.constants.notification_types import (
     RUNNING_SCRIPT_STARTED,
     RUNNING_SCRIPT_FINISHED
 )
 
 
-def run(command, remote=True):
-    ''' Run a command using fabric. '''
-    if remote:
-        return _run(command)
-    else:
-        return _local(command)
+def is_shell_runner():
+    ''' Check if the commands are to be run in a persistent remote shell. '''
+    stage_config = get_stage_config(shell.get_stage())
+
+    return stage_config.get('runner') == runners.SHELL
+
+
+def run(command, remote=True, **params):
+    '''
+    Run a command using fabric, or in a persistent shell session on the
+    remote host if the shell runner is configured for the stage.
+    '''
+    if not remote:
+        # The local commands could need the secrets from vault in the env.
+        inject_secrets()
+
+        return _local(command, **params)
+
+    if is_shell_runner():
+        return ssh.run(command, **params)
+
+    return _run(command, **params)
+
+
+def run_all(commands, **params):
+    '''
+    Run the remote commands one after the other, until one of them fails.
+    With the shell runner, they're pipelined in a single round trip.
+    '''
+    if is_shell_runner():
+        return ssh.run_all(commands, **params)
+
+    results = []
+
+    for command in commands:
+        result = _run(command, **params)
+        results.append(result)
+
+        if result.failed:
+            break
+
+    return results
 
 
 def is_script_defined(script):
@@ -50,6 +87,8 @@ def should_notify(script):
 
 def run_script(script, remote=True):
     ''' Run a script. '''
+    # The scripts could use the secrets from vault.
+    inject_secrets()
     custom_scripts = _get_config()['scripts']
 
     # If the script is not defined raise error.
@@ -13,9 +13,17 @@ def get_user():
     return commands.getoutput('whoami')
 
 
+def get_commands():
+    ''' Get the names of the tasks to be run from the command line args. '''
+    return [x.split(':')[0] for x in sys.argv[1:] if not x.startswith('-')]
+
+
 def get_stage():
-    ''' Get the current stage name from the command line args. '''
-    stage = sys.argv[1] if len(sys.argv) > 1 else None
+    '''
+    Get the current stage name from the command line args,
+    without the arguments of the stage task, ie: `prod:group=web`.
+    '''
+    stage = sys.argv[1].split(':')[0] if len(sys.argv) > 1 else None
 
     if stage is None:
         halt('No stage set for deployment')
@@ -2,9 +2,8 @@
 Module for slack API.
 '''
 
-import requests
 from boss.config import get as get_config
-from boss.core import notification
+from boss.core import notification, http
 from boss.core.util.func import as_is
 
 
@@ -31,7 +30,7 @@ def send(notif_type, **params):
         ]
     }
 
-    requests.post(url, json=payload)
+    http.post(url, json=payload)
 
 
 def config():
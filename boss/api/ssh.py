@@ -1,52 +1,223 @@
 ''' SSH module based on paramiko. '''
 
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from fabric.api import settings, quiet as _quiet, warn_only as _warn_only
+from fabric.state import output
+from fabric.utils import error
+from fabric.operations import _AttributeString, _prefix_commands, _prefix_env_vars
+
 from boss import state
-from boss.core import remote
+from boss.core import remote, fs, compression
+from boss.core.output import halt
+
+# Amount of data streamed to measure the throughput of the link.
+THROUGHPUT_PROBE_SIZE = 2 * 1024 * 1024
+
+
+def resolve_client(host_string=None):
+    '''
+    Resolves (opens or gets already opened) ssh connection,
+    to the current host unless the host string is provided.
+    '''
+    host_string = host_string or state.get('env').host_string
 
+    return state.get_connection(host_string)
 
-def resolve_sftp_client():
+
+def resolve_shell():
     '''
-    Resolves (opens or gets already opened) sftp connection.
+    Resolves (opens or gets already opened) persistent shell session.
     '''
     host_string = state.get('env').host_string
-    sftp_connections = state.get('sftp_connections')
+    sessions = state.get('shell_sessions')
+
+    with state.host_lock(host_string):
+        session = sessions.get(host_string)
+
+        if session and remote.is_shell_open(session):
+            return session
+
+        session = remote.open_shell(resolve_client())
+        sessions[host_string] = session
 
-    # If already opened sftp connection found in the state, return it.
-    if sftp_connections.has_key(host_string):
-        return sftp_connections[host_string]
+        return session
 
-    # Open a new SFTP connection and put in on the state.
-    sftp = state.get('connections')[host_string].open_sftp()
-    sftp_connections.update({host_string: sftp})
 
-    return sftp
+@contextmanager
+def sftp_session():
+    '''
+    Resolves an sftp session from the pool of the host (opening a new one if
+    there are no idle sessions), and releases it back to the pool after use.
+    '''
+    host_string = state.get('env').host_string
+    sftp = state.acquire_sftp(host_string, lambda: resolve_client().open_sftp())
+
+    try:
+        yield sftp
+    finally:
+        state.release_sftp(host_string, sftp)
 
 
 def put(local_path, remote_path, callback=None):
     '''
     Transfers a local file to the remote path via SFTP (Paramiko).
     '''
-    sftp = resolve_sftp_client()
-
-    # Do the put operation.
-    return remote.put(
-        sftp,
-        local_path=local_path,
-        remote_path=remote_path,
-        callback=callback
-    )
+    with sftp_session() as sftp:
+        # Do the put operation.
+        return remote.put(
+            sftp,
+            local_path=local_path,
+            remote_path=remote_path,
+            callback=callback
+        )
 
 
 def get(local_path, remote_path, callback=None):
     '''
     Transfers a remote file to local path via SFTP (Paramiko).
     '''
-    sftp = resolve_sftp_client()
+    with sftp_session() as sftp:
+        # Do the get operation.
+        return remote.get(
+            sftp,
+            remote_path=remote_path,
+            local_path=local_path,
+            callback=callback
+        )
+
 
-    # Do the get operation.
-    return remote.get(
-        sftp,
-        remote_path=remote_path,
-        local_path=local_path,
-        callback=callback
+def extract_stream(local_dir, remote_dir, files=None, unlink=False, codec=None,
+                   host_string=None):
+    '''
+    Stream a tar archive of the local directory straight to the remote
+    host over SSH, extracting it on the fly to the remote directory.
+    Nothing is written to the disk except the extracted files.
+
+    The host string could be provided to stream to a host other than the
+    current one, without depending on fabric's (global) current host.
+    '''
+    client = resolve_client(host_string)
+    codec = codec or compression.get_codec()
+    command = 'mkdir -p {} && {}'.format(
+        remote_dir,
+        compression.extract_command('-', remote_dir, codec, unlink=unlink, verbose=False)
     )
+    options = compression.get_archive_options(codec)
+    written = []
+
+    def writer(stdin):
+        ''' Write the archive to the stream, counting the bytes written. '''
+        written.append(fs.CountingWriter(stdin))
+        fs.write_archive(written[0], local_dir, files, **options)
+
+    start = time.time()
+    (status, error) = remote.stream(client, command, writer)
+
+    state.record_timing(
+        'upload',
+        time.time() - start,
+        host_string=host_string,
+        upload_bytes=written[0].count if written else 0
+    )
+
+    if status != 0:
+        halt('Failed extracting the build to {}: {}'.format(remote_dir, error))
+
+
+def exec_command(command, host_string=None):
+    '''
+    Run a command on the host over SSH, without depending on fabric's
+    (global) current host or settings. The host is the current one unless
+    the host string is provided. Returns a tuple of the exit status and
+    the error output of the command.
+    '''
+    (_, stdout, stderr) = remote.run(resolve_client(host_string), command)
+
+    return (stdout.channel.recv_exit_status(), stderr.read())
+
+
+def measure_throughput(size=THROUGHPUT_PROBE_SIZE):
+    '''
+    Measure the throughput (bytes per second) of the link to the remote host
+    by streaming random data over SSH.
+    '''
+    client = resolve_client()
+    data = os.urandom(size)
+
+    start = time.time()
+    remote.stream(client, 'cat > /dev/null', lambda stdin: stdin.write(data))
+
+    return size / max(time.time() - start, 1e-6)
+
+
+def run(command, quiet=False, warn_only=False):
+    '''
+    Run a command on the remote host in its persistent shell session.
+
+    This works the same way as fabric's run(): the command is run under the
+    cd(), prefix() and shell_env() contexts, the output is printed as it's
+    received and it aborts if the command fails, unless `warn_only` is set.
+    '''
+    return run_all([command], quiet=quiet, warn_only=warn_only)[0]
+
+
+def run_all(commands, quiet=False, warn_only=False):
+    '''
+    Run the commands on the remote host in its persistent shell session,
+    pipelined in a single round trip. The commands following a failed one
+    are skipped, so the results are returned only for the commands run.
+    '''
+    env = state.get('env')
+
+    if quiet:
+        manager = _quiet()
+    elif warn_only:
+        manager = _warn_only()
+    else:
+        manager = settings()
+
+    with manager:
+        wrapped_commands = [
+            _prefix_env_vars(_prefix_commands(command, 'remote'))
+            for command in commands
+        ]
+        prefix = '[{}] out: '.format(env.host_string) if env.output_prefix else ''
+
+        if output.running:
+            for command in commands:
+                print('[{}] run: {}'.format(env.host_string, command))
+
+        def writer(line):
+            ''' Print a line of the output. '''
+            if output.stdout:
+                sys.stdout.write(prefix + line)
+                sys.stdout.flush()
+
+        results = remote.execute_all(resolve_shell(), wrapped_commands, writer)
+        outs = []
+
+        for (command, wrapped_command, (status, result)) in zip(
+            commands, wrapped_commands, results
+        ):
+            out = _AttributeString(result.rstrip('\r\n'))
+            out.command = command
+            out.real_command = wrapped_command
+            out.return_code = status
+            out.failed = status not in env.ok_ret_codes
+            out.succeeded = not out.failed
+            out.stderr = ''
+            outs.append(out)
+
+            if out.failed:
+                error(
+                    'run() received nonzero return code {} while executing \'{}\'!'.format(
+                        status, command
+                    ),
+                    stdout=out
+                )
+
+        return outs
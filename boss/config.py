@@ -1,30 +1,48 @@
 ''' The configuration specific Module. '''
 
 import os
-import yaml
-import dotenv
+import re
 import logging
-from copy import deepcopy
+from functools import partial
 
-
-from .constants import DEFAULT_CONFIG_FILE
-from .core import fs, vault
+from . import __version__
+from .constants import DEFAULT_CONFIG_FILE, BOSS_CONFIG_CACHE_PATH
+from .core import fs, cache, hashing, inventory
 from .core.output import halt, info
 from .core.util.colors import cyan
-from .core.util.object import merge
-from .core.util.types import is_dict
+from .core.util.object import freeze, merge, LazyDict
+from .core.util.types import is_dict, is_string
 from .core.constants.config import DEFAULT_CONFIG, PSD
 
 
-_config = deepcopy(DEFAULT_CONFIG)
+# Maximum number of the compiled configs kept in the cache.
+CACHE_MAX_ENTRIES = 20
+
+# The env vars in the config, as they're expanded by os.path.expandvars().
+ENV_VAR_PATTERN = re.compile(r'\$(\w+|\{[^}]*\})')
+
+_config = freeze(DEFAULT_CONFIG)
+
+# The config file (and stage) to be loaded when the config is first used,
+# and the config string (and stage) to inject the vault secrets for,
+# when they're first needed.
+_pending_load = None
+_pending_secrets = None
+
+# Inventories loaded by their paths.
+_inventories = {}
 
 
 def get():
     '''
-    Return the loaded configuration.
-    Note: The returned config is a deep clone of the original config.
+    Return the loaded configuration, loading it first if it's been prepared.
+    Note: The returned config is a read-only snapshot, which is shared
+    rather than copied. Use merge() to derive a modified config from it.
     '''
-    return deepcopy(_config)
+    if _pending_load is not None:
+        load(**_pending_load)
+
+    return _config
 
 
 def resolve_dotenv_file(path, stage=None):
@@ -38,6 +56,8 @@ def resolve_dotenv_file(path, stage=None):
     dotenv_path = os.path.join(path, filename)
     fallback_path = os.path.join(path, '.env')
 
+    import dotenv
+
     if fs.exists(dotenv_path):
         info('Resolving env file: {}'.format(cyan(dotenv_path)))
         dotenv.load_dotenv(dotenv_path)
@@ -67,54 +87,162 @@ def merge_config(raw_config):
     Merge the default and preset specific default configs,
     to the raw configuration, add stage default configuration
     to each stage too and return the merged result.
+
+    The stage configs are merged lazily, when each of them is first used.
     '''
     preset = get_deployment_preset(raw_config)
     preset_defaults = PSD[preset]
     all_defaults = merge(DEFAULT_CONFIG, preset_defaults)
-    result = merge(all_defaults, raw_config)
+    result = dict(freeze(merge(all_defaults, raw_config)))
     base_config = get_base_config(result)
 
-    # Add base config to each of the stage config
-    for (stage_name, _) in result['stages'].items():
-        stage_config = result['stages'][stage_name]
-        merged_stage_config = merge(base_config, stage_config)
-        result['stages'][stage_name].update(merged_stage_config)
+    # Add base config to each of the stage config, when it's first used.
+    result['stages'] = LazyDict(
+        result['stages'],
+        partial(merge_stage_config, base_config)
+    )
 
     return result
 
 
+def merge_stage_config(base_config, stage_config):
+    ''' Merge the base config to the stage config and freeze it. '''
+    return freeze(merge(base_config, stage_config))
+
+
+class PlainString(type(u'')):
+    '''
+    A plain (unquoted) string in the yaml config using env vars,
+    which is resolved again as a yaml scalar once they're expanded.
+    '''
+
+
+def construct_string(loader, node):
+    ''' Construct a yaml string, marking the plain ones using env vars. '''
+    value = loader.construct_yaml_str(node)
+
+    # The style of a plain scalar is None, or empty with the libyaml loader.
+    if not node.style and ENV_VAR_PATTERN.search(value):
+        return PlainString(value)
+
+    return value
+
+
+def parse_yaml(raw_config):
+    ''' Parse a raw config yaml encoded string, without expanding the env vars. '''
+    import yaml
+
+    # Use the faster libyaml based loader if it's available.
+    base_loader = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+    loader = type('Loader', (base_loader,), {})
+    loader.add_constructor(u'tag:yaml.org,2002:str', construct_string)
+
+    return yaml.load(raw_config, Loader=loader) or {}
+
+
+def resolve_scalar(value):
+    '''
+    Resolve a string as a yaml scalar, ie: `22` as an int, just like it
+    would have been if the env var were expanded before the yaml is parsed.
+    '''
+    import yaml
+
+    try:
+        resolved = yaml.safe_load(value)
+    except yaml.YAMLError:
+        return value
+
+    return value if isinstance(resolved, (dict, list)) else resolved
+
+
+def expand_env_vars(data):
+    ''' Expand the env vars used in the strings of the parsed config. '''
+    if is_dict(data):
+        return dict(
+            (expand_env_vars(x), expand_env_vars(y)) for (x, y) in data.items()
+        )
+
+    if isinstance(data, list):
+        return [expand_env_vars(x) for x in data]
+
+    if not is_string(data):
+        return data
+
+    expanded = os.path.expandvars(data)
+
+    if isinstance(data, PlainString) and expanded != data:
+        return resolve_scalar(expanded)
+
+    return expanded
+
+
 def parse_config(raw_config):
     '''
     Parse a raw config yaml encoded string,
     and merge it with the defaults before it's used everywhere.
     '''
-    parsed = yaml.load(raw_config, Loader=yaml.FullLoader) or {}
+    return merge_config(parse_yaml(raw_config))
 
-    return merge_config(parsed)
 
+def get_cache_key(config_str):
+    '''
+    Get the key to cache the config parsed from the config string.
+    The boss version is accounted for too.
+    '''
+    return cache.get_key({
+        'config': hashing.md5(config_str),
+        'version': __version__
+    })
+
+
+def cached(key, compile_func):
+    '''
+    Get the compiled data for the key from the config cache,
+    or compile it with the function and cache it if it isn't cached.
+    The cache entries are readable only by the user.
+    '''
+    data = cache.read(BOSS_CONFIG_CACHE_PATH, key)
+
+    if data is not None:
+        return data
+
+    data = compile_func()
 
-def load(filename=DEFAULT_CONFIG_FILE, stage=None):
-    ''' Load the configuration and return it. '''
     try:
-        # pass
-        config_str = fs.read(filename)
-        resolve_dotenv_file(os.path.dirname(filename), stage)
+        cache.write(BOSS_CONFIG_CACHE_PATH, key, data, mode=0o600)
+        cache.prune(BOSS_CONFIG_CACHE_PATH, CACHE_MAX_ENTRIES)
+    except (IOError, OSError) as err:
+        # Should still proceed if the config couldn't be cached.
+        if os.environ.get('DEBUG') == 'true':
+            logging.exception(err)
 
-        # Check if vault is configured.
-        use_vault_if_enabled(config_str, stage)
+    return data
 
-        # Expand the environment variables used in the yaml config.
-        loaded_config = os.path.expandvars(config_str)
 
-        # Parse the yaml configuration.
-        merged_config = parse_config(loaded_config)
+def compile_config(config_str, expand=False):
+    '''
+    Parse the config string and return the frozen config, with the env vars
+    expanded if `expand` is set. The parsed config is cached by the contents
+    of the config string, before the env vars are expanded, so that the
+    values they resolve to (ie: secrets) are never written to the cache.
+    '''
+    parsed = cached(get_cache_key(config_str), lambda: parse_yaml(config_str))
 
-        _config.update(merged_config)
+    if expand:
+        parsed = expand_env_vars(parsed)
 
-        return get()
+    return freeze(merge_config(parsed))
 
-    except KeyError:
-        halt('Invalid configuration file "{}"'.format(filename))
+
+def get_env_vars(config_str):
+    ''' Get the names of the env vars used in the config string. '''
+    return set(x.strip('{}') for x in ENV_VAR_PATTERN.findall(config_str))
+
+
+def read(filename):
+    ''' Read the configuration file. '''
+    try:
+        return fs.read(filename)
 
     except IOError as err:
         # TODO: Handle from logger util.
@@ -124,9 +252,76 @@ def load(filename=DEFAULT_CONFIG_FILE, stage=None):
         halt(err)
 
 
+def prepare(filename=DEFAULT_CONFIG_FILE, stage=None):
+    '''
+    Prepare the configuration to be loaded when it's first used, and return
+    its outline, ie: the config parsed without resolving the env vars.
+    The outline is enough to know the stages and the deployment preset,
+    without resolving the env files or reading the secrets from vault.
+    '''
+    global _pending_load
+
+    try:
+        outline = compile_config(read(filename))
+    except KeyError:
+        halt('Invalid configuration file "{}"'.format(filename))
+
+    _pending_load = {'filename': filename, 'stage': stage}
+
+    return outline
+
+
+def inject_secrets():
+    '''
+    Inject the secrets from vault into the env (if vault is enabled),
+    unless they've been injected already, and expand the env vars of the
+    config again with them. This is done only when the secrets are first
+    needed, ie: to run the scripts or to send the notifications, so that
+    the tasks that only read the config never wait on vault.
+    '''
+    global _config, _pending_secrets
+
+    get()
+
+    if _pending_secrets is None:
+        return
+
+    (config_str, stage) = _pending_secrets
+    _pending_secrets = None
+
+    # The secrets from vault take precedence over the env vars, so the
+    # config is expanded again for them to be used by the config too.
+    if use_vault_if_enabled(config_str, stage):
+        _config = compile_config(config_str, expand=True)
+
+
+def load(filename=DEFAULT_CONFIG_FILE, stage=None):
+    '''
+    Load the configuration and return it. The secrets from vault aren't
+    injected until they're needed, see inject_secrets().
+    '''
+    global _config, _pending_load, _pending_secrets
+
+    _pending_load = None
+
+    try:
+        config_str = read(filename)
+        resolve_dotenv_file(os.path.dirname(filename), stage)
+        _pending_secrets = (config_str, stage)
+
+        # Parse the yaml configuration, unless it's been parsed already,
+        # and expand the environment variables used in it.
+        _config = compile_config(config_str, expand=True)
+
+        return get()
+
+    except KeyError:
+        halt('Invalid configuration file "{}"'.format(filename))
+
+
 def get_base_config(resolved_config=None):
     ''' Get the base configuration. '''
-    config = resolved_config or _config
+    config = resolved_config or get()
 
     return {
         'user': config.get('user'),
@@ -134,6 +329,7 @@ def get_base_config(resolved_config=None):
         'vault': config.get('vault'),
         'branch': config.get('branch'),
         'cwd': config.get('cwd'),
+        'runner': config.get('runner'),
         'deployment': config.get('deployment'),
         'repository_url': config.get('repository_url'),
         'remote_env_path': config.get('remote_env_path')
@@ -142,25 +338,86 @@ def get_base_config(resolved_config=None):
 
 def get_stage_config(stage):
     ''' Retrieve the configuration for the given stage. '''
+    config = get()
+
     try:
-        return _config['stages'][stage]
+        return config['stages'][stage]
     except KeyError:
         halt('Unknown stage %s. Stage should be any one of %s' % (
-            stage, _config['stages'].keys()
+            stage, config['stages'].keys()
         ))
 
+
+def get_inventory(path):
+    ''' Load the inventory file, or get it if it's already loaded. '''
+    if path not in _inventories:
+        try:
+            _inventories[path] = inventory.load(path)
+        except IOError as err:
+            halt('Failed loading the inventory "{}": {}'.format(path, err))
+
+    return _inventories[path]
+
+
+def get_stage_hosts(stage_config, group=None, pattern=None):
+    '''
+    Get the hosts of the stage, each with its name and the host vars
+    (user, port and key_filename) configured for it.
+
+    The hosts are either taken from the stage's `inventory` file, from the
+    given `group` or the stage's `group` (all of the hosts by default), or
+    from the `host`, which could be a single host or a list of hosts.
+    The hosts could be filtered by the host name `pattern` too.
+    '''
+    if stage_config.get('inventory'):
+        try:
+            return inventory.select(
+                get_inventory(stage_config['inventory']),
+                group or stage_config.get('group'),
+                pattern
+            )
+        except KeyError as err:
+            halt(err.args[0])
+
+    if group:
+        halt('Host groups require the stage to have an inventory.')
+
+    host = stage_config.get('host')
+
+    if not host:
+        return []
+
+    hosts = [host] if is_string(host) else list(host)
+
+    return [{'name': x} for x in inventory.filter_names(hosts, pattern)]
+
+
+def get_hosts(stage_config, group=None, pattern=None):
+    '''
+    Get the list of hosts from the stage configuration.
+    The `host` could either be configured as a single host or a list of hosts,
+    or the hosts could be selected from the stage's inventory.
+    '''
+    return [x['name'] for x in get_stage_hosts(stage_config, group, pattern)]
+
+
 def is_vault_enabled(raw_config):
     ''' Check if vault is configured using raw config. '''
     return raw_config['vault']['enabled']
 
 
 def use_vault_if_enabled(config_str, stage=None):
-    ''' Check if vault is configured using raw config. '''
-    raw_config = parse_config(config_str)
+    '''
+    Inject the secrets from vault into the env if vault is enabled.
+    Returns True if the secrets have been injected.
+    '''
+    from .core import vault
+
+    raw_config = compile_config(config_str)
 
     # Skip if vault is not enabled.
     if not is_vault_enabled(raw_config):
-        return
+        return False
 
     # Load secrets from vault and inject into env.
     if stage and stage in raw_config['stages']:
@@ -168,4 +425,23 @@ def use_vault_if_enabled(config_str, stage=None):
     else:
         path = raw_config['vault']['path']
 
-    vault.env_inject_secrets(path, silent=raw_config['vault']['silent'])
+    vault_config = raw_config['vault']
+    cache_ttl = vault_config['cache_ttl'] if vault_config['cache'] else None
+    keys = None
+
+    # Inject only the secrets referenced in the config (and its scripts),
+    # skipping vault entirely if those are all set already.
+    if vault_config['referenced_only']:
+        keys = get_env_vars(config_str)
+
+        if all(x in os.environ for x in keys):
+            return False
+
+    vault.env_inject_secrets(
+        path,
+        silent=vault_config['silent'],
+        cache_ttl=cache_ttl,
+        keys=keys
+    )
+
+    return True
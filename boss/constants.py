@@ -9,3 +9,6 @@ FABFILE_PATH = 'fabfile.py'
 # Boss paths
 BOSS_HOME_PATH = expanduser('~/.boss')
 BOSS_CACHE_PATH = BOSS_HOME_PATH + '/cache'
+BOSS_BUILD_CACHE_PATH = BOSS_CACHE_PATH + '/builds'
+BOSS_CONFIG_CACHE_PATH = BOSS_CACHE_PATH + '/config'
+BOSS_VAULT_CACHE_PATH = BOSS_CACHE_PATH + '/vault'
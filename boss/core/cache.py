@@ -0,0 +1,185 @@
+'''
+Local build artifact cache.
+
+Each build is cached as a directory under the cache path, named after a
+key derived from the inputs the build depends upon. The least recently
+used entries are evicted once the cache grows beyond its size limit.
+
+Smaller data (like the compiled configuration) is cached in a pickled file
+per key instead, with a limit on the number of entries kept.
+'''
+
+import os
+import json
+import shutil
+import cPickle as pickle
+
+from boss.core import hashing
+
+TMP_SUFFIX = '.tmp'
+
+
+def get_key(inputs):
+    ''' Generate the cache key for the given build inputs. '''
+    return hashing.md5(json.dumps(inputs, sort_keys=True))
+
+
+def get_entry_path(cache_dir, key):
+    ''' Get the path of the cache entry for the key. '''
+    return os.path.join(cache_dir, key)
+
+
+def touch(path):
+    ''' Mark the path as recently used. '''
+    os.utime(path, None)
+
+
+def restore(cache_dir, key, dest_dir):
+    '''
+    Restore the cached build for the key to the destination directory.
+    Returns False if the key isn't cached.
+    '''
+    path = get_entry_path(cache_dir, key)
+
+    if not os.path.isdir(path):
+        return False
+
+    if os.path.exists(dest_dir):
+        shutil.rmtree(dest_dir)
+
+    shutil.copytree(path, dest_dir, symlinks=True)
+    touch(path)
+
+    return True
+
+
+def store(cache_dir, key, source_dir):
+    '''
+    Store the build in the source directory in the cache for the key.
+    The entry is written to a temporary path first and then renamed,
+    so that a partially written entry is never restored.
+    '''
+    path = get_entry_path(cache_dir, key)
+    tmp_path = '{}.{}{}'.format(path, os.getpid(), TMP_SUFFIX)
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+
+    shutil.copytree(source_dir, tmp_path, symlinks=True)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    os.rename(tmp_path, path)
+    touch(path)
+
+
+def get_size(path):
+    ''' Get the total size (in bytes) of the files under the path. '''
+    size = 0
+
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.lstat(os.path.join(root, filename)).st_size
+
+    return size
+
+
+def evict(cache_dir, max_size):
+    '''
+    Evict the least recently used entries until the total size of the
+    cache is within the maximum size (in bytes). Returns the evicted keys.
+    '''
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = [
+        x for x in os.listdir(cache_dir)
+        if not x.endswith(TMP_SUFFIX) and os.path.isdir(os.path.join(cache_dir, x))
+    ]
+
+    # Most recently used entries first.
+    entries.sort(
+        key=lambda x: os.path.getmtime(os.path.join(cache_dir, x)),
+        reverse=True
+    )
+
+    total = 0
+    evicted = []
+
+    for key in entries:
+        path = get_entry_path(cache_dir, key)
+        total += get_size(path)
+
+        if total > max_size:
+            shutil.rmtree(path)
+            evicted.append(key)
+
+    return evicted
+
+
+def read(cache_dir, key):
+    '''
+    Read the data cached in a file for the key.
+    Returns None if the key isn't cached or the entry can't be read.
+    '''
+    path = get_entry_path(cache_dir, key)
+
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except Exception:
+        return None
+
+    touch(path)
+
+    return data
+
+
+def write(cache_dir, key, data, mode=None):
+    '''
+    Cache the data in a file for the key. Like store(),
+    the entry is written to a temporary file first and then renamed.
+    The file is given the permissions `mode`, if it's set.
+    '''
+    path = get_entry_path(cache_dir, key)
+    tmp_path = '{}.{}{}'.format(path, os.getpid(), TMP_SUFFIX)
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    with open(tmp_path, 'wb') as f:
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+    os.rename(tmp_path, path)
+
+
+def prune(cache_dir, max_entries):
+    '''
+    Delete the least recently used file entries, keeping only the
+    given number of the most recently used ones. Returns the deleted keys.
+    '''
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = [
+        x for x in os.listdir(cache_dir)
+        if not x.endswith(TMP_SUFFIX) and os.path.isfile(os.path.join(cache_dir, x))
+    ]
+
+    # Most recently used entries first.
+    entries.sort(
+        key=lambda x: os.path.getmtime(os.path.join(cache_dir, x)),
+        reverse=True
+    )
+
+    for key in entries[max_entries:]:
+        os.remove(get_entry_path(cache_dir, key))
+
+    return entries[max_entries:]
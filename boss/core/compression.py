@@ -0,0 +1,205 @@
+'''
+Archive compression utilities.
+
+Builds the shell commands to create and extract tar archives with the
+supported codecs (gzip, zstd, lz4 or uncompressed), and chooses the codec
+and level that would get a build onto the remote host the fastest, given
+the measured compression speed and the throughput of the link.
+'''
+
+import os
+import time
+import shlex
+from distutils.spawn import find_executable
+from subprocess import Popen, PIPE
+
+from boss.core.constants.codecs import CODECS, GZIP, NONE
+
+# Maximum amount of data from the build used to measure the codecs.
+SAMPLE_SIZE = 4 * 1024 * 1024
+
+
+def get_codec(name=GZIP, level=None):
+    ''' Get the codec with the given name and compression level. '''
+    if name not in CODECS:
+        raise RuntimeError('Unsupported archive codec "{}"'.format(name))
+
+    return {'name': name, 'level': level}
+
+
+def get_extension(codec):
+    ''' Get the archive file extension for the codec. '''
+    return CODECS[codec['name']]['extension']
+
+
+def get_program(codec):
+    ''' Get the program required by the codec, if any. '''
+    return CODECS[codec['name']]['program']
+
+
+def compress_command(codec):
+    ''' Get the command to compress a stream with the codec. '''
+    cmd = CODECS[codec['name']]['compress']
+
+    if cmd and codec['level'] is not None:
+        return '{} -{}'.format(cmd, codec['level'])
+
+    return cmd
+
+
+def archive_command(name, path, codec=None):
+    ''' Get the command to compress the source path into a tar archive. '''
+    codec = codec or get_codec()
+    cmd = compress_command(codec)
+
+    if codec['name'] == NONE:
+        return 'tar -cvf {} {}'.format(name, path)
+
+    if codec['name'] == GZIP and codec['level'] is None:
+        return 'tar -czvf {} {}'.format(name, path)
+
+    return 'tar -cvf - {} | {} > {}'.format(path, cmd, name)
+
+
+def extract_command(src, dest, codec=None, unlink=False, verbose=True):
+    '''
+    Get the command to extract a tar archive to the destination path.
+    Use `-` as the source to extract the archive from the standard input.
+    '''
+    codec = codec or get_codec()
+    options = '--unlink-first ' if unlink else ''
+    flags = 'x' + ('z' if codec['name'] == GZIP else '') + ('v' if verbose else '') + 'f'
+
+    if codec['name'] in [GZIP, NONE]:
+        return 'tar {} {} {}--strip-components=1 -C {}'.format(
+            flags, src, options, dest
+        )
+
+    decompress = CODECS[codec['name']]['decompress']
+
+    if src != '-':
+        decompress = '{} < {}'.format(decompress, src)
+
+    return '{} | tar {} - {}--strip-components=1 -C {}'.format(
+        decompress, flags, options, dest
+    )
+
+
+def get_archive_options(codec):
+    '''
+    Get the options for `fs.write_archive()` to write
+    an archive compressed with the codec.
+    '''
+    return {
+        'compress': codec['name'] != NONE,
+        'compressor': compress_command(codec)
+    }
+
+
+def is_available(codec):
+    ''' Check if the program required by the codec is available locally. '''
+    program = get_program(codec)
+
+    return program is None or find_executable(program) is not None
+
+
+def get_candidates(programs=None):
+    '''
+    Get the codecs (with each of their levels) to choose from automatically.
+    If the list of `programs` available on the remote is provided,
+    only the codecs that could be extracted on the remote are included.
+    '''
+    candidates = []
+
+    for name in sorted(CODECS.keys()):
+        for level in CODECS[name]['levels']:
+            codec = get_codec(name, level)
+            program = get_program(codec)
+
+            if programs is not None and program and program not in programs:
+                continue
+
+            if is_available(codec):
+                candidates.append(codec)
+
+    return candidates
+
+
+def read_sample(source_dir, size=SAMPLE_SIZE):
+    '''
+    Read a sample of the files in the source directory,
+    and return it along with the total size of the directory.
+    '''
+    chunks = []
+    sampled = 0
+    total = 0
+
+    for root, _, filenames in os.walk(source_dir):
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+
+            total += os.path.getsize(path)
+
+            if sampled < size:
+                with open(path, 'rb') as f:
+                    chunk = f.read(size - sampled)
+
+                chunks.append(chunk)
+                sampled += len(chunk)
+
+    return (b''.join(chunks), total)
+
+
+def measure(codec, sample):
+    '''
+    Measure the compression ratio and the speed (bytes per second)
+    of the codec by compressing the sample.
+    '''
+    cmd = compress_command(codec)
+
+    if not cmd or not sample:
+        return (1.0, float('inf'))
+
+    start = time.time()
+    process = Popen(shlex.split(cmd), stdin=PIPE, stdout=PIPE)
+    (output, _) = process.communicate(sample)
+    elapsed = max(time.time() - start, 1e-6)
+
+    return (len(output) / float(len(sample)), len(sample) / elapsed)
+
+
+def estimate(size, ratio, speed, throughput):
+    '''
+    Estimate the time (in seconds) it takes to compress data of the given
+    size and transfer it over a link with the given throughput.
+    '''
+    return size / float(speed) + size * ratio / float(throughput)
+
+
+def select(measurements, size, throughput):
+    '''
+    Select the codec that takes the least time to compress and transfer,
+    given a list of (codec, ratio, speed) measurements.
+    '''
+    best = min(
+        measurements,
+        key=lambda m: estimate(size, m[1], m[2], throughput)
+    )
+
+    return best[0]
+
+
+def choose(source_dir, candidates, throughput):
+    '''
+    Choose the best of the candidate codecs for the source directory
+    by measuring each of them on a sample of the directory.
+    '''
+    (sample, size) = read_sample(source_dir)
+    measurements = [
+        (codec,) + measure(codec, sample) for codec in candidates
+    ]
+
+    return select(measurements, size, throughput)
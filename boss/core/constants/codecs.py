@@ -0,0 +1,40 @@
+''' Archive codec constants. '''
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+LZ4 = 'lz4'
+NONE = 'none'
+AUTO = 'auto'
+
+# The program required by each codec, its archive extension, the commands
+# to compress and decompress a stream and the levels considered in auto mode.
+CODECS = {
+    GZIP: {
+        'program': 'gzip',
+        'extension': '.tar.gz',
+        'compress': 'gzip',
+        'decompress': 'gzip -dc',
+        'levels': [1, 6]
+    },
+    ZSTD: {
+        'program': 'zstd',
+        'extension': '.tar.zst',
+        'compress': 'zstd -q -T0',
+        'decompress': 'zstd -q -dc',
+        'levels': [1, 3, 9]
+    },
+    LZ4: {
+        'program': 'lz4',
+        'extension': '.tar.lz4',
+        'compress': 'lz4 -q',
+        'decompress': 'lz4 -q -dc',
+        'levels': [1, 9]
+    },
+    NONE: {
+        'program': None,
+        'extension': '.tar',
+        'compress': None,
+        'decompress': None,
+        'levels': [None]
+    }
+}
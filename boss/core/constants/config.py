@@ -1,6 +1,6 @@
 ''' Configuration Constants. '''
 
-from . import ci, presets
+from . import ci, codecs, presets, release_modes, runners
 from .known_scripts import (INSTALL, INSTALL_REMOTE)
 
 
@@ -11,6 +11,7 @@ DEFAULT_CONFIG = {
     'ssh_forward_agent': False,
     'verbose_logging': False,
     'cwd': None,
+    'runner': runners.FABRIC,
     'branch': 'master',
     'repository_url': '',
     'project_name': 'untitled',
@@ -23,7 +24,10 @@ DEFAULT_CONFIG = {
     'vault': {
         'enabled': False,
         'path': 'secret',
-        'silent': False
+        'silent': False,
+        'cache': False,
+        'cache_ttl': 300,
+        'referenced_only': False
     },
     'ci': {
         'base_url': ci.TRAVIS_PAID_BASE_URL
@@ -34,7 +38,19 @@ DEFAULT_CONFIG = {
         'base_dir': '~/deployment',
         'keep_builds': 5,
         'include_files': [],
-        'use_local_ref': True
+        'use_local_ref': True,
+        'delta': False,
+        'stream': False,
+        'pipeline': False,
+        'pipeline_manifest': None,
+        'release_mode': release_modes.COPY,
+        'workers': 5,
+        'codec': codecs.GZIP,
+        'codec_level': None,
+        'cache': False,
+        'cache_max_size': 2048,
+        'reuse_dependencies': False,
+        'release_agent': False
     },
     'notifications': {
         'slack': {
@@ -59,7 +75,8 @@ DEFAULT_CONFIG = {
         }
     },
     'notified_hooks': {
-        'scripts': []
+        'scripts': [],
+        'coalesce': False
     }
 }
 
@@ -0,0 +1,4 @@
+''' Constants for the modes of copying files across releases. '''
+
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
@@ -4,7 +4,8 @@ from .notification_types import (
     DEPLOYMENT_STARTED,
     DEPLOYMENT_FINISHED,
     RUNNING_SCRIPT_STARTED,
-    RUNNING_SCRIPT_FINISHED
+    RUNNING_SCRIPT_FINISHED,
+    RUNNING_SCRIPTS_FINISHED
 )
 
 # TODO: Internationalization
@@ -39,5 +40,10 @@ MESSAGE_MAP = {
         # TODO: Rename this to started_color & ci_started_color
         'color': 'deployed_color',
         'ci_color': 'ci_deployed_color'
+    },
+    RUNNING_SCRIPTS_FINISHED: {
+        'message': '{user} ran {script} for {project_link} on {server_link} server.',
+        'color': 'deployed_color',
+        'ci_color': 'ci_deployed_color'
     }
 }
@@ -4,3 +4,4 @@ DEPLOYMENT_STARTED = 1
 DEPLOYMENT_FINISHED = 2
 RUNNING_SCRIPT_STARTED = 3
 RUNNING_SCRIPT_FINISHED = 4
+RUNNING_SCRIPTS_FINISHED = 5
@@ -0,0 +1,4 @@
+''' Release mode constants. '''
+
+COPY = 'copy'
+HARDLINK = 'hardlink'
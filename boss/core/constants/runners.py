@@ -0,0 +1,4 @@
+''' Constants for the remote command runners. '''
+
+FABRIC = 'fabric'
+SHELL = 'shell'
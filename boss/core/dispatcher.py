@@ -0,0 +1,87 @@
+'''
+Background dispatcher.
+
+Runs the dispatched calls in the background, so that the caller doesn't
+wait on them. Each key (ie: a notification service) gets its own worker
+thread, so the calls for different keys run concurrently, while the calls
+for the same key run in the order they were dispatched. The pending calls
+are flushed at exit.
+'''
+
+import os
+import time
+import atexit
+from Queue import Queue
+from threading import Thread, Lock
+
+# Maximum time (in seconds) to wait for the pending calls at exit.
+FLUSH_TIMEOUT = 15
+
+_queues = {}
+_lock = Lock()
+
+# Worker threads don't survive a fork, so the calls dispatched from forked
+# processes (ie: fabric's parallel tasks) are run right away instead.
+_pid = os.getpid()
+
+
+def work(queue):
+    ''' Run the calls from the queue, one after another. '''
+    while True:
+        (func, args, kwargs) = queue.get()
+
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            # The dispatched functions handle their own errors,
+            # this only keeps the worker alive.
+            pass
+        finally:
+            queue.task_done()
+
+
+def get_queue(key):
+    ''' Get the queue for the key, starting its worker if it isn't started. '''
+    with _lock:
+        if key not in _queues:
+            queue = Queue()
+            worker = Thread(target=work, args=(queue,))
+            worker.daemon = True
+            worker.start()
+            _queues[key] = queue
+
+        return _queues[key]
+
+
+def dispatch(key, func, *args, **kwargs):
+    ''' Run the function with the arguments in the background. '''
+    if os.getpid() != _pid:
+        return func(*args, **kwargs)
+
+    get_queue(key).put((func, args, kwargs))
+
+
+def flush(timeout=FLUSH_TIMEOUT):
+    '''
+    Wait until all of the dispatched calls are completed, at most
+    for the timeout (in seconds). Returns False if it timed out.
+    '''
+    deadline = time.time() + timeout
+
+    with _lock:
+        queues = _queues.values()
+
+    for queue in queues:
+        with queue.all_tasks_done:
+            while queue.unfinished_tasks:
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+                    return False
+
+                queue.all_tasks_done.wait(remaining)
+
+    return True
+
+
+atexit.register(flush)
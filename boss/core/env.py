@@ -1,6 +1,9 @@
 ''' Utility for parsing env declarations. '''
 
+import os
 import codecs
+from contextlib import contextmanager
+
 from .util.string import is_quoted
 
 __escape_decoder = codecs.getdecoder('unicode_escape')
@@ -31,3 +34,23 @@ def parse(env_def):
 
 def decode_escaped(escaped):
     return __escape_decoder(escaped)[0]
+
+
+@contextmanager
+def override(env_vars):
+    '''
+    Set the env vars in the environment of the local process (and so of the
+    local commands), restoring the previous environment afterwards.
+    '''
+    previous = dict((x, os.environ.get(x)) for x in env_vars)
+
+    os.environ.update(env_vars)
+
+    try:
+        yield
+    finally:
+        for (key, value) in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
@@ -2,7 +2,11 @@
 Boss core file system utilities.
 '''
 import os
+import shlex
+import shutil
 import tarfile
+from threading import Thread
+from subprocess import Popen, PIPE
 
 
 def read(filename):
@@ -22,12 +26,101 @@ def exists(path):
     return os.path.exists(path)
 
 
+def get_size(path):
+    ''' Get the size of the file in bytes, or 0 if it doesn't exist. '''
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
 def compress(source_dir, filename):
     ''' Compress a directory and build an archive (Tar zipped). '''
     with tarfile.open(filename, 'w:gz') as tar:
         tar.add(source_dir, arcname=os.path.basename(source_dir))
 
 
+def compress_files(source_dir, filename, files, arcname='build', **params):
+    '''
+    Compress only the given files (relative to the source directory)
+    and build an archive (Tar zipped) out of them.
+    '''
+    with open(filename, 'wb') as f:
+        write_archive(f, source_dir, files, arcname, **params)
+
+
+def write_archive(fileobj, source_dir, files=None, arcname='build', **params):
+    '''
+    Write a tar zipped archive of the source directory to a file object
+    as a stream. If `files` are provided, only those files (relative to the
+    source directory) are written to the archive.
+
+    If a `compressor` command is provided, the archive is piped through it
+    instead of being gzipped. Set `compress` to False for a plain tar.
+    '''
+    compressor = params.get('compressor')
+
+    if not compressor:
+        mode = 'w|gz' if params.get('compress', True) else 'w|'
+        write_tar(fileobj, source_dir, files, arcname, mode)
+        return
+
+    process = Popen(shlex.split(compressor), stdin=PIPE, stdout=PIPE)
+    errors = []
+
+    def feed():
+        ''' Write the tar archive to the compressor. '''
+        try:
+            write_tar(process.stdin, source_dir, files, arcname, 'w|')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            process.stdin.close()
+
+    writer = Thread(target=feed)
+    writer.start()
+    shutil.copyfileobj(process.stdout, fileobj)
+    writer.join()
+
+    if errors:
+        raise errors[0]
+
+    if process.wait() != 0:
+        raise RuntimeError(
+            'Failed compressing the archive with "{}"'.format(compressor)
+        )
+
+
+class CountingWriter(object):
+    ''' A file object wrapper that counts the bytes written through it. '''
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+
+def write_tar(fileobj, source_dir, files, arcname, mode):
+    ''' Write a tar archive of the source directory with the given mode. '''
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        if files is None:
+            tar.add(source_dir, arcname=arcname)
+            return
+
+        for name in files:
+            tar.add(
+                os.path.join(source_dir, name),
+                arcname=os.path.join(arcname, name),
+                recursive=False
+            )
+
+
 def rm(path):
     ''' Remove a file given by the path. '''
     return os.remove(path)
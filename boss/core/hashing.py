@@ -2,6 +2,8 @@
 
 import hashlib
 
+CHUNK_SIZE = 64 * 1024
+
 
 def md5(string):
     ''' Generate md5 hex digest value. '''
@@ -9,3 +11,14 @@ def md5(string):
     m.update(string)
 
     return m.hexdigest()
+
+
+def md5_file(filename):
+    ''' Generate md5 hex digest value of the contents of a file. '''
+    m = hashlib.md5()
+
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            m.update(chunk)
+
+    return m.hexdigest()
@@ -0,0 +1,32 @@
+'''
+HTTP utilities.
+
+Requests are sent over keep-alive sessions, one for each thread
+(and process), and always with a timeout.
+'''
+
+import os
+from threading import local
+
+# Connect and read timeouts (in seconds) for the requests.
+TIMEOUT = (5, 10)
+
+_local = local()
+
+
+def get_session():
+    ''' Get the HTTP session of the current thread. '''
+    import requests
+
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.session = requests.Session()
+        _local.pid = os.getpid()
+
+    return _local.session
+
+
+def post(url, **params):
+    ''' Send a POST request. '''
+    params.setdefault('timeout', TIMEOUT)
+
+    return get_session().post(url, **params)
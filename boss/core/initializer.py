@@ -13,7 +13,6 @@ from boss.constants import (
     DEFAULT_CONFIG_FILE
 )
 from boss.core.constants.config import DEFAULT_CONFIG
-from boss.core.inquiries import get_initial_config_params
 
 
 def initialize(interactive):
@@ -57,6 +56,8 @@ def initialize_config(interactive):
             'deployment_base_dir': DEFAULT_CONFIG['deployment']['base_dir']
         }
     else:
+        from boss.core.inquiries import get_initial_config_params
+
         tmpl_params = get_initial_config_params()
 
     fs.write(config_file, config_tmpl.format(**tmpl_params))
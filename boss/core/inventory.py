@@ -0,0 +1,150 @@
+'''
+Host inventory utilities.
+
+An inventory is a YAML or an INI file listing the hosts of a stage, each
+with its own (optional) user, port and SSH key, and the named groups
+of those hosts. For instance, in YAML:
+
+    hosts:
+      app1.example.com:
+        user: deploy
+        port: 2222
+        key_filename: ~/.ssh/app1.pem
+      app2.example.com:
+    groups:
+      web: [app1.example.com, app2.example.com]
+
+or in INI, where each section is a group:
+
+    [web]
+    app1.example.com user=deploy port=2222 key_filename=~/.ssh/app1.pem
+    app2.example.com
+'''
+
+import os
+from fnmatch import fnmatch
+from collections import OrderedDict
+
+from boss.core import fs
+
+INI_EXTENSIONS = ['.ini', '.cfg']
+
+# The group that includes all of the hosts.
+ALL = 'all'
+
+
+def parse_yaml(data):
+    ''' Parse an inventory in YAML. '''
+    import yaml
+
+    parsed = yaml.safe_load(data) or {}
+    hosts = OrderedDict()
+    groups = {}
+
+    declared = parsed.get('hosts') or {}
+
+    # The hosts could be listed with their host vars or just by their names.
+    if isinstance(declared, dict):
+        declared = [(x, declared[x]) for x in sorted(declared.keys())]
+    else:
+        declared = [(x, None) for x in declared]
+
+    for (name, host_vars) in declared:
+        hosts[name] = dict(host_vars or {})
+
+    for (group, names) in (parsed.get('groups') or {}).items():
+        groups[group] = list(names or [])
+
+        for name in groups[group]:
+            hosts.setdefault(name, {})
+
+    return {'hosts': hosts, 'groups': groups}
+
+
+def parse_ini(data):
+    ''' Parse an inventory in INI. '''
+    import yaml
+
+    hosts = OrderedDict()
+    groups = {}
+    group = None
+
+    for line in data.splitlines():
+        line = line.strip()
+
+        if not line or line[0] in '#;':
+            continue
+
+        if line.startswith('[') and line.endswith(']'):
+            group = line[1:-1].strip()
+            groups.setdefault(group, [])
+            continue
+
+        parts = line.split()
+        name = parts[0]
+        host_vars = hosts.setdefault(name, {})
+
+        for part in parts[1:]:
+            (key, _, value) = part.partition('=')
+            host_vars[key] = yaml.safe_load(value)
+
+        if group is not None and name not in groups[group]:
+            groups[group].append(name)
+
+    return {'hosts': hosts, 'groups': groups}
+
+
+def load(path):
+    ''' Load the inventory from the file, parsed by its extension. '''
+    data = fs.read(path)
+    (_, extension) = os.path.splitext(path)
+
+    if extension.lower() in INI_EXTENSIONS:
+        return parse_ini(data)
+
+    return parse_yaml(data)
+
+
+def select(inventory, group=None, pattern=None):
+    '''
+    Select the hosts of the group from the inventory, optionally filtered
+    by the host name pattern(s), ie: `app1*` or `app1*;app2*`.
+    Returns the list of selected hosts, each with its name and host vars.
+    '''
+    if not group or group == ALL:
+        names = inventory['hosts'].keys()
+    elif group in inventory['groups']:
+        names = inventory['groups'][group]
+    else:
+        raise KeyError('Unknown host group "{}"'.format(group))
+
+    return [
+        dict(inventory['hosts'][name], name=name)
+        for name in filter_names(names, pattern)
+    ]
+
+
+def filter_names(names, pattern=None):
+    ''' Filter the host names by the pattern(s), separated by `;`. '''
+    if not pattern:
+        return list(names)
+
+    patterns = [x.strip() for x in pattern.split(';') if x.strip()]
+
+    return [x for x in names if any(fnmatch(x, p) for p in patterns)]
+
+
+def get_host_string(host):
+    '''
+    Get the host string for the host, ie: `user@name:port`,
+    with the user and the port only if they're set for the host.
+    '''
+    host_string = host['name']
+
+    if host.get('user'):
+        host_string = '{}@{}'.format(host['user'], host_string)
+
+    if host.get('port'):
+        host_string = '{}:{}'.format(host_string, host['port'])
+
+    return host_string
@@ -0,0 +1,50 @@
+'''
+Build manifest utilities.
+
+A manifest is a mapping of the relative path of each file in a build
+directory to a hash of its contents, which is used to figure out the
+files that have changed between two builds.
+'''
+
+import os
+
+from .hashing import md5, md5_file
+
+LINK_PREFIX = 'link:'
+
+
+def generate(source_dir):
+    ''' Generate a manifest for all the files under the source directory. '''
+    manifest = {}
+
+    for (root, dirs, files) in os.walk(source_dir):
+        # Symlinks to directories are not followed by os.walk,
+        # so they need to be recorded as entries too.
+        links = [x for x in dirs if os.path.islink(os.path.join(root, x))]
+
+        for name in files + links:
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, source_dir)
+            manifest[key] = hash_entry(path)
+
+    return manifest
+
+
+def hash_entry(path):
+    ''' Get the hash of a single manifest entry (file or symlink). '''
+    if os.path.islink(path):
+        return LINK_PREFIX + md5(os.readlink(path))
+
+    return md5_file(path)
+
+
+def diff(old, new):
+    '''
+    Compare two manifests and return a tuple of the files that
+    were added or changed and the files that were removed in the new one.
+    '''
+    old = old or {}
+    changed = [x for x in new if old.get(x) != new[x]]
+    removed = [x for x in old if x not in new]
+
+    return (sorted(changed), sorted(removed))
@@ -95,4 +95,9 @@ def get_notification_params(**params):
         preformat = params.get('pre_format') or (lambda x: x)
         result['script'] = preformat(params['script'])
 
+    # Multiple scripts, when their notifications are coalesced.
+    if params.get('scripts'):
+        preformat = params.get('pre_format') or (lambda x: x)
+        result['script'] = ', '.join(preformat(x) for x in params['scripts'])
+
     return result
@@ -0,0 +1,85 @@
+'''
+Build pipeline utilities.
+
+While the build is still running, its output directory is scanned at
+intervals and the files that have settled, ie: that haven't changed since
+the previous scan, are picked to be uploaded. Alternatively, the build
+could list the files it has finished writing in a manifest file, a path
+(relative to the build directory) per line.
+
+A file is identified by its modification time and size, so once the build
+is done, the files that have changed since they were uploaded (or were
+removed) are found by scanning the build directory once more.
+'''
+
+import os
+
+
+def get_stat(path):
+    ''' Get the modification time and the size of a file (or a symlink). '''
+    stat = os.lstat(path)
+
+    return (stat.st_mtime, stat.st_size)
+
+
+def scan(source_dir, since=None):
+    '''
+    Scan the files under the source directory, optionally only the ones
+    modified since the given time. Returns the stat of each of the files,
+    by their paths relative to the source directory.
+    '''
+    result = {}
+
+    for (root, dirs, files) in os.walk(source_dir):
+        # Symlinks to directories are not followed by os.walk,
+        # so they need to be picked up too.
+        links = [x for x in dirs if os.path.islink(os.path.join(root, x))]
+
+        for name in files + links:
+            path = os.path.join(root, name)
+
+            try:
+                stat = get_stat(path)
+            except OSError:
+                # The file has been removed by the build in the meantime.
+                continue
+
+            if since is None or stat[0] >= since:
+                result[os.path.relpath(path, source_dir)] = stat
+
+    return result
+
+
+def read_manifest(path):
+    ''' Read the files listed in the manifest written by the build. '''
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return [x.strip() for x in f if x.strip()]
+
+
+def get_settled(previous, current, uploaded, listed=None):
+    '''
+    Get the files that have settled between the previous and the current
+    scans, and haven't been uploaded as they are. If the files listed by the
+    build's manifest are given, only those are picked up.
+    '''
+    names = current if listed is None else [x for x in listed if x in current]
+
+    return sorted(
+        x for x in names
+        if previous.get(x) == current[x] and uploaded.get(x) != current[x]
+    )
+
+
+def get_remaining(final, uploaded):
+    '''
+    Compare the final scan of the build with the files uploaded, and return
+    a tuple of the files still to be uploaded (new or changed since uploaded)
+    and the files uploaded that are no longer in the build.
+    '''
+    changed = [x for x in final if uploaded.get(x) != final[x]]
+    removed = [x for x in uploaded if x not in final]
+
+    return (sorted(changed), sorted(removed))
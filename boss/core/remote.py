@@ -7,6 +7,20 @@ which uses paramiko directly for remote execution and transfers.
 '''
 
 import os
+import uuid
+
+# Shell started for a persistent session, reading the commands from stdin.
+SHELL_COMMAND = '/bin/bash -l -s'
+
+# Each command of a session is run in a subshell (so that it could neither
+# change the state of the session nor read the commands following it), only
+# if the previous commands of the batch have succeeded, and its exit status
+# is framed with a marker so that its output could be told apart from the
+# next one.
+FRAME = (
+    'if [ $__boss_status -eq 0 ]; then ({command}\n) < /dev/null; '
+    '__boss_status=$?; printf "%s %d\\n" {marker} $__boss_status; fi'
+)
 
 
 def normalize_path(sftp_client, remote_path):
@@ -60,3 +74,128 @@ def run(client, command, **params):
         timeout=timeout,
         environment=environment
     )
+
+
+def stream(client, command, writer, **params):
+    '''
+    Execute a command on a opened instance of SSHClient for a remote host,
+    streaming the data written by `writer` to the standard input of the command.
+
+    Returns a tuple of the exit status and the error output of the command.
+    '''
+    (stdin, stdout, stderr) = run(client, command, **params)
+
+    writer(stdin)
+
+    # Send EOF so that the remote command knows the input is complete.
+    stdin.flush()
+    stdin.channel.shutdown_write()
+
+    status = stdout.channel.recv_exit_status()
+
+    return (status, stderr.read())
+
+
+def open_shell(client, command=SHELL_COMMAND):
+    '''
+    Open a persistent shell session on a opened instance of SSHClient
+    for a remote host. The error output is combined with the output.
+    '''
+    channel = client.get_transport().open_session()
+    channel.set_combine_stderr(True)
+    channel.exec_command(command)
+
+    return {
+        'channel': channel,
+        'stdin': channel.makefile('wb'),
+        'stdout': channel.makefile('rb')
+    }
+
+
+def is_shell_open(session):
+    ''' Check if the shell session is still open. '''
+    channel = session['channel']
+
+    return not channel.closed and not channel.exit_status_ready()
+
+
+def close_shell(session):
+    ''' Close the shell session. '''
+    session['channel'].close()
+
+
+def execute(session, command, writer=None):
+    '''
+    Execute the command in a persistent shell session. The output of the
+    command is streamed line by line to the `writer` if provided.
+
+    Returns a tuple of the exit status and the output of the command.
+    '''
+    return execute_all(session, [command], writer)[0]
+
+
+def execute_all(session, commands, writer=None):
+    '''
+    Execute the commands in a persistent shell session.
+
+    The commands are pipelined, ie: all of them are sent at once and their
+    results are read in order, but a command is run only if all the previous
+    ones have succeeded. The output of the commands is streamed line by line
+    to the `writer` if provided.
+
+    Returns a list of tuples of the exit status and the output of each of
+    the commands that were run.
+    '''
+    marker = '__boss_{}__'.format(uuid.uuid4().hex)
+    script = ['__boss_status=0'] + [
+        FRAME.format(command=command, marker=marker) for command in commands
+    ]
+
+    session['stdin'].write('\n'.join(script) + '\n')
+    session['stdin'].flush()
+
+    results = []
+
+    while len(results) < len(commands):
+        (status, output) = read_result(session, marker, writer)
+        results.append((status, output))
+
+        # The rest of the commands are skipped after a failure.
+        if status != 0:
+            break
+
+    return results
+
+
+def read_result(session, marker, writer=None):
+    '''
+    Read the output of a command run in the shell session until its exit
+    status framed with the marker, and return both of them.
+    '''
+    lines = []
+
+    while True:
+        line = session['stdout'].readline()
+
+        if not line:
+            raise RuntimeError('The remote shell session was closed unexpectedly')
+
+        index = line.find(marker)
+
+        if index < 0:
+            lines.append(line)
+
+            if writer:
+                writer(line)
+            continue
+
+        # The output might not end with a new line before the marker.
+        if index > 0:
+            lines.append(line[:index])
+
+            if writer:
+                writer(line[:index] + '\n')
+
+        status = int(line[index + len(marker):].strip())
+
+        return (status, ''.join(lines))
@@ -0,0 +1,136 @@
+'''
+Phase scheduler.
+
+Runs a set of phases, each declaring the phases it requires, as a graph:
+a phase is started as soon as all of its required phases are done, so the
+phases that don't depend on each other run concurrently (a thread each).
+'''
+
+import time
+from threading import Thread, Condition
+
+# Interval (in seconds) the scheduler wakes up at while waiting on the phases,
+# so that it's still interrupted by signals (ie: Ctrl+C) in the meantime.
+POLL_INTERVAL = 0.1
+
+
+def phase(name, func, requires=()):
+    '''
+    Define a phase, run with `func(results)` where the results are the
+    values returned by the phases done so far, by their names.
+    '''
+    return {'name': name, 'func': func, 'requires': list(requires)}
+
+
+def validate(phases):
+    ''' Check the phases require only the phases defined before them. '''
+    names = set()
+
+    for item in phases:
+        unknown = [x for x in item['requires'] if x not in names]
+
+        if unknown:
+            raise ValueError('Phase "{}" requires unknown phase(s): {}'.format(
+                item['name'], ', '.join(unknown)
+            ))
+
+        names.add(item['name'])
+
+
+def run(phases, results=None):
+    '''
+    Run the phases, each as soon as the phases it requires are done.
+    Returns the timings of the phases, by their names: `(started, ended)`.
+
+    The values returned by the phases are kept in the results dict (if given),
+    by the names of the phases. If a phase fails, no more phases are started
+    and the error is raised once the phases already running are done.
+    '''
+    validate(phases)
+
+    results = {} if results is None else results
+    timings = {}
+    pending = list(phases)
+    running = set()
+    errors = []
+    condition = Condition()
+
+    def run_phase(item):
+        ''' Run a phase, and keep its result or the error if it fails. '''
+        started = time.time()
+
+        try:
+            result = item['func'](results)
+        except BaseException as e:
+            # Including SystemExit from halt() or fabric's abort(),
+            # which would only exit the phase's thread otherwise.
+            result = None
+            errors.append(e)
+
+        with condition:
+            results[item['name']] = result
+            timings[item['name']] = (started, time.time())
+            running.discard(item['name'])
+            condition.notify_all()
+
+    with condition:
+        while pending or running:
+            ready = [] if errors else [
+                x for x in pending
+                if all(y in timings for y in x['requires'])
+            ]
+
+            for item in ready:
+                pending.remove(item)
+                running.add(item['name'])
+                thread = Thread(target=run_phase, args=(item,))
+                thread.daemon = True
+                thread.start()
+
+            if errors and not running:
+                break
+
+            condition.wait(POLL_INTERVAL)
+
+    if errors:
+        raise errors[0]
+
+    return timings
+
+
+def get_critical_path(phases, timings):
+    '''
+    Get the critical path of the phases run, ie: the chain of the phases that
+    determined the total time, traced back from the phase that ended last
+    through the required phase that ended last at each step.
+    '''
+    requires = dict((x['name'], x['requires']) for x in phases)
+    done = [x for x in requires if x in timings]
+
+    if not done:
+        return []
+
+    path = [max(done, key=lambda x: timings[x][1])]
+
+    while requires[path[0]]:
+        path.insert(0, max(requires[path[0]], key=lambda x: timings[x][1]))
+
+    return path
+
+
+def format_timings(phases, timings):
+    ''' Format the timings of the critical path of the phases, for display. '''
+    path = get_critical_path(phases, timings)
+
+    if not path:
+        return ''
+
+    started = min(x[0] for x in timings.values())
+    ended = max(x[1] for x in timings.values())
+    steps = [
+        '{} ({:.1f}s)'.format(x, timings[x][1] - timings[x][0]) for x in path
+    ]
+
+    return 'Critical path: {} | Total: {:.1f}s'.format(
+        ' -> '.join(steps), ended - started
+    )
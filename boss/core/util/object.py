@@ -1,7 +1,119 @@
 ''' Object utility functions. '''
 
 import collections
-from copy import deepcopy
+
+
+def _read_only(self, *args, **kwargs):
+    ''' Raise an error for any attempt to mutate a frozen object. '''
+    raise TypeError('{} is read-only'.format(type(self).__name__))
+
+
+class FrozenDict(dict):
+    '''
+    A read-only dict.
+
+    It's never copied, not even by deepcopy(), as it can't be mutated;
+    so it's safe to share it (and its subtrees) everywhere.
+    '''
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    ''' A read-only list, shared instead of copied like FrozenDict. '''
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _read_only
+    __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+
+class LazyDict(collections.Mapping):
+    '''
+    A read-only mapping, whose values are resolved from the source values
+    with the resolver function the first time they're accessed,
+    and memoized after that.
+    '''
+
+    def __init__(self, source, resolve):
+        self._source = source
+        self._resolve = resolve
+        self._resolved = {}
+
+    def __getitem__(self, key):
+        if key not in self._resolved:
+            self._resolved[key] = self._resolve(self._source[key])
+
+        return self._resolved[key]
+
+    def __contains__(self, key):
+        return key in self._source
+
+    def __iter__(self):
+        return iter(self._source)
+
+    def __len__(self):
+        return len(self._source)
+
+    def __repr__(self):
+        return 'LazyDict({!r})'.format(self._source.keys())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (LazyDict, (self._source, self._resolve))
+
+
+def freeze(obj, memo=None):
+    '''
+    Freeze the dicts and lists in the object recursively,
+    and return the frozen object.
+
+    Frozen (and lazy) objects are returned as they are, and a subtree shared
+    by multiple parents is frozen only once and still shared in the result.
+    '''
+    if isinstance(obj, (FrozenDict, FrozenList, LazyDict)):
+        return obj
+
+    memo = {} if memo is None else memo
+
+    if id(obj) in memo:
+        return memo[id(obj)]
+
+    if isinstance(obj, collections.Mapping):
+        frozen = FrozenDict(
+            (key, freeze(value, memo)) for key, value in obj.iteritems()
+        )
+    elif isinstance(obj, list):
+        frozen = FrozenList(freeze(value, memo) for value in obj)
+    else:
+        return obj
+
+    memo[id(obj)] = frozen
+
+    return frozen
 
 
 def merge(dict1, dict2):
@@ -10,13 +122,16 @@ def merge(dict1, dict2):
     return the merged dict. (Immutable)
 
     Note: dict2 overrides the keys of dict1 if they have same keys.
+    The values that aren't changed by the merge are shared with the
+    source dicts rather than copied, so freeze() the sources if
+    the result is going to be mutated further.
     '''
-    result = deepcopy(dict1)
+    result = dict(dict1)
 
     for key, value in dict2.iteritems():
         if isinstance(value, collections.Mapping):
             result[key] = merge(result.get(key, {}), value)
         else:
-            result[key] = deepcopy(dict2[key])
+            result[key] = value
 
     return result
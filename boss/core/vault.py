@@ -3,17 +3,38 @@ Vault client util functions.
 '''
 
 import os
+import json
+import time
+import base64
+import hashlib
+from threading import Thread, Lock
 from hvac import Client
 from hvac.exceptions import Forbidden, VaultError
 from requests.exceptions import ConnectionError
 
+from boss.core import cache
 from boss.core.output import info, halt
+from boss.constants import BOSS_VAULT_CACHE_PATH
+
+# Set this env var to `true` to read the secrets from vault, bypassing the cache.
+REFRESH_ENV_VAR = 'BOSS_VAULT_REFRESH'
+
+# The cached secrets are readable only by the user.
+CACHE_DIR_MODE = 0o700
+CACHE_FILE_MODE = 0o600
+
+# The connected clients by the vault address and token.
+_clients = {}
+_lock = Lock()
 
 
 def connect():
     '''
     Connect to the vault server and return the
     connected vault client instance.
+
+    The client (and its pool of HTTP connections) is shared by all of the
+    reads with the same `VAULT_ADDR` and `VAULT_TOKEN`, from any thread.
     '''
 
     url = os.environ.get('VAULT_ADDR')
@@ -25,19 +46,33 @@ def connect():
             '`VAULT_ADDR` and `VAULT_TOKEN` must be set in your environment.'
         )
 
-    return Client(url=url, token=token)
+    with _lock:
+        if (url, token) not in _clients:
+            _clients[(url, token)] = Client(url=url, token=token)
+
+        return _clients[(url, token)]
 
 
 def read_secrets(path):
     ''' Read secrets from the given path. '''
+    (secrets, _) = read_secrets_with_lease(path)
+
+    return secrets
+
+
+def read_secrets_with_lease(path):
+    '''
+    Read secrets from the given path, along with their lease duration
+    (in seconds). The lease duration is None if the secrets have none.
+    '''
     try:
         client = connect()
         result = client.read(path)
 
         if not result or not result.get('data'):
-            return {}
+            return ({}, None)
 
-        return result['data']
+        return (result['data'], result.get('lease_duration') or None)
     except ConnectionError:
         halt(
             'Failed connecting to vault server at {}.'.format(
@@ -57,15 +92,187 @@ def read_secrets(path):
         halt('Vault Error: ' + e.message)
 
 
-def env_inject_secrets(path, silent=False):
+def get_cache_key(path):
+    ''' Get the key the secrets of the path are cached by. '''
+    return hashlib.sha256(
+        '{}\n{}'.format(os.environ.get('VAULT_ADDR'), path)
+    ).hexdigest()
+
+
+def get_cipher():
+    '''
+    Get the cipher the cached secrets are encrypted with.
+    The encryption key is derived from the vault token, so the cached
+    secrets can only be read with the token they were read with.
+    '''
+    from cryptography.fernet import Fernet
+
+    digest = hashlib.sha256(
+        '{}\n{}'.format(os.environ.get('VAULT_ADDR'), os.environ.get('VAULT_TOKEN'))
+    ).digest()
+
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+def read_cache(path):
+    '''
+    Read the secrets of the path from the cache.
+    Returns None if they aren't cached, have expired or can't be decrypted.
+    '''
+    from cryptography.fernet import InvalidToken
+
+    token = cache.read(BOSS_VAULT_CACHE_PATH, get_cache_key(path))
+
+    if not token:
+        return None
+
+    try:
+        entry = json.loads(get_cipher().decrypt(token))
+    except (InvalidToken, ValueError, TypeError):
+        return None
+
+    if entry['expires_at'] <= time.time():
+        return None
+
+    return entry['secrets']
+
+
+def write_cache(path, secrets, ttl):
+    ''' Cache the secrets of the path, encrypted, for the ttl (in seconds). '''
+    if not os.path.exists(BOSS_VAULT_CACHE_PATH):
+        os.makedirs(BOSS_VAULT_CACHE_PATH, CACHE_DIR_MODE)
+
+    token = get_cipher().encrypt(json.dumps({
+        'expires_at': time.time() + ttl,
+        'secrets': secrets
+    }))
+
+    cache.write(
+        BOSS_VAULT_CACHE_PATH,
+        get_cache_key(path),
+        token,
+        mode=CACHE_FILE_MODE
+    )
+
+
+def read_cached_secrets(path, ttl, refresh=False):
+    '''
+    Read secrets from the given path, from the local cache if they're
+    cached and haven't expired, or else from vault caching them for the ttl
+    (in seconds), or their lease duration if that's shorter.
+    With `refresh`, the secrets are always read from vault.
+    Returns the secrets and whether they're read from the cache.
+    '''
+    secrets = None if refresh else read_cache(path)
+
+    if secrets is not None:
+        return (secrets, True)
+
+    (secrets, lease_duration) = read_secrets_with_lease(path)
+    write_cache(path, secrets, min(ttl, lease_duration or ttl))
+
+    return (secrets, False)
+
+
+def get_cache_summary(cached_count, total):
+    ''' Get the summary of the number of paths read from the cache. '''
+    if not cached_count:
+        return ''
+
+    if cached_count == total:
+        return ' (cached)'
+
+    return ' ({} of {} cached)'.format(cached_count, total)
+
+
+def should_refresh():
+    ''' Check if the cached secrets are to be refreshed from vault. '''
+    return os.environ.get(REFRESH_ENV_VAR) == 'true'
+
+
+def get_paths(path):
+    ''' Get the list of paths from a path or a list of paths. '''
+    if isinstance(path, (list, tuple)):
+        return list(path)
+
+    return [path]
+
+
+def read_concurrently(paths, read):
     '''
-    Read secrets from the vault (from the given path),
+    Read each of the paths with the read function concurrently,
+    a thread for each path, and return the results in the order of the paths.
+    An error raised by any of the reads is raised again once all are done.
+    '''
+    if len(paths) == 1:
+        return [read(paths[0])]
+
+    results = [None] * len(paths)
+    errors = []
+
+    def read_path(index, path):
+        ''' Read the path and keep the result, or the error if it fails. '''
+        try:
+            results[index] = read(path)
+        except BaseException as e:
+            # Including SystemExit from halt(), which wouldn't
+            # stop anything but the thread it's raised on.
+            errors.append(e)
+
+    threads = [
+        Thread(target=read_path, args=(i, x)) for (i, x) in enumerate(paths)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+def env_inject_secrets(path, silent=False, cache_ttl=None, keys=None):
+    '''
+    Read secrets from the vault (from the given path or the list of paths),
     and inject them into the environment as env vars.
+
+    Multiple paths are read concurrently (over the same client), and the
+    secrets of a path override the same secrets of the paths before it.
+    The secrets are cached locally if the cache ttl (in seconds) is given.
+    If the keys are given, only those secrets are injected.
     '''
-    secrets = read_secrets(path)
+    paths = get_paths(path)
+    refresh = should_refresh()
+    started_at = time.time()
+
+    def read(path):
+        ''' Read the secrets of a path, and whether they're cached. '''
+        if cache_ttl:
+            return read_cached_secrets(path, cache_ttl, refresh)
+
+        return (read_secrets(path), False)
+
+    results = read_concurrently(paths, read)
+    secrets = {}
+
+    for (path_secrets, _) in results:
+        secrets.update(path_secrets)
+
+    if keys is not None:
+        secrets = dict((x, y) for (x, y) in secrets.items() if x in keys)
 
     if not silent:
-        info('Using secrets from vault ({})'.format(path))
+        cached_count = len([x for (_, x) in results if x])
+
+        info('Using secrets from vault ({}){} in {:.2f}s'.format(
+            ', '.join(paths),
+            get_cache_summary(cached_count, len(paths)),
+            time.time() - started_at
+        ))
 
     for key, value in secrets.iteritems():
         os.environ[key] = value
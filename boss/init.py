@@ -6,9 +6,17 @@ from fabric.api import env, task
 from fabric.tasks import _is_task
 
 
-from .config import load as load_config, get as get_config, get_stage_config
+from . import state, tasks
+from .config import (
+    prepare as prepare_config,
+    get as get_config,
+    get_stage_config,
+    get_stage_hosts
+)
+from .core import inventory
+from .core.output import halt
 from .core.initializer import setup_boss_home
-from .api.shell import get_stage
+from .api.shell import get_stage, get_commands
 from .api.deployment import deployer
 
 
@@ -17,15 +25,32 @@ def init(module_name):
     os.environ['BOSS_RUNNING'] = 'true'
     setup_boss_home()
     stage = get_stage()
-    config = load_config(stage=stage)
+
+    # The config is loaded only when a task first uses it, and the secrets
+    # are read from vault only when they're needed, the outline is enough
+    # to define the tasks.
+    config = prepare_config(stage=stage)
 
     module = sys.modules[module_name]
-    define_stage_tasks(module, config)
-    define_preset_tasks(module, config)
+    define_stage_tasks(module, config, stage)
+
+    if needs_preset_tasks(config):
+        define_preset_tasks(module, config)
 
     return (config, stage)
 
 
+def needs_preset_tasks(config):
+    '''
+    Check if the tasks of the deployment preset need to be defined,
+    ie: unless only the stage tasks and the default tasks are to be run.
+    '''
+    commands = get_commands()
+    known_tasks = set(config['stages'].keys()) | set(tasks.__all__)
+
+    return not commands or any(x not in known_tasks for x in commands)
+
+
 def define_preset_tasks(module, config):
     ''' Define tasks for the configured deployment preset. '''
     deployment = deployer.import_preset(config)
@@ -38,9 +63,14 @@ def define_preset_tasks(module, config):
         setattr(module, task_name, func)
 
 
-def define_stage_tasks(module, config):
-    ''' Define tasks for the stages dynamically. '''
-    for (stage_name, _) in config['stages'].iteritems():
+def define_stage_tasks(module, config, stage=None):
+    '''
+    Define tasks for the stages dynamically.
+    If the stage is a configured stage, only its task is defined.
+    '''
+    stage_names = [stage] if stage in config['stages'] else config['stages']
+
+    for stage_name in stage_names:
         task_func = task(name=stage_name)(configure_env)
         task_func.__doc__ = 'Configures the {} server environment.'.format(
             stage_name)
@@ -49,17 +79,41 @@ def define_stage_tasks(module, config):
         setattr(module, stage_name, task_func)
 
 
-def configure_env():
-    ''' Configures the fabric env. '''
+def configure_env(group=None, hosts=None):
+    '''
+    Configures the fabric env.
+    The hosts of the stage could be narrowed down to a group of its inventory
+    and/or to the host names matching a pattern, ie: `fab prod:web,app1*`.
+    The secrets from vault aren't read for it, see inject_secrets().
+    '''
     config = get_config()
     stage = get_stage()
     stage_config = get_stage_config(stage)
+    host_filter = {'group': group, 'pattern': hosts}
+    stage_hosts = get_stage_hosts(stage_config, **host_filter)
+
+    if not stage_hosts and (group or hosts):
+        halt('No hosts of the stage {} matched the filter.'.format(stage))
+
+    state.replace('host_filter', host_filter)
+
     env.user = stage_config.get('user') or config['user']
     env.port = stage_config.get('port') or config['port']
     env.cwd = stage_config.get('cwd') or config['cwd']
     env.key_filename = stage_config.get(
         'key_filename') or config['key_filename']
-    env.hosts = [stage_config['host']]
+    env.hosts = [inventory.get_host_string(x) for x in stage_hosts]
+
+    # Fabric tries each of the keys for every host,
+    # so the keys of the hosts in the inventory are just added to the list.
+    host_keys = [
+        os.path.expanduser(x['key_filename'])
+        for x in stage_hosts if x.get('key_filename')
+    ]
+
+    if host_keys:
+        env.key_filename = filter(None, [env.key_filename]) + host_keys
+
     ssh_forward_agent = stage_config.get(
         'ssh_forward_agent') or config['ssh_forward_agent']
 
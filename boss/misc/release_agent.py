@@ -0,0 +1,189 @@
+'''
+Boss release agent.
+
+A self-contained helper uploaded to the remote host by boss, which
+activates a release in a single invocation: changes the ownership of the
+release, points the current symlink to it, records it in the build history
+and deletes the old builds. The result is printed as JSON, following the
+RESULT_MARKER so that it could be told apart from anything else printed
+by the shell it's run with.
+
+Usage: python release_agent.py activate '<json payload>'
+
+This must not depend on anything but the standard library of
+Python 2.7 or 3.x.
+'''
+
+import os
+import sys
+import json
+import shutil
+
+VERSION = '1'
+RESULT_MARKER = '__boss_agent_result__'
+
+
+def expand(path):
+    ''' Expand the home directory in the path. '''
+    return os.path.expanduser(path)
+
+
+def chown(path, owner):
+    ''' Change the ownership of a path recursively to the user (and group). '''
+    import pwd
+    import grp
+
+    (user, _, group) = owner.partition(':')
+    uid = pwd.getpwnam(user).pw_uid
+    gid = grp.getgrnam(group).gr_gid if group else -1
+
+    os.lchown(path, uid, gid)
+
+    for (root, dirs, files) in os.walk(path):
+        for name in dirs + files:
+            os.lchown(os.path.join(root, name), uid, gid)
+
+
+def update_symlink(src, link_path):
+    ''' Point the symlink to the source atomically. '''
+    tmp_path = '{}.{}.tmp'.format(link_path, os.getpid())
+
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    os.symlink(src, tmp_path)
+    os.rename(tmp_path, link_path)
+
+
+def write_json(path, data):
+    ''' Write the data to a JSON file atomically. '''
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+
+    os.rename(tmp_path, path)
+
+
+def record_history(builds_file, build, keep_builds):
+    ''' Record the build as the current one in the history. '''
+    with open(builds_file) as f:
+        history = json.load(f)
+
+    history['current'] = build['id']
+    history['builds'].insert(0, build)
+    history['builds'] = history['builds'][0:keep_builds]
+
+    write_json(builds_file, history)
+
+    return history
+
+
+def remove(path):
+    ''' Remove a file or a symlink, or a directory recursively. '''
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def remove_all(directory, kept=()):
+    '''
+    Delete everything in the directory but the names kept. Returns a tuple
+    of the names deleted and of the errors, as the release is already live
+    by then and a failure to delete an old build shouldn't fail its activation.
+    '''
+    removed = []
+    errors = []
+
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError as e:
+        return ([], [str(e)])
+
+    for name in names:
+        if name in kept:
+            continue
+
+        try:
+            remove(os.path.join(directory, name))
+        except OSError as e:
+            errors.append('{}: {}'.format(name, e))
+            continue
+
+        removed.append(name)
+
+    return (removed, errors)
+
+
+def prune(release_dir, history):
+    '''
+    Delete the builds (or any other files) in the release directory
+    that are no longer in the history.
+    '''
+    kept = ['build-{}'.format(x['id']) for x in history['builds']]
+
+    return remove_all(release_dir, kept)
+
+
+def prune_staged(staging_dir):
+    '''
+    Delete the builds left staged by the deployments in the pipeline mode
+    that didn't finish. The build being activated has been moved already.
+    '''
+    if not staging_dir or not os.path.isdir(staging_dir):
+        return ([], [])
+
+    return remove_all(staging_dir)
+
+
+def activate(payload):
+    ''' Activate the release and return the result. '''
+    release_path = expand(payload['release_path'])
+
+    if payload.get('owner'):
+        chown(release_path, payload['owner'])
+
+    update_symlink(release_path, expand(payload['current_path']))
+
+    history = record_history(
+        expand(payload['builds_file']),
+        payload['build'],
+        int(payload['keep_builds'])
+    )
+    (pruned, errors) = prune(expand(payload['release_dir']), history)
+    (unstaged, staged_errors) = prune_staged(
+        payload.get('staging_dir') and expand(payload['staging_dir'])
+    )
+
+    return {
+        'current': history['current'],
+        'builds': len(history['builds']),
+        'pruned': pruned,
+        'unstaged': unstaged,
+        'warnings': errors + staged_errors
+    }
+
+
+def main(args):
+    ''' Run the agent command and print its result as JSON. '''
+    commands = {'activate': activate}
+
+    if len(args) != 2 or args[0] not in commands:
+        sys.stderr.write(__doc__)
+        return 2
+
+    try:
+        result = commands[args[0]](json.loads(args[1]))
+    except Exception as e:
+        print(RESULT_MARKER + json.dumps({'version': VERSION, 'error': str(e)}))
+        return 1
+
+    result['version'] = VERSION
+    print(RESULT_MARKER + json.dumps(result))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,11 +1,63 @@
 ''' Boss State. '''
 
-from copy import deepcopy
+import os
+import time
+import atexit
+from threading import RLock
+from contextlib import contextmanager
 
 
+# Interval (in seconds) of the keepalive packets sent over the SSH
+# connections, unless one is configured with fabric's `env.keepalive`.
+KEEPALIVE_INTERVAL = 30
+
 _state = {
-    'sftp_connections': {}
+    # The group and the host name pattern the stage's hosts are filtered by.
+    'host_filter': {'group': None, 'pattern': None}
+}
+
+# The registry of the connections and sessions by the host string:
+# persistent remote shell sessions, and the pools of idle SFTP sessions.
+# These are live objects, so they're shared as they are instead of being
+# copied, and they're guarded by a lock for each of the hosts, as the hosts
+# are deployed to concurrently.
+_shell_sessions = {}
+_sftp_pools = {}
+_sftp_sessions = []
+_connection_stats = {
+    'ssh': {'hits': 0, 'misses': 0},
+    'sftp': {'hits': 0, 'misses': 0}
 }
+_host_locks = {}
+_lock = RLock()
+
+# The process the registry belongs to. Neither the sessions (whose transport
+# threads don't survive a fork) nor the locks (which could be held by another
+# thread at the time of the fork) could be used in a forked process,
+# ie: in fabric's parallel tasks, so the registry is reset there.
+_pid = os.getpid()
+
+# The timings (in seconds) of the phases of the deployment in progress,
+# of the local phases and of the phases run on each of the hosts,
+# along with the number of bytes uploaded to each of the hosts.
+_timings = {'started': None, 'local': {}, 'hosts': {}}
+
+
+def get_lock():
+    ''' Get the lock guarding the registry, resetting it if it's been forked. '''
+    global _lock, _pid
+
+    if os.getpid() != _pid:
+        # Only the thread that forked runs in the forked process,
+        # so the registry could be reset without the lock.
+        _pid = os.getpid()
+        _lock = RLock()
+        _host_locks.clear()
+        _shell_sessions.clear()
+        _sftp_pools.clear()
+        del _sftp_sessions[:]
+
+    return _lock
 
 
 def get(key=None):
@@ -14,13 +66,18 @@ def get(key=None):
 
     If `key` is provided, returns a value in the state
     identified by `key`.
+    Note: The state is shared, not copied; it mustn't be mutated.
     '''
 
     from fabric import state as fabric_state
 
-    merged_state = deepcopy(_state)
+    get_lock()
+
+    merged_state = dict(_state)
     merged_state['env'] = fabric_state.env
     merged_state['connections'] = fabric_state.connections
+    merged_state['shell_sessions'] = _shell_sessions
+    merged_state['connection_stats'] = get_connection_stats()
 
     if not key:
         return merged_state
@@ -31,3 +88,188 @@ def get(key=None):
 def replace(key, value):
     ''' Set or replace a key with the provided value in the state. '''
     _state[key] = value
+
+
+def host_lock(host_string):
+    ''' Get the lock guarding the connections to the host. '''
+    with get_lock():
+        return _host_locks.setdefault(host_string, RLock())
+
+
+def count(kind, hit):
+    ''' Count a hit (reused) or a miss (newly opened) ssh or sftp connection. '''
+    with get_lock():
+        _connection_stats[kind]['hits' if hit else 'misses'] += 1
+
+
+def get_connection_stats():
+    '''
+    Get the number of times the ssh and sftp connections were
+    reused (hits) or opened (misses).
+    '''
+    with get_lock():
+        return dict((x, dict(y)) for (x, y) in _connection_stats.items())
+
+
+def is_active(client):
+    ''' Check if the SSH client's connection is still active. '''
+    transport = client.get_transport()
+
+    return transport is not None and transport.is_active()
+
+
+def get_connection(host_string):
+    '''
+    Get the SSH connection to the host, connecting to it if it isn't
+    connected yet (or anymore). A single connection is kept for each host,
+    with keepalive enabled so that it isn't dropped while it's idle.
+    '''
+    from fabric import state as fabric_state
+
+    connections = fabric_state.connections
+
+    with host_lock(host_string):
+        hit = host_string in connections and is_active(connections[host_string])
+        count('ssh', hit)
+
+        if not hit:
+            connections.connect(host_string)
+
+        client = connections[host_string]
+        client.get_transport().set_keepalive(
+            fabric_state.env.keepalive or KEEPALIVE_INTERVAL
+        )
+
+        return client
+
+
+def acquire_sftp(host_string, open_sftp):
+    '''
+    Acquire an SFTP session to the host from its pool of idle sessions,
+    or open a new one with `open_sftp()` if there are none.
+    The session must be released with `release_sftp()` once it's used.
+    '''
+    with host_lock(host_string):
+        pool = _sftp_pools.setdefault(host_string, [])
+
+        while pool:
+            sftp = pool.pop()
+
+            if not sftp.get_channel().closed:
+                count('sftp', True)
+                return sftp
+
+        count('sftp', False)
+        sftp = open_sftp()
+
+    with get_lock():
+        _sftp_sessions.append(sftp)
+
+    return sftp
+
+
+def release_sftp(host_string, sftp):
+    ''' Release the SFTP session back to the pool of the host. '''
+    with host_lock(host_string):
+        _sftp_pools.setdefault(host_string, []).append(sftp)
+
+
+def close_quietly(close, *args):
+    ''' Close a connection, ignoring the errors if it's already broken. '''
+    try:
+        close(*args)
+    except Exception:
+        pass
+
+
+def start_timings():
+    ''' Start timing the phases of a new deployment. '''
+    with get_lock():
+        _timings['started'] = time.time()
+        _timings['local'] = {}
+        _timings['hosts'] = {}
+
+
+def stop_timings():
+    ''' Stop timing the phases, once the deployment is done. '''
+    with get_lock():
+        _timings['started'] = None
+
+
+def record_timing(name, seconds, local=False, host_string=None, **counts):
+    '''
+    Record the time taken by a phase of the deployment, locally or on the host
+    (the current one unless the host string is provided), along with the
+    counts (ie: bytes) if any. The timings of the same phase are added up.
+    '''
+    from fabric import state as fabric_state
+
+    with get_lock():
+        if local:
+            timings = _timings['local']
+        else:
+            host_string = host_string or fabric_state.env.host_string
+            timings = _timings['hosts'].setdefault(host_string, {})
+
+        timings[name] = timings.get(name, 0) + seconds
+
+        for (key, value) in counts.items():
+            timings[key] = timings.get(key, 0) + value
+
+
+@contextmanager
+def timed(name, local=False, host_string=None, **counts):
+    ''' Record the time taken by the phase run within the context. '''
+    started = time.time()
+
+    try:
+        yield
+    finally:
+        record_timing(name, time.time() - started, local, host_string, **counts)
+
+
+def get_timings(host_string=None):
+    '''
+    Get the timings of the deployment in progress, of the local phases and
+    of the phases run on the host (the current one unless the host string is
+    provided), and the total time taken so far. Returns an empty dict if
+    no deployment is in progress.
+    '''
+    from fabric import state as fabric_state
+
+    with get_lock():
+        if _timings['started'] is None:
+            return {}
+
+        host_string = host_string or fabric_state.env.host_string
+        result = dict(_timings['local'])
+        result.update(_timings['hosts'].get(host_string, {}))
+        result['total'] = time.time() - _timings['started']
+
+        return result
+
+
+@atexit.register
+def close_connections():
+    '''
+    Close all of the SFTP and shell sessions. The SSH connections
+    themselves are closed by fabric once the tasks are done.
+    '''
+    from boss.core import remote
+
+    with get_lock():
+        for sftp in _sftp_sessions:
+            close_quietly(sftp.close)
+
+        for session in _shell_sessions.values():
+            close_quietly(remote.close_shell, session)
+
+        del _sftp_sessions[:]
+        _sftp_pools.clear()
+        _shell_sessions.clear()
+
+        if os.environ.get('DEBUG') == 'true':
+            for (kind, stats) in sorted(_connection_stats.items()):
+                print('{} connections reused: {}, opened: {}'.format(
+                    kind.upper(), stats['hits'], stats['misses']
+                ))
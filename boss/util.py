@@ -4,20 +4,33 @@ Module for utility functions.
 TODO: Remove all fabric dependant util functions.
 '''
 
-from fabric.api import run as _run, local as _local, hide
+import sys
+
+from fabric.api import env
+from fabric.state import output
 
 from boss.core.util.colors import green
 
 
 def host_print(msg, remote=True, leading_chars='\n'):
-    ''' Print a raw message on the host. '''
-    cmd = 'echo "{0}{1}"'.format(leading_chars, msg)
-
-    with hide('running'):
-        if remote:
-            _run(cmd)
-        else:
-            _local(cmd)
+    '''
+    Print a raw message on the host.
+
+    The message is printed locally, without running anything on the host.
+    Messages for the remote host are prefixed with the host string the same
+    way as the output of the commands run on it.
+    '''
+    if not output.stdout:
+        return
+
+    prefix = ''
+
+    if remote and env.output_prefix and env.host_string:
+        prefix = '[{}] out: '.format(env.host_string)
+
+    lines = (leading_chars + msg).split('\n')
+    sys.stdout.write(''.join(prefix + line + '\n' for line in lines))
+    sys.stdout.flush()
 
 
 def host_info(msg, remote=True):
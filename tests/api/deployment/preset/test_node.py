@@ -0,0 +1,148 @@
+''' Tests for boss.api.deployment.preset.node. '''
+
+import os
+from tempfile import mkdtemp
+
+from mock import patch
+from boss import state
+from boss.core import fs
+from boss.core.util.object import merge
+from boss.core.constants.config import DEFAULT_CONFIG
+from boss.config import merge_config
+from boss.api.deployment.preset import node
+
+
+def get_history(dependencies):
+    ''' Get the build history with the current build having the dependencies. '''
+    return {
+        'current': '2',
+        'builds': [
+            {'id': '2', 'path': '/app/builds/build-2', 'dependencies': dependencies},
+            {'id': '1', 'path': '/app/builds/build-1', 'dependencies': 'old'}
+        ]
+    }
+
+
+def test_get_dependencies_fingerprint():
+    ''' Test get_dependencies_fingerprint() changes with the lockfiles. '''
+    cwd = os.getcwd()
+    os.chdir(mkdtemp())
+
+    try:
+        fs.write('package.json', '{}')
+        fs.write('pm2.config.js', 'a')
+        assert node.get_dependencies_fingerprint(['package.json']) is None
+
+        fs.write('package-lock.json', '{"a": 1}')
+        files = ['package.json', 'package-lock.json', 'pm2.config.js']
+        fingerprint = node.get_dependencies_fingerprint(files)
+
+        fs.write('pm2.config.js', 'b')
+        assert node.get_dependencies_fingerprint(files) == fingerprint
+
+        fs.write('package-lock.json', '{"a": 2}')
+        assert node.get_dependencies_fingerprint(files) != fingerprint
+    finally:
+        os.chdir(cwd)
+
+
+@patch('boss.api.deployment.preset.node.remote_info')
+@patch('boss.api.deployment.preset.node.fs')
+@patch('boss.api.deployment.preset.node.buildman.load_history')
+@patch('boss.api.deployment.preset.node.shell.get_stage', return_value='stage1')
+@patch('boss.api.deployment.preset.node.get_stage_config')
+def test_reuse_dependencies(gsc_m, _, load_history_m, fs_m, __):
+    ''' Test reuse_dependencies() hard links the node_modules if unchanged. '''
+    gsc_m.return_value = merge(DEFAULT_CONFIG, {
+        'deployment': {'reuse_dependencies': 'hardlink'}
+    })
+    load_history_m.return_value = get_history('abc')
+    fs_m.exists.return_value = True
+
+    assert node.reuse_dependencies('abc', '/app/builds/build-3') is True
+    fs_m.copy_dir.assert_called_once_with(
+        '/app/builds/build-2/node_modules',
+        '/app/builds/build-3/node_modules',
+        link=True,
+        reflink=False
+    )
+
+
+@patch('boss.api.deployment.preset.node.fs')
+@patch('boss.api.deployment.preset.node.buildman.load_history')
+@patch('boss.api.deployment.preset.node.shell.get_stage', return_value='stage1')
+@patch('boss.api.deployment.preset.node.get_stage_config')
+def test_reuse_dependencies_when_changed(gsc_m, _, load_history_m, fs_m):
+    ''' Test reuse_dependencies() doesn't reuse the node_modules if changed. '''
+    gsc_m.return_value = merge(DEFAULT_CONFIG, {
+        'deployment': {'reuse_dependencies': 'reflink'}
+    })
+    load_history_m.return_value = get_history('abc')
+
+    assert node.reuse_dependencies('def', '/app/builds/build-3') is False
+    fs_m.copy_dir.assert_not_called()
+
+
+@patch('boss.api.deployment.preset.node.buildman.load_history')
+@patch('boss.api.deployment.preset.node.shell.get_stage', return_value='stage1')
+@patch('boss.api.deployment.preset.node.get_stage_config')
+def test_reuse_dependencies_when_disabled(gsc_m, _, load_history_m):
+    ''' Test reuse_dependencies() doesn't reuse the node_modules by default. '''
+    gsc_m.return_value = DEFAULT_CONFIG
+
+    assert node.reuse_dependencies('abc', '/app/builds/build-3') is False
+    load_history_m.assert_not_called()
+
+
+@patch('boss.api.deployment.preset.node.remote_info')
+@patch('boss.api.deployment.preset.node.fs')
+@patch('boss.api.deployment.preset.node.buildman.load_history')
+@patch('boss.api.deployment.preset.node.shell.get_stage', return_value='prod')
+@patch('boss.api.deployment.preset.node.get_stage_config')
+def test_reuse_dependencies_overridden_for_stage(gsc_m, _, load_history_m, fs_m, __):
+    ''' Test reuse_dependencies() uses the mode configured for the stage. '''
+    config = merge_config({
+        'stages': {
+            'dev': {},
+            'prod': {'deployment': {'reuse_dependencies': 'hardlink'}}
+        }
+    })
+    gsc_m.side_effect = lambda stage: config['stages'][stage]
+    load_history_m.return_value = get_history('abc')
+    fs_m.exists.return_value = True
+
+    assert node.reuse_dependencies('abc', '/app/builds/build-3') is True
+    gsc_m.assert_called_with('prod')
+    fs_m.copy_dir.assert_called_once_with(
+        '/app/builds/build-2/node_modules',
+        '/app/builds/build-3/node_modules',
+        link=True,
+        reflink=False
+    )
+
+
+@patch('boss.api.deployment.preset.node.remote_info')
+@patch('boss.api.deployment.preset.node.info')
+@patch('boss.api.deployment.preset.node.notif')
+@patch('boss.api.deployment.preset.node.git')
+@patch('boss.api.deployment.preset.node.get_config')
+@patch('boss.api.deployment.preset.node.shell')
+@patch('boss.api.deployment.preset.node.buildman.resolve_local_build_dir')
+@patch('boss.api.deployment.preset.node.transfer')
+@patch('boss.api.deployment.preset.node.deployer.build_and_deploy')
+def test_deploy_times_the_pipeline(build_and_deploy_m, transfer_m, *_):
+    ''' Test deploy() keeps the uploads timed by the pipeline, while building. '''
+    timings = []
+    transfer_m.start_pipeline.side_effect = lambda *args: state.record_timing(
+        'upload', 2, host_string='web1', upload_bytes=100
+    )
+    build_and_deploy_m.side_effect = lambda *args: timings.append(
+        state.get_timings('web1')
+    )
+
+    node.deploy()
+
+    assert timings[0]['upload'] == 2
+    assert timings[0]['upload_bytes'] == 100
+    assert state.get_timings('web1') == {}
+    transfer_m.stop_pipeline.assert_called_once()
@@ -37,3 +37,20 @@ def test_resolve_deployment_branch_returns_default_branch(m_gsc):
     result = remote_source.resolve_deployment_branch('my_stage')
 
     assert result == 'default-branch'
+
+
+@patch('boss.api.deployment.preset.remote_source.remote_print')
+@patch('boss.api.deployment.preset.remote_source.get_repo_path', return_value='/app')
+@patch('boss.api.deployment.preset.remote_source.runner.run_all')
+def test_check(run_all_m, _, print_m):
+    ''' Test check() gets the current branch and the last commit at once. '''
+    run_all_m.return_value = ['master\n', 'commit abc']
+
+    remote_source.check()
+
+    run_all_m.assert_called_once_with([
+        'git rev-parse --abbrev-ref HEAD',
+        'git log -1'
+    ])
+    print_m.assert_any_call('Branch: master')
+    print_m.assert_any_call('commit abc')
@@ -0,0 +1,90 @@
+''' Tests for boss.api.deployment.agent module. '''
+
+import pytest
+from mock import patch
+
+from boss.api.deployment import agent
+
+
+class Result(str):
+    ''' Result of a remote command, like the one returned by fabric. '''
+    pass
+
+
+def get_result(output, return_code=0):
+    ''' Get the result of an agent command run on the remote. '''
+    result = Result(agent.RESULT_MARKER + output)
+    result.return_code = return_code
+
+    return result
+
+
+@patch('boss.api.deployment.agent.fs')
+@patch('boss.api.deployment.agent.runner.run')
+def test_run(run_m, fs_m):
+    ''' Test run() runs the agent command and returns its result. '''
+    run_m.return_value = get_result('{"current": "2", "version": "1"}\r\n')
+
+    result = agent.run('/app', 'activate', {'build': {'id': '2'}})
+
+    cmd = run_m.call_args[0][0]
+    assert agent.get_agent_path('/app') in cmd
+    assert 'activate \'{"build": {"id": "2"}}\'' in cmd
+    assert result == {'current': '2', 'version': '1'}
+    fs_m.upload.assert_not_called()
+
+
+@patch('boss.api.deployment.agent.fs')
+@patch('boss.api.deployment.agent.runner.run')
+def test_run_uploads_missing_agent(run_m, fs_m):
+    ''' Test run() uploads the agent if it hasn't been uploaded yet. '''
+    run_m.side_effect = [
+        get_result('', agent.AGENT_MISSING),
+        get_result('{"current": "2"}')
+    ]
+
+    result = agent.run('/app', 'activate', {})
+
+    fs_m.mkdir.assert_called_with('/app/.boss', nested=True)
+    fs_m.upload.assert_called_with(agent.AGENT_SCRIPT, agent.get_agent_path('/app'))
+    assert run_m.call_count == 2
+    assert result == {'current': '2'}
+
+
+@patch('boss.api.deployment.agent.runner.run')
+def test_run_without_python(run_m):
+    ''' Test run() returns None if the agent couldn't be run on the remote. '''
+    run_m.return_value = get_result('', agent.PYTHON_MISSING)
+
+    assert agent.run('/app', 'activate', {}) is None
+
+
+@patch('boss.api.deployment.agent.runner.run')
+def test_run_failure(run_m):
+    ''' Test run() halts if the agent fails. '''
+    run_m.return_value = get_result('{"error": "No such file"}', 1)
+
+    with pytest.raises(SystemExit):
+        agent.run('/app', 'activate', {})
+
+
+@patch('boss.api.deployment.agent.runner.run')
+def test_run_with_noise_before_the_result(run_m):
+    ''' Test run() ignores anything printed by the shell before the result. '''
+    run_m.return_value = Result(
+        'Welcome to example.com\n{"motd": true}\n' +
+        agent.RESULT_MARKER + '{"current": "2"}\r\n'
+    )
+    run_m.return_value.return_code = 0
+
+    assert agent.run('/app', 'activate', {}) == {'current': '2'}
+
+
+@patch('boss.api.deployment.agent.runner.run')
+def test_run_without_result(run_m):
+    ''' Test run() halts if the agent didn't print its result. '''
+    run_m.return_value = Result('{"current": "2"}')
+    run_m.return_value.return_code = 0
+
+    with pytest.raises(SystemExit):
+        agent.run('/app', 'activate', {})
@@ -1,10 +1,11 @@
 ''' Tests for boss.api.deployment.buildman module. '''
 
 import os
-from mock import patch
+from mock import Mock, patch
 from tempfile import mkstemp
 from boss.core import fs
 from boss.core.util.object import merge
+from boss.core.constants import known_scripts
 from boss.core.constants.config import DEFAULT_CONFIG
 from boss.api.deployment import buildman
 
@@ -122,3 +123,214 @@ def test_build_with_loaded_env_vars(get_config_m, remote_env_m, capfd):
     assert 'BAR = bar-from-remote' in out
     assert 'BAT = bat-from-vault' in out
     assert 'BAZ = baz-from-vault' in out
+
+
+@patch('boss.api.deployment.buildman.get_build_env_vars', return_value={})
+@patch('boss.api.deployment.buildman.get_stage_config')
+@patch('boss.api.deployment.buildman.runner.run_script_safely')
+@patch('boss.api.deployment.buildman.cache')
+@patch('boss.api.deployment.buildman.get_cache_key', return_value='key1')
+def test_build_restored_from_cache(cache_key_m, cache_m, run_script_m, gsc_m, _):
+    ''' Test build() skips the build if it's restored from the cache. '''
+    cache_m.restore.return_value = True
+    test_config = merge(DEFAULT_CONFIG, {'deployment': {'cache': True}})
+    gsc_m.return_value = test_config
+
+    buildman.build('stage1', test_config, 'build/')
+
+    cache_key_m.assert_called_once_with('stage1', test_config, 'build/', {})
+    cache_m.restore.assert_called_once_with(
+        buildman.BOSS_BUILD_CACHE_PATH, 'key1', 'build/'
+    )
+    run_script_m.assert_not_called()
+    cache_m.store.assert_not_called()
+
+
+@patch('boss.api.deployment.buildman.get_build_env_vars', return_value={})
+@patch('boss.api.deployment.buildman.get_stage_config')
+@patch('os.path.isdir', return_value=True)
+@patch('boss.api.deployment.buildman.runner.run_script_safely')
+@patch('boss.api.deployment.buildman.cache')
+@patch('boss.api.deployment.buildman.get_cache_key', return_value='key1')
+def test_build_stored_in_cache(_, cache_m, run_script_m, __, gsc_m, ___):
+    ''' Test build() caches the build on a cache miss. '''
+    cache_m.restore.return_value = False
+    test_config = merge(DEFAULT_CONFIG, {'deployment': {'cache': True}})
+    gsc_m.return_value = test_config
+
+    buildman.build('stage1', test_config, 'build/')
+
+    run_script_m.assert_any_call(known_scripts.BUILD, remote=False)
+    cache_m.store.assert_called_once_with(
+        buildman.BOSS_BUILD_CACHE_PATH, 'key1', 'build/'
+    )
+    cache_m.evict.assert_called_once_with(
+        buildman.BOSS_BUILD_CACHE_PATH, 2048 * 1024 * 1024
+    )
+
+
+@patch('boss.api.deployment.buildman.get_build_env_vars', return_value={})
+@patch('boss.api.deployment.buildman.get_stage_config')
+@patch('boss.api.deployment.buildman.runner.run_script_safely')
+@patch('boss.api.deployment.buildman.cache')
+@patch('boss.api.deployment.buildman.get_cache_key')
+def test_build_cache_disabled_for_stage(cache_key_m, cache_m, _, gsc_m, __):
+    ''' Test build() skips the build cache if it's disabled for the stage. '''
+    test_config = merge(DEFAULT_CONFIG, {'deployment': {'cache': True}})
+    gsc_m.return_value = merge(DEFAULT_CONFIG, {'deployment': {'cache': False}})
+
+    buildman.build('stage1', test_config, 'build/')
+
+    gsc_m.assert_called_with('stage1')
+    cache_key_m.assert_not_called()
+    cache_m.restore.assert_not_called()
+    cache_m.store.assert_not_called()
+
+
+@patch('boss.api.deployment.buildman.git')
+def test_get_cache_key(git_m):
+    ''' Test get_cache_key() changes with the build inputs. '''
+    git_m.has_changes.return_value = False
+    git_m.last_commit.return_value = 'abc'
+    env_vars = {'STAGE': 'stage1', 'API_KEY': 'secret1'}
+
+    key = buildman.get_cache_key('stage1', DEFAULT_CONFIG, 'build/', env_vars)
+
+    assert key == buildman.get_cache_key('stage1', DEFAULT_CONFIG, 'build/', env_vars)
+    assert key != buildman.get_cache_key('stage2', DEFAULT_CONFIG, 'build/', env_vars)
+    assert key != buildman.get_cache_key(
+        'stage1', DEFAULT_CONFIG, 'build/', merge(env_vars, {'API_KEY': 'secret2'})
+    )
+
+    git_m.last_commit.return_value = 'def'
+    assert key != buildman.get_cache_key('stage1', DEFAULT_CONFIG, 'build/', env_vars)
+
+
+@patch('boss.api.deployment.buildman.git')
+def test_get_cache_key_ignores_volatile_env_vars(git_m):
+    ''' Test get_cache_key() ignores the env vars that change between sessions. '''
+    git_m.has_changes.return_value = False
+    git_m.last_commit.return_value = 'abc'
+    env_vars = {'STAGE': 'stage1', 'PWD': '/app', 'SHLVL': '1'}
+
+    key = buildman.get_cache_key('stage1', DEFAULT_CONFIG, 'build/', env_vars)
+
+    assert key == buildman.get_cache_key(
+        'stage1', DEFAULT_CONFIG, 'build/', merge(env_vars, {'PWD': '/', 'SHLVL': '2'})
+    )
+
+
+@patch('boss.api.deployment.buildman.git')
+def test_get_cache_key_with_uncommitted_changes(git_m):
+    ''' Test get_cache_key() skips the cache if there are uncommitted changes. '''
+    git_m.has_changes.return_value = True
+
+    assert buildman.get_cache_key('stage1', DEFAULT_CONFIG, 'build/', {}) is None
+
+
+@patch('boss.api.deployment.buildman.remote_info')
+@patch('boss.api.deployment.buildman.get_deploy_dir', return_value='/app')
+@patch('boss.api.deployment.buildman.agent.run')
+@patch('boss.api.deployment.buildman.fs')
+@patch('boss.api.deployment.buildman.record_history')
+@patch('boss.api.deployment.buildman.get_stage_config')
+@patch('boss.api.deployment.buildman.shell.get_stage', return_value='stage1')
+def test_activate_release_with_agent(_, gsc_m, record_m, fs_m, agent_m, *__):
+    ''' Test activate_release() activates the release with the agent if enabled. '''
+    gsc_m.return_value = merge(DEFAULT_CONFIG, {'deployment': {'release_agent': True}})
+    agent_m.return_value = {'current': '2', 'pruned': []}
+
+    buildman.activate_release('/app/builds/build-2', {'id': '2'}, owner='app')
+
+    (deploy_dir, command, payload) = agent_m.call_args[0]
+    assert deploy_dir == '/app'
+    assert command == 'activate'
+    assert payload['owner'] == 'app:app'
+    assert payload['build'] == {'id': '2', 'path': '/app/builds/build-2'}
+    assert payload['current_path'] == '/app/current'
+    fs_m.update_symlink.assert_not_called()
+    record_m.assert_not_called()
+
+
+@patch('boss.api.deployment.buildman.warn')
+@patch('boss.api.deployment.buildman.remote_info')
+@patch('boss.api.deployment.buildman.get_deploy_dir', return_value='/app')
+@patch('boss.api.deployment.buildman.agent.run')
+@patch('boss.api.deployment.buildman.fs')
+@patch('boss.api.deployment.buildman.record_history')
+@patch('boss.api.deployment.buildman.get_stage_config')
+@patch('boss.api.deployment.buildman.shell.get_stage', return_value='stage1')
+def test_activate_release_with_prune_warnings(_, gsc_m, record_m, fs_m, agent_m, __, ___, warn_m):
+    ''' Test activate_release() only warns if the old builds couldn't be deleted. '''
+    gsc_m.return_value = merge(DEFAULT_CONFIG, {'deployment': {'release_agent': True}})
+    agent_m.return_value = {
+        'current': '2', 'pruned': [], 'warnings': ['build-1: Permission denied']
+    }
+
+    buildman.activate_release('/app/builds/build-2', {'id': '2'})
+
+    warn_m.assert_called_once_with(
+        'Failed deleting an old build: build-1: Permission denied'
+    )
+    record_m.assert_not_called()
+
+
+@patch('boss.api.deployment.buildman.remote_info')
+@patch('boss.api.deployment.buildman.get_deploy_dir', return_value='/app')
+@patch('boss.api.deployment.buildman.agent.run', return_value=None)
+@patch('boss.api.deployment.buildman.fs')
+@patch('boss.api.deployment.buildman.record_history')
+@patch('boss.api.deployment.buildman.get_stage_config')
+@patch('boss.api.deployment.buildman.shell.get_stage', return_value='stage1')
+def test_activate_release_without_agent(_, gsc_m, record_m, fs_m, *__):
+    ''' Test activate_release() falls back if the agent couldn't be run. '''
+    gsc_m.return_value = merge(DEFAULT_CONFIG, {'deployment': {'release_agent': True}})
+
+    buildman.activate_release('/app/builds/build-2', {'id': '2'}, owner='app')
+
+    fs_m.chown.assert_called_with('/app/builds/build-2', 'app', 'app')
+    fs_m.update_symlink.assert_called_with('/app/builds/build-2', '/app/current')
+    record_m.assert_called_with({'id': '2', 'path': '/app/builds/build-2'})
+
+
+@patch('boss.api.deployment.buildman.state.get_timings')
+def test_get_deploy_timings(get_timings_m):
+    ''' Test get_deploy_timings() gets the timings to be recorded in the history. '''
+    get_timings_m.return_value = {
+        'build': 12.3456, 'upload': 2.001, 'upload_bytes': 2048, 'total': 20.5
+    }
+
+    assert buildman.get_deploy_timings() == {
+        'build': 12.35, 'upload': 2.0, 'uploadBytes': 2048, 'total': 20.5
+    }
+
+
+@patch('boss.api.deployment.buildman.state.get_timings', return_value={})
+def test_with_timings_without_deployment(_):
+    ''' Test with_timings() leaves the build info as it is without timings. '''
+    assert buildman.with_timings({'id': '2'}) == {'id': '2'}
+
+
+def test_format_timings():
+    ''' Test the timings of a recorded build are formatted for display. '''
+    timings = {'build': 12.34, 'upload': 2.0, 'uploadBytes': 4 * 1024 * 1024}
+
+    assert buildman.format_duration(timings, 'build') == '12.3s'
+    assert buildman.format_duration(timings, 'install') == '-'
+    assert buildman.format_duration(None, 'build') == '-'
+    assert buildman.format_upload(timings) == '2.0s (4.0 MB at 2.0 MB/s)'
+
+
+@patch('boss.api.deployment.buildman.local_timestamp', Mock(return_value='now'))
+def test_row_mapper_with_timings():
+    ''' Test the build history rows show the timings, if recorded. '''
+    mapper = buildman.row_mapper_wrt('1')
+    build = {
+        'id': '2', 'commit': 'abc', 'branch': 'dev',
+        'createdBy': 'user', 'timestamp': 'ts'
+    }
+
+    assert mapper(build)[-3:] == ['-', '-', '-']
+    assert mapper(merge(build, {
+        'timings': {'build': 10.0, 'upload': 1.25, 'total': 15.0}
+    }))[-3:] == ['10.0s', '1.2s', '15.0s']
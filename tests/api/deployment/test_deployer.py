@@ -0,0 +1,172 @@
+''' Tests for boss.api.deployment.deployer module. '''
+
+import pytest
+from mock import patch, Mock
+
+from fabric.api import env, settings
+
+from boss.api import notif
+from boss.api.deployment import deployer
+from boss.core.constants.notification_types import (
+    DEPLOYMENT_STARTED,
+    DEPLOYMENT_FINISHED,
+    RUNNING_SCRIPT_FINISHED,
+    RUNNING_SCRIPTS_FINISHED
+)
+
+
+def host_result(error=None, scripts=()):
+    ''' Get the result of the deployment to a host. '''
+    return {'error': error, 'scripts': list(scripts)}
+
+
+@patch('boss.api.deployment.deployer.get_workers', return_value=5)
+@patch('boss.api.deployment.deployer.env')
+@patch('boss.api.deployment.deployer.execute')
+def test_deploy_to_hosts_in_parallel(execute_m, env_m, _):
+    ''' Test deploy_to_hosts() deploys to all the hosts concurrently. '''
+    env_m.hosts = ['web1', 'web2']
+    execute_m.return_value = {'web1': host_result(), 'web2': host_result()}
+
+    result = deployer.deploy_to_hosts(Mock(), 'artifact')
+
+    (func,) = execute_m.call_args[0]
+    assert execute_m.call_args[1] == {'hosts': ['web1', 'web2']}
+    assert func.parallel is True
+    assert func.pool_size == 5
+    assert result == {'web1': None, 'web2': None}
+
+
+@patch('boss.api.deployment.deployer.get_workers', return_value=1)
+@patch('boss.api.deployment.deployer.env')
+@patch('boss.api.deployment.deployer.execute')
+def test_deploy_to_hosts_serially_with_one_worker(execute_m, env_m, _):
+    ''' Test deploy_to_hosts() deploys to the hosts one by one with a single worker. '''
+    env_m.hosts = ['web1', 'web2']
+    execute_m.return_value = {'web1': host_result(), 'web2': host_result()}
+
+    deployer.deploy_to_hosts(Mock(), 'artifact')
+
+    (func,) = execute_m.call_args[0]
+    assert not getattr(func, 'parallel', False)
+
+
+@patch('boss.api.deployment.deployer.get_workers', return_value=5)
+@patch('boss.api.deployment.deployer.env')
+@patch('boss.api.deployment.deployer.execute')
+def test_deploy_to_hosts_reports_failures(execute_m, env_m, _):
+    ''' Test deploy_to_hosts() halts if the deployment fails on any host. '''
+    env_m.hosts = ['web1', 'web2']
+    execute_m.return_value = {
+        'web1': host_result(),
+        'web2': host_result('Connection refused')
+    }
+
+    with pytest.raises(SystemExit) as e:
+        deployer.deploy_to_hosts(Mock(), 'artifact')
+
+    assert 'Deployment failed on 1 of 2 host(s).' in str(e.value)
+
+
+def test_deploy_to_hosts_returns_error_of_each_host():
+    ''' Test the function run on each host returns the error instead of raising it. '''
+    func = Mock(side_effect=SystemExit('Failed extracting the build'))
+
+    with patch('boss.api.deployment.deployer.env') as env_m, \
+            patch('boss.api.deployment.deployer.get_workers', return_value=1), \
+            patch('boss.api.deployment.deployer.execute') as execute_m:
+        env_m.hosts = ['web1']
+        execute_m.side_effect = lambda f, hosts: {'web1': f()}
+
+        with pytest.raises(SystemExit):
+            deployer.deploy_to_hosts(func, 'artifact')
+
+    func.assert_called_with('artifact')
+
+
+@patch('boss.api.notif.notify')
+@patch('boss.api.notif.get_config')
+@patch('boss.api.slack.is_enabled', return_value=True)
+@patch('boss.api.deployment.deployer.display_results')
+@patch('boss.api.deployment.deployer.shell.get_stage', return_value='prod')
+@patch('boss.api.deployment.deployer.get_workers', return_value=5)
+def test_deploy_to_hosts_coalesces_the_scripts_run_in_parallel(_, __, ___, ____, get_m, notify_m):
+    '''
+    Test the scripts run on the hosts deployed to in parallel (ie: in forked
+    processes) are coalesced into the summary sent by the parent process.
+    '''
+    get_m.return_value = {'notified_hooks': {'coalesce': True}}
+    deployment = {'user': 'kabir', 'stage': 'prod'}
+
+    def release():
+        for script in ['pre_deploy', env.host_string, 'post_deploy']:
+            notif.send(RUNNING_SCRIPT_FINISHED, dict(deployment, script=script))
+
+    notif.send(DEPLOYMENT_STARTED, deployment)
+
+    with settings(hosts=['web1', 'web2']):
+        deployer.deploy_to_hosts(release)
+
+    notif.send(DEPLOYMENT_FINISHED, deployment)
+
+    [summary] = [
+        x[0][2] for x in notify_m.call_args_list
+        if x[0][1] == RUNNING_SCRIPTS_FINISHED
+    ]
+    assert sorted(summary['scripts']) == sorted([
+        'pre_deploy', 'web1', 'web2', 'post_deploy'
+    ])
+
+
+@patch('boss.api.deployment.deployer.transfer')
+@patch('boss.api.deployment.deployer.prepare_hosts')
+@patch('boss.api.deployment.deployer.deploy_to_hosts')
+def test_build_and_deploy(deploy_to_hosts_m, prepare_hosts_m, transfer_m):
+    '''
+    Test build_and_deploy() builds the artifact and prepares the hosts,
+    then releases it to the hosts and cleans it up.
+    '''
+    build = Mock()
+    release = Mock()
+
+    with settings(hosts=['web1', 'web2']):
+        timings = deployer.build_and_deploy(
+            build,
+            lambda: 'artifact',
+            release,
+            {'id': 1}
+        )
+
+    build.assert_called_once_with()
+    prepare_hosts_m.assert_called_once_with(['web1', 'web2'])
+    deploy_to_hosts_m.assert_called_once_with(release, 'artifact', {'id': 1})
+    transfer_m.cleanup.assert_called_once_with('artifact')
+    assert sorted(timings.keys()) == ['build', 'package', 'prepare', 'release']
+
+
+@patch('boss.api.deployment.deployer.execute')
+@patch('boss.api.deployment.deployer.state.get_connection')
+def test_prepare_hosts_without_fabric(get_connection_m, execute_m):
+    '''
+    Test prepare_hosts() only connects to the hosts, without running fabric
+    tasks whose settings would apply to the build running in the meantime.
+    '''
+    deployer.prepare_hosts(['user@web1', 'user@web2:2222'])
+
+    assert [x[0] for x in get_connection_m.call_args_list] == [
+        ('user@web1',), ('user@web2:2222',)
+    ]
+    execute_m.assert_not_called()
+
+
+@patch('boss.api.deployment.deployer.transfer')
+@patch('boss.api.deployment.deployer.prepare_hosts')
+@patch('boss.api.deployment.deployer.deploy_to_hosts')
+def test_build_and_deploy_cleans_up_on_failure(deploy_to_hosts_m, prepare_hosts_m, transfer_m):
+    ''' Test build_and_deploy() cleans up the artifact if the release fails. '''
+    deploy_to_hosts_m.side_effect = SystemExit('Deployment failed')
+
+    with pytest.raises(SystemExit):
+        deployer.build_and_deploy(Mock(), lambda: 'artifact', Mock())
+
+    transfer_m.cleanup.assert_called_once_with('artifact')
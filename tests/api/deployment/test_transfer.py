@@ -0,0 +1,535 @@
+''' Tests for boss.api.deployment.transfer module. '''
+
+import os
+import time
+import pytest
+from threading import Event
+from mock import patch, Mock
+
+from boss.core.util.object import merge
+from boss.core.constants import release_modes, codecs
+from boss.core.constants.config import DEFAULT_CONFIG
+from boss.api.deployment import transfer
+
+GZIP = {'name': codecs.GZIP, 'level': None}
+
+
+@pytest.fixture(autouse=True)
+def deployment_config():
+    ''' Use the default deployment configuration for the tests. '''
+    with patch('boss.api.deployment.transfer.get_deployment_config') as m:
+        m.return_value = DEFAULT_CONFIG['deployment']
+        yield m
+
+
+def temp_file(suffix=''):
+    ''' Open a temporary file descriptor for the mocked mkstemp(). '''
+    return (os.open(os.devnull, os.O_RDONLY), '/tmp/local')
+
+
+def get_artifact(**params):
+    ''' Get a prepared build artifact for the tests. '''
+    artifact = {
+        'build_dir': 'build/',
+        'build_name': 'build-2',
+        'codec': GZIP,
+        'archive': None,
+        'files': None
+    }
+    artifact.update(params)
+
+    return artifact
+
+
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.manifest.generate')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+@patch('boss.api.deployment.transfer.is_delta_enabled', return_value=False)
+def test_prepare(_, __, gen_m, fs_m):
+    ''' Test prepare() compresses the whole build only once. '''
+    artifact = transfer.prepare('build/', 'build-2')
+
+    fs_m.tar_archive.assert_called_once_with(
+        'build-2.tar.gz',
+        'build/',
+        remote=False,
+        codec=GZIP
+    )
+    gen_m.assert_not_called()
+    assert artifact == get_artifact(archive='build-2.tar.gz')
+
+
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.manifest.generate')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+@patch('boss.api.deployment.transfer.is_delta_enabled', return_value=True)
+def test_prepare_with_delta(_, __, gen_m, fs_m):
+    ''' Test prepare() generates the build manifest if delta uploads are enabled. '''
+    gen_m.return_value = {'index.html': 'a'}
+
+    artifact = transfer.prepare('build/', 'build-2')
+
+    fs_m.tar_archive.assert_not_called()
+    assert artifact == get_artifact(files={'index.html': 'a'})
+
+
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=True)
+@patch('boss.api.deployment.transfer.is_delta_enabled', return_value=False)
+def test_prepare_with_stream(_, __, fs_m):
+    ''' Test prepare() doesn't compress the build if it is to be streamed. '''
+    artifact = transfer.prepare('build/', 'build-2')
+
+    fs_m.tar_archive.assert_not_called()
+    assert artifact == get_artifact()
+
+
+@patch('boss.api.deployment.transfer.upload_full')
+@patch('boss.api.deployment.transfer.buildman.save_manifest')
+def test_upload_without_delta(save_m, full_m):
+    ''' Test upload() uploads the whole build if delta uploads are disabled. '''
+    artifact = get_artifact(archive='build-2.tar.gz')
+
+    transfer.upload(artifact, '/app/builds/build-2')
+
+    full_m.assert_called_with(artifact, '/app/builds/build-2')
+    save_m.assert_not_called()
+
+
+@patch('boss.api.deployment.transfer.upload_full')
+@patch('boss.api.deployment.transfer.buildman.save_manifest')
+@patch('boss.api.deployment.transfer.buildman.load_manifest')
+def test_upload_delta_without_previous_manifest(load_m, save_m, full_m):
+    '''
+    Test upload() uploads the whole build if there is no previous
+    manifest and records the manifest of the new release.
+    '''
+    load_m.return_value = None
+    artifact = get_artifact(files={'index.html': 'a'})
+
+    transfer.upload(artifact, '/app/builds/build-2')
+
+    full_m.assert_called_with(artifact, '/app/builds/build-2')
+    save_m.assert_called_with({
+        'path': '/app/builds/build-2',
+        'files': {'index.html': 'a'}
+    })
+
+
+@patch('boss.api.deployment.transfer.mkstemp', side_effect=temp_file)
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+@patch('boss.api.deployment.transfer.remote_info')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.local_fs.compress_files')
+@patch('boss.api.deployment.transfer.buildman.save_manifest')
+@patch('boss.api.deployment.transfer.buildman.load_manifest')
+def test_upload_delta(load_m, save_m, compress_m, fs_m, *_):
+    '''
+    Test upload() seeds the release from the previous release and
+    uploads only the changed files if delta uploads are enabled.
+    '''
+    fs_m.exists.return_value = True
+    fs_m.get_temp_filename.return_value = '/tmp/delta'
+    load_m.return_value = {
+        'path': '/app/builds/build-1',
+        'files': {'index.html': 'a', 'app.js': 'b', 'old file.js': 'c'}
+    }
+    artifact = get_artifact(files={'index.html': 'a', 'app.js': 'changed'})
+
+    transfer.upload(artifact, '/app/builds/build-2')
+
+    fs_m.copy_dir.assert_called_with(
+        '/app/builds/build-1',
+        '/app/builds/build-2',
+        link=False
+    )
+    fs_m.rm_rf.assert_any_call(["'old file.js'"])
+    compress_m.assert_called_with(
+        'build/',
+        '/tmp/local',
+        ['app.js'],
+        compress=True,
+        compressor='gzip'
+    )
+    fs_m.upload.assert_called_with('/tmp/local', '/tmp/delta')
+    fs_m.tar_extract.assert_called_with(
+        '/tmp/delta',
+        '/app/builds/build-2',
+        unlink=False,
+        codec=GZIP
+    )
+    save_m.assert_called_with({
+        'path': '/app/builds/build-2',
+        'files': {'index.html': 'a', 'app.js': 'changed'}
+    })
+
+
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+@patch('boss.api.deployment.transfer.remote_info')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.local_fs.compress_files')
+@patch('boss.api.deployment.transfer.buildman.save_manifest')
+@patch('boss.api.deployment.transfer.buildman.load_manifest')
+def test_upload_delta_with_no_changes(load_m, save_m, compress_m, fs_m, *_):
+    ''' Test upload() skips the upload if none of the files have changed. '''
+    fs_m.exists.return_value = True
+    load_m.return_value = {
+        'path': '/app/builds/build-1',
+        'files': {'index.html': 'a'}
+    }
+    artifact = get_artifact(files={'index.html': 'a'})
+
+    transfer.upload(artifact, '/app/builds/build-2')
+
+    fs_m.copy_dir.assert_called_with(
+        '/app/builds/build-1',
+        '/app/builds/build-2',
+        link=False
+    )
+    compress_m.assert_not_called()
+    fs_m.upload.assert_not_called()
+
+
+@patch('boss.api.deployment.transfer.remote_info')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+def test_upload_full_with_prepared_archive(_, fs_m, __):
+    ''' Test upload_full() uploads the archive compressed while preparing. '''
+    fs_m.get_temp_filename.return_value = '/tmp/build'
+    artifact = get_artifact(archive='build-2.tar.gz')
+
+    transfer.upload_full(artifact, '/app/builds/build-2')
+
+    fs_m.tar_archive.assert_not_called()
+    fs_m.upload.assert_called_with('build-2.tar.gz', '/tmp/build')
+    fs_m.tar_extract.assert_called_with(
+        '/tmp/build',
+        '/app/builds/build-2',
+        unlink=False,
+        codec=GZIP
+    )
+    fs_m.rm.assert_not_called()
+
+
+@patch('boss.api.deployment.transfer.mkstemp')
+@patch('boss.api.deployment.transfer.remote_info')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+def test_upload_full_closes_the_temp_file(_, fs_m, __, mkstemp_m):
+    ''' Test upload_full() closes the temporary archive it compresses into. '''
+    (fd, archive) = temp_file()
+    mkstemp_m.return_value = (fd, archive)
+    fs_m.get_temp_filename.return_value = '/tmp/build'
+
+    transfer.upload_full(get_artifact(), '/app/builds/build-2')
+
+    fs_m.tar_archive.assert_called_with(
+        '/tmp/local',
+        'build/',
+        remote=False,
+        codec=GZIP
+    )
+    fs_m.rm.assert_called_with('/tmp/local', remote=False)
+
+    with pytest.raises(OSError):
+        os.fstat(fd)
+
+
+@patch('boss.api.deployment.transfer.ssh.extract_stream')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=True)
+def test_upload_full_with_stream(_, fs_m, extract_stream_m):
+    ''' Test upload_full() streams the build over SSH if streaming is enabled. '''
+    transfer.upload_full(get_artifact(), '/app/builds/build-2')
+
+    extract_stream_m.assert_called_with(
+        'build/',
+        '/app/builds/build-2',
+        codec=GZIP
+    )
+    fs_m.tar_archive.assert_not_called()
+    fs_m.upload.assert_not_called()
+
+
+@patch('boss.api.deployment.transfer.ssh.extract_stream')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=True)
+@patch('boss.api.deployment.transfer.remote_info')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.local_fs.compress_files')
+def test_upload_delta_with_stream(compress_m, fs_m, _, __, extract_stream_m):
+    ''' Test upload_delta() streams only the changed files if streaming is enabled. '''
+    previous = {
+        'path': '/app/builds/build-1',
+        'files': {'index.html': 'a', 'app.js': 'b'}
+    }
+    artifact = get_artifact(files={'index.html': 'a', 'app.js': 'changed'})
+
+    transfer.upload_delta(artifact, '/app/builds/build-2', previous)
+
+    extract_stream_m.assert_called_with(
+        'build/',
+        '/app/builds/build-2',
+        ['app.js'],
+        unlink=False,
+        codec=GZIP
+    )
+    compress_m.assert_not_called()
+    fs_m.upload.assert_not_called()
+
+
+@patch('boss.api.deployment.transfer.fs')
+def test_cleanup(fs_m):
+    ''' Test cleanup() removes the locally compressed build. '''
+    transfer.cleanup(get_artifact(archive='build-2.tar.gz'))
+
+    fs_m.rm.assert_called_with('build-2.tar.gz', remote=False)
+
+
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.manifest.generate')
+def test_prepare_with_hardlink(gen_m, fs_m, deployment_config):
+    ''' Test prepare() generates the build manifest in the hardlink release mode. '''
+    deployment_config.return_value = merge(DEFAULT_CONFIG['deployment'], {
+        'release_mode': release_modes.HARDLINK
+    })
+    gen_m.return_value = {'index.html': 'a'}
+
+    artifact = transfer.prepare('build/', 'build-2')
+
+    fs_m.tar_archive.assert_not_called()
+    assert artifact == get_artifact(files={'index.html': 'a'})
+
+
+@patch('boss.api.deployment.transfer.mkstemp', side_effect=temp_file)
+@patch('boss.api.deployment.transfer.remote_info')
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.local_fs.compress_files')
+def test_upload_delta_with_hardlink(compress_m, fs_m, _, __, deployment_config):
+    '''
+    Test upload_delta() hard links the previous release and unlinks
+    the changed files before extracting them in the hardlink release mode.
+    '''
+    deployment_config.return_value = merge(DEFAULT_CONFIG['deployment'], {
+        'release_mode': release_modes.HARDLINK
+    })
+    fs_m.get_temp_filename.return_value = '/tmp/delta'
+    previous = {
+        'path': '/app/builds/build-1',
+        'files': {'index.html': 'a', 'app.js': 'b'}
+    }
+    artifact = get_artifact(files={'index.html': 'a', 'app.js': 'changed'})
+
+    transfer.upload_delta(artifact, '/app/builds/build-2', previous)
+
+    fs_m.copy_dir.assert_called_with(
+        '/app/builds/build-1',
+        '/app/builds/build-2',
+        link=True
+    )
+    compress_m.assert_called_with(
+        'build/',
+        '/tmp/local',
+        ['app.js'],
+        compress=True,
+        compressor='gzip'
+    )
+    fs_m.tar_extract.assert_called_with(
+        '/tmp/delta',
+        '/app/builds/build-2',
+        unlink=True,
+        codec=GZIP
+    )
+
+
+@patch('boss.api.deployment.transfer.fs')
+@patch('boss.api.deployment.transfer.is_stream_enabled', return_value=False)
+@patch('boss.api.deployment.transfer.is_delta_enabled', return_value=False)
+def test_prepare_with_codec(_, __, fs_m, deployment_config):
+    ''' Test prepare() compresses the build with the configured codec. '''
+    deployment_config.return_value = merge(DEFAULT_CONFIG['deployment'], {
+        'codec': codecs.ZSTD,
+        'codec_level': 3
+    })
+    zstd = {'name': codecs.ZSTD, 'level': 3}
+
+    artifact = transfer.prepare('build/', 'build-2')
+
+    fs_m.tar_archive.assert_called_once_with(
+        'build-2.tar.zst',
+        'build/',
+        remote=False,
+        codec=zstd
+    )
+    assert artifact == get_artifact(codec=zstd, archive='build-2.tar.zst')
+
+
+@patch('boss.api.deployment.transfer.compression')
+@patch('boss.api.deployment.transfer.ssh.measure_throughput')
+@patch('boss.api.deployment.transfer.fs')
+def test_resolve_codec_auto(fs_m, throughput_m, compression_m, deployment_config):
+    '''
+    Test resolve_codec() chooses out of the codecs available
+    on the remote in the auto mode.
+    '''
+    deployment_config.return_value = merge(DEFAULT_CONFIG['deployment'], {
+        'codec': codecs.AUTO
+    })
+    fs_m.which.return_value = ['gzip', 'zstd']
+    throughput_m.return_value = 1024 * 1024
+    compression_m.choose.return_value = {'name': codecs.ZSTD, 'level': 1}
+
+    codec = transfer.resolve_codec('build/')
+
+    assert sorted(fs_m.which.call_args[0][0]) == ['gzip', 'lz4', 'zstd']
+    compression_m.get_candidates.assert_called_with(['gzip', 'zstd'])
+    compression_m.choose.assert_called_with(
+        'build/',
+        compression_m.get_candidates.return_value,
+        1024 * 1024
+    )
+    assert codec == {'name': codecs.ZSTD, 'level': 1}
+
+
+@patch('boss.api.deployment.transfer.PIPELINE_SCAN_INTERVAL', 0.01)
+@patch('boss.api.deployment.transfer.buildman.get_deploy_dir', return_value='~/app')
+@patch('boss.api.deployment.transfer.env')
+@patch('boss.api.deployment.transfer.ssh.extract_stream')
+def test_pipeline(extract_stream_m, env_m, _, deployment_config, tmpdir):
+    '''
+    Test the build is uploaded to the staging directory of each host while
+    building, and only the files changed since are left to be uploaded.
+    '''
+    env_m.hosts = ['web1', 'web2']
+    deployment_config.return_value = merge(
+        DEFAULT_CONFIG['deployment'], {'pipeline': True}
+    )
+    build_dir = str(tmpdir)
+
+    pipelined = transfer.start_pipeline(build_dir, 'build-2')
+    tmpdir.join('index.html').write('<html></html>')
+    tmpdir.join('app.js').write('app();')
+
+    # Wait until both of the files are uploaded.
+    for _ in range(500):
+        if len(pipelined['uploaded']) == 2:
+            break
+        time.sleep(0.01)
+
+    # The build changes a file once it's no longer being uploaded.
+    transfer.stop_uploading(pipelined)
+    tmpdir.join('app.js').write('app(); // changed')
+    staged = transfer.finish_pipeline(pipelined)
+
+    assert extract_stream_m.call_args[1]['host_string'] in ['web1', 'web2']
+    assert set(x[0][2][0] for x in extract_stream_m.call_args_list) <= set(
+        ['app.js', 'index.html']
+    )
+    assert staged == {
+        'path': '~/app/.boss/pipeline/build-2',
+        'hosts': ['web1', 'web2'],
+        'uploaded': 2,
+        'changed': ['app.js'],
+        'removed': []
+    }
+
+
+@patch('boss.api.deployment.transfer.PIPELINE_SCAN_INTERVAL', 0.01)
+@patch('boss.api.deployment.transfer.buildman.get_deploy_dir', return_value='~/app')
+@patch('boss.api.deployment.transfer.env')
+@patch('boss.api.deployment.transfer.ssh.exec_command')
+@patch('boss.api.deployment.transfer.ssh.extract_stream')
+def test_pipeline_failure(extract_stream_m, exec_command_m, env_m, _, deployment_config, tmpdir):
+    '''
+    Test nothing is staged if uploading while building fails,
+    and what's been staged on the hosts is removed.
+    '''
+    env_m.hosts = ['web1']
+    extract_stream_m.side_effect = SystemExit('Failed extracting the build')
+    deployment_config.return_value = merge(
+        DEFAULT_CONFIG['deployment'], {'pipeline': True}
+    )
+
+    pipelined = transfer.start_pipeline(str(tmpdir), 'build-2')
+    tmpdir.join('index.html').write('<html></html>')
+    pipelined['thread'].join(5)
+
+    assert transfer.finish_pipeline(pipelined) is None
+    exec_command_m.assert_called_once_with(
+        'rm -rf ~/app/.boss/pipeline/build-2', 'web1'
+    )
+
+
+@patch('boss.api.deployment.transfer.ssh.exec_command')
+def test_stop_pipeline_removes_staged(exec_command_m):
+    '''
+    Test stop_pipeline() removes the build left staged on each of the hosts,
+    even if it couldn't be removed from some of them.
+    '''
+    exec_command_m.side_effect = [SystemExit('Connection refused'), (0, '')]
+    pipelined = {
+        'path': '~/app/.boss/pipeline/build-2',
+        'hosts': ['web1', 'web2'],
+        'stopped': Event(),
+        'thread': Mock()
+    }
+
+    transfer.stop_pipeline(pipelined)
+
+    assert pipelined['stopped'].is_set()
+    pipelined['thread'].join.assert_called_once_with()
+    assert [x[0] for x in exec_command_m.call_args_list] == [
+        ('rm -rf ~/app/.boss/pipeline/build-2', 'web1'),
+        ('rm -rf ~/app/.boss/pipeline/build-2', 'web2')
+    ]
+
+
+@patch('boss.api.deployment.transfer.info')
+@patch('boss.api.deployment.transfer.ssh.measure_throughput')
+def test_resolve_codec_auto_before_build(measure_m, _, deployment_config):
+    '''
+    Test resolve_codec() uses the default codec in the auto mode if there's
+    no build to sample yet, ie: in the pipeline mode.
+    '''
+    deployment_config.return_value = merge(
+        DEFAULT_CONFIG['deployment'], {'codec': codecs.AUTO}
+    )
+
+    assert transfer.resolve_codec() == GZIP
+    measure_m.assert_not_called()
+
+
+def test_start_pipeline_when_disabled(deployment_config):
+    ''' Test start_pipeline() does nothing if the pipeline mode is disabled. '''
+    deployment_config.return_value = merge(
+        DEFAULT_CONFIG['deployment'], {'pipeline': True, 'delta': True}
+    )
+
+    assert transfer.start_pipeline('build/', 'build-2') is None
+
+
+@patch('boss.api.deployment.transfer.env')
+@patch('boss.api.deployment.transfer.ssh.extract_stream')
+@patch('boss.api.deployment.transfer.fs')
+def test_upload_staged(fs_m, extract_stream_m, env_m):
+    '''
+    Test upload() uploads only the rest of the staged build,
+    and moves the staging directory to the destination path.
+    '''
+    env_m.host_string = 'web1'
+    artifact = get_artifact(staged={
+        'path': '~/app/.boss/pipeline/build-2',
+        'hosts': ['web1'],
+        'uploaded': 10,
+        'changed': ['app.js'],
+        'removed': ['old.js']
+    })
+
+    transfer.upload(artifact, '~/app/releases/build-2')
+
+    extract_stream_m.assert_called_once_with(
+        'build/', '~/app/.boss/pipeline/build-2', ['app.js'], codec=GZIP
+    )
+    fs_m.rm_rf.assert_called_once_with(['old.js'])
+    fs_m.move.assert_called_once_with(
+        '~/app/.boss/pipeline/build-2', '~/app/releases/build-2'
+    )
@@ -56,7 +56,7 @@ def test_notity_deploying(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -83,7 +83,7 @@ def test_notity_deployed(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -110,7 +110,7 @@ def test_deployment_finished_notification_with_no_repository_url(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -137,7 +137,7 @@ def test_deployment_started_notification_with_no_repository_url(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -162,7 +162,7 @@ def test_notity_deployment_finished_with_no_commit(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -187,7 +187,7 @@ def test_notity_deployment_started_with_no_commit(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -215,7 +215,7 @@ def test_notity_deploying_with_no_branch(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -243,7 +243,7 @@ def test_notity_deployed_with_no_branch(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -266,7 +266,7 @@ def test_notity_deployment_finished_with_no_commit_no_branch(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -289,7 +289,7 @@ def test_notity_deployment_started_with_no_commit_no_branch(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -308,7 +308,7 @@ def test_notity_deployment_started_no_links_at_all(base_url):
         'message_format': 'html'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -333,7 +333,7 @@ def test_send_running_script_started_notification(base_url):
         'message': 'user is running <a href="http://repository-url">project-name</a>:migration on <a href="http://public-url">stage</a> server.'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(RUNNING_SCRIPT_STARTED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
 
@@ -358,6 +358,6 @@ def test_send_running_script_finished_notification(base_url):
         'message': 'user finished running <a href="http://repository-url">project-name</a>:migration on <a href="http://public-url">stage</a> server.'
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         hipchat.send(RUNNING_SCRIPT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(base_url, json=payload)
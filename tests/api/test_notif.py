@@ -5,7 +5,10 @@ from mock import patch
 from boss.api import notif
 from boss.core.constants.notification_types import (
     DEPLOYMENT_STARTED,
-    DEPLOYMENT_FINISHED
+    DEPLOYMENT_FINISHED,
+    RUNNING_SCRIPT_STARTED,
+    RUNNING_SCRIPT_FINISHED,
+    RUNNING_SCRIPTS_FINISHED
 )
 
 
@@ -19,6 +22,7 @@ def test_notif_sends_slack_notification(slack_send_m, slack_is_enabled_m, gsc_m,
     commit_url = 'https://github.com/kabirbaidhya/boss/tree/t12345'
     get_m.return_value = {
         'project_name': 'test-project',
+        'notified_hooks': {'coalesce': False},
         'project_description': 'Just a test project',
         'repository_url': 'https://github.com/kabirbaidhya/boss',
     }
@@ -45,6 +49,7 @@ def test_notif_sends_slack_notification(slack_send_m, slack_is_enabled_m, gsc_m,
         'stage': 'test-server'
     })
 
+    notif.flush()
     (call1, call2) = slack_send_m.call_args_list
 
     assert call1[0][0] == DEPLOYMENT_STARTED
@@ -81,6 +86,7 @@ def test_notif_sends_hipchat_notification(hipchat_send_m, hipchat_is_enabled_m,
     commit_url = 'https://github.com/kabirbaidhya/boss/tree/t12345'
     get_m.return_value = {
         'project_name': 'test-project',
+        'notified_hooks': {'coalesce': False},
         'project_description': 'Just a test project',
         'repository_url': 'https://github.com/kabirbaidhya/boss',
     }
@@ -106,6 +112,7 @@ def test_notif_sends_hipchat_notification(hipchat_send_m, hipchat_is_enabled_m,
         'stage': 'test-server'
     })
 
+    notif.flush()
     (call1, call2) = hipchat_send_m.call_args_list
 
     assert call1[0][0] == DEPLOYMENT_FINISHED
@@ -140,6 +147,7 @@ def test_notif_without_commit(hipchat_send_m, hipchat_is_enabled_m, gsc_m, get_m
     ''' Test notif.send sends hipchat notification if hipchat is enabled. '''
     get_m.return_value = {
         'project_name': 'test-project',
+        'notified_hooks': {'coalesce': False},
         'project_description': 'Just a test project',
         'repository_url': 'https://github.com/kabirbaidhya/boss',
     }
@@ -163,6 +171,7 @@ def test_notif_without_commit(hipchat_send_m, hipchat_is_enabled_m, gsc_m, get_m
         'stage': 'test-server'
     })
 
+    notif.flush()
     (call1, call2) = hipchat_send_m.call_args_list
 
     assert call1[0][0] == DEPLOYMENT_FINISHED
@@ -193,6 +202,7 @@ def test_notif_without_repository_url(hipchat_send_m, hipchat_is_enabled_m, gsc_
     ''' Test notif.send sends hipchat notification without repository_url. '''
     get_m.return_value = {
         'project_name': 'test-project',
+        'notified_hooks': {'coalesce': False},
         'project_description': 'Just a test project'
     }
     gsc_m.return_value = {
@@ -215,6 +225,7 @@ def test_notif_without_repository_url(hipchat_send_m, hipchat_is_enabled_m, gsc_
         'stage': 'test-server'
     })
 
+    notif.flush()
     (call1, call2) = hipchat_send_m.call_args_list
 
     assert call1[0][0] == DEPLOYMENT_FINISHED
@@ -249,6 +260,7 @@ def test_notif_without_public_url(hipchat_send_m, hipchat_is_enabled_m, gsc_m, g
     ''' Test notif.send sends hipchat notification without public_url. '''
     get_m.return_value = {
         'project_name': 'test-project',
+        'notified_hooks': {'coalesce': False},
         'project_description': 'Just a test project'
     }
     gsc_m.return_value = {
@@ -270,6 +282,7 @@ def test_notif_without_public_url(hipchat_send_m, hipchat_is_enabled_m, gsc_m, g
         'stage': 'test-server'
     })
 
+    notif.flush()
     (call1, call2) = hipchat_send_m.call_args_list
 
     assert call1[0][0] == DEPLOYMENT_FINISHED
@@ -294,3 +307,86 @@ def test_notif_without_public_url(hipchat_send_m, hipchat_is_enabled_m, gsc_m, g
     assert call2[1]['public_url'] == 'http://127.0.0.1'
     assert call2[1]['server_name'] == 'test-server'
     assert call2[1]['user'] == 'ssh-user'
+
+
+@patch('boss.api.notif.notify')
+@patch('boss.api.notif.get_config')
+@patch('boss.api.slack.is_enabled')
+def test_notif_coalesces_script_notifications(slack_is_enabled_m, get_m, notify_m):
+    '''
+    Test notif.send sends a single summary of the scripts run during
+    a deployment, if the notifications are coalesced.
+    '''
+    get_m.return_value = {'notified_hooks': {'coalesce': True}}
+    slack_is_enabled_m.return_value = True
+    deployment = {'user': 'kabir', 'branch': 'dev', 'stage': 'test-server'}
+
+    notif.send(DEPLOYMENT_STARTED, deployment)
+
+    for script in ['build', 'migrate', 'build', 'reload']:
+        notif.send(RUNNING_SCRIPT_STARTED, {
+            'script': script,
+            'user': 'kabir',
+            'stage': 'test-server'
+        })
+        notif.send(RUNNING_SCRIPT_FINISHED, {
+            'script': script,
+            'user': 'kabir',
+            'stage': 'test-server'
+        })
+
+    notif.send(DEPLOYMENT_FINISHED, deployment)
+
+    assert [x[0][1:] for x in notify_m.call_args_list] == [
+        (DEPLOYMENT_STARTED, deployment),
+        (RUNNING_SCRIPTS_FINISHED, {
+            'user': 'kabir',
+            'stage': 'test-server',
+            'scripts': ['build', 'migrate', 'reload']
+        }),
+        (DEPLOYMENT_FINISHED, deployment)
+    ]
+
+
+@patch('boss.api.notif.notify')
+@patch('boss.api.notif.get_config')
+@patch('boss.api.slack.is_enabled')
+def test_notif_does_not_coalesce_scripts_outside_deployment(slack_is_enabled_m, get_m, notify_m):
+    ''' Test notif.send sends the notifications of scripts run on their own. '''
+    get_m.return_value = {'notified_hooks': {'coalesce': True}}
+    slack_is_enabled_m.return_value = True
+    params = {'script': 'migrate', 'user': 'kabir', 'stage': 'test-server'}
+
+    notif.send(RUNNING_SCRIPT_STARTED, params)
+    notif.send(RUNNING_SCRIPT_FINISHED, params)
+
+    assert [x[0][1:] for x in notify_m.call_args_list] == [
+        (RUNNING_SCRIPT_STARTED, params),
+        (RUNNING_SCRIPT_FINISHED, params)
+    ]
+
+
+@patch('boss.api.notif.notify')
+@patch('boss.api.notif.get_config')
+@patch('boss.api.slack.is_enabled')
+def test_notif_flush_sends_unfinished_summary(slack_is_enabled_m, get_m, notify_m):
+    '''
+    Test notif.flush sends the summary of the scripts run
+    by a deployment that didn't finish.
+    '''
+    get_m.return_value = {'notified_hooks': {'coalesce': True}}
+    slack_is_enabled_m.return_value = True
+
+    notif.send(DEPLOYMENT_STARTED, {'user': 'kabir', 'stage': 'test-server'})
+    notif.send(RUNNING_SCRIPT_FINISHED, {
+        'script': 'migrate',
+        'user': 'kabir',
+        'stage': 'test-server'
+    })
+    notif.flush()
+
+    assert notify_m.call_args_list[-1][0][1:] == (RUNNING_SCRIPTS_FINISHED, {
+        'user': 'kabir',
+        'stage': 'test-server',
+        'scripts': ['migrate']
+    })
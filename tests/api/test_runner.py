@@ -1,8 +1,8 @@
 ''' Tests for runner. '''
 
-from mock import patch
+from mock import patch, call, Mock
 
-from boss.api.runner import should_notify, run_script
+from boss.api.runner import should_notify, run_script, run, run_all
 from boss.core.constants.notification_types import (
     RUNNING_SCRIPT_STARTED,
     RUNNING_SCRIPT_FINISHED
@@ -57,7 +57,8 @@ def test_should_notify_returns_false(gc_m):
 @patch('boss.api.runner.notif.send')
 @patch('boss.api.runner.shell.get_user')
 @patch('boss.api.runner.shell.get_stage')
-def test_run_script_send_script_running_notifications(gs_m, gu_m, send_m, gc_m, hi_m, h_m, r_m):
+@patch('boss.api.runner.is_shell_runner', return_value=False)
+def test_run_script_send_script_running_notifications(_, gs_m, gu_m, send_m, gc_m, hi_m, h_m, r_m):
     gs_m.return_value = 'prod'
     gu_m.return_value = 'kabir'
     gc_m.return_value = {
@@ -83,3 +84,64 @@ def test_run_script_send_script_running_notifications(gs_m, gu_m, send_m, gc_m,
     assert call2[0][1]['script'] == 'foo'
     assert call2[0][1]['user'] == 'kabir'
     assert call2[0][1]['stage'] == 'prod'
+
+
+@patch('boss.api.runner.ssh.run')
+@patch('boss.api.runner._run')
+@patch('boss.api.runner.get_stage_config')
+@patch('boss.api.runner.shell.get_stage', return_value='prod')
+def test_run_with_fabric(_, gsc_m, run_m, ssh_run_m):
+    ''' Test run() runs the remote commands with fabric by default. '''
+    gsc_m.return_value = {'runner': 'fabric'}
+
+    run('ls', quiet=True)
+
+    run_m.assert_called_once_with('ls', quiet=True)
+    ssh_run_m.assert_not_called()
+
+
+@patch('boss.api.runner.ssh.run')
+@patch('boss.api.runner._run')
+@patch('boss.api.runner.get_stage_config')
+@patch('boss.api.runner.shell.get_stage', return_value='prod')
+def test_run_with_shell_runner(_, gsc_m, run_m, ssh_run_m):
+    ''' Test run() runs the remote commands in a persistent shell if configured. '''
+    gsc_m.return_value = {'runner': 'shell'}
+
+    run('ls')
+
+    ssh_run_m.assert_called_once_with('ls')
+    run_m.assert_not_called()
+
+
+@patch('boss.api.runner.ssh.run_all')
+@patch('boss.api.runner._run')
+@patch('boss.api.runner.get_stage_config')
+@patch('boss.api.runner.shell.get_stage', return_value='prod')
+def test_run_all_with_fabric(_, gsc_m, run_m, ssh_run_all_m):
+    ''' Test run_all() runs the commands with fabric until one of them fails. '''
+    gsc_m.return_value = {'runner': 'fabric'}
+    run_m.side_effect = [Mock(failed=False), Mock(failed=True)]
+
+    results = run_all(['ls', 'false', 'pwd'], warn_only=True)
+
+    assert len(results) == 2
+    run_m.assert_has_calls([
+        call('ls', warn_only=True),
+        call('false', warn_only=True)
+    ])
+    ssh_run_all_m.assert_not_called()
+
+
+@patch('boss.api.runner.ssh.run_all')
+@patch('boss.api.runner._run')
+@patch('boss.api.runner.get_stage_config')
+@patch('boss.api.runner.shell.get_stage', return_value='prod')
+def test_run_all_with_shell_runner(_, gsc_m, run_m, ssh_run_all_m):
+    ''' Test run_all() pipelines the commands in a persistent shell if configured. '''
+    gsc_m.return_value = {'runner': 'shell'}
+
+    run_all(['ls', 'pwd'])
+
+    ssh_run_all_m.assert_called_once_with(['ls', 'pwd'])
+    run_m.assert_not_called()
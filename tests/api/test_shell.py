@@ -0,0 +1,31 @@
+''' Tests for boss.api.shell module. '''
+
+import pytest
+from mock import patch
+
+from boss.api import shell
+
+
+@patch('boss.api.shell.sys.argv', ['fab', 'prod', 'deploy'])
+def test_get_stage():
+    ''' Test get_stage() returns the stage from the command line args. '''
+    assert shell.get_stage() == 'prod'
+
+
+@patch('boss.api.shell.sys.argv', ['fab', 'prod:group=web', 'deploy'])
+def test_get_stage_with_host_filter():
+    ''' Test get_stage() strips the arguments of the stage task. '''
+    assert shell.get_stage() == 'prod'
+
+
+@patch('boss.api.shell.sys.argv', ['fab'])
+def test_get_stage_when_not_set():
+    ''' Test get_stage() halts if the stage isn't set. '''
+    with pytest.raises(SystemExit):
+        shell.get_stage()
+
+
+@patch('boss.api.shell.sys.argv', ['fab', 'prod:group=web,hosts=app1*', 'deploy:1'])
+def test_get_commands():
+    ''' Test get_commands() returns the names of the tasks without their args. '''
+    assert shell.get_commands() == ['prod', 'deploy']
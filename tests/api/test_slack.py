@@ -85,7 +85,7 @@ def test_send(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -116,7 +116,7 @@ def test_send_deployment_started_with_no_repository_url(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -147,7 +147,7 @@ def test_send_deployment_finished_with_no_repository_url(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -179,7 +179,7 @@ def test_send_with_no_branch_name(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -209,7 +209,7 @@ def test_notity_deployed(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -237,7 +237,7 @@ def test_notity_deployed_with_no_commit(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -265,7 +265,7 @@ def test_notity_deploying_with_no_commit(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -297,7 +297,7 @@ def test_notity_deployed_with_no_branch_name(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -323,7 +323,7 @@ def test_notity_deployment_finished_with_no_commit_no_branch(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -349,7 +349,7 @@ def test_notity_deployment_started_with_no_commit_no_branch(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -372,7 +372,7 @@ def test_notity_deployment_started_no_links_at_all(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(DEPLOYMENT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -400,7 +400,7 @@ def test_send_running_script_started_notification(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(RUNNING_SCRIPT_STARTED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
 
@@ -428,6 +428,6 @@ def test_send_running_script_finished_notification(slack_url):
         ]
     }
 
-    with patch('requests.post') as mock_post:
+    with patch('boss.core.http.post') as mock_post:
         slack.send(RUNNING_SCRIPT_FINISHED, **notify_params)
         mock_post.assert_called_once_with(slack_url, json=payload)
@@ -1,58 +1,179 @@
 ''' Tests for ssh module. '''
 
+import pytest
+from subprocess import Popen, PIPE, STDOUT
 from mock import patch, Mock
+from fabric.api import cd, settings, shell_env
 
-from boss.api.ssh import resolve_sftp_client
+from boss.api.ssh import sftp_session, extract_stream, run, run_all
 
 
+@pytest.fixture()
+def shell_m():
+    ''' Resolve a shell session backed by a local shell instead of a remote one. '''
+    process = Popen(['/bin/bash', '-s'], stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+
+    with patch('boss.api.ssh.resolve_shell') as m:
+        m.return_value = {'stdin': process.stdin, 'stdout': process.stdout}
+        yield m
+
+    process.stdin.close()
+    process.wait()
+
+
+@patch('boss.api.ssh.resolve_client')
 @patch('boss.api.ssh.state.get')
-def test_resolve_sftp_client_existing_client(get_m):
+def test_sftp_session_reuses_the_released_session(get_m, resolve_client_m):
     '''
-    Test resolve_sftp_client() returns an
-    existing sftp connection if it exists.
+    Test sftp_session() opens a new sftp session only
+    if there are no idle sessions in the pool of the host.
     '''
+    get_m.return_value = Mock(host_string='sftp-test-host')
+    sftp = Mock(**{'get_channel.return_value.closed': False})
+    resolve_client_m.return_value.open_sftp.return_value = sftp
 
-    sftp_client = Mock(foo='bar')
-
-    def side_effect(x):
-        d = {
-            'env': Mock(host_string='localhost'),
-            'sftp_connections': {
-                'localhost': sftp_client
-            }
-        }
+    with sftp_session() as result:
+        assert result == sftp
 
-        return d[x]
+    with sftp_session() as result:
+        assert result == sftp
 
-    get_m.side_effect = side_effect
-    result = resolve_sftp_client()
-
-    assert result == sftp_client
+    resolve_client_m.return_value.open_sftp.assert_called_once_with()
 
 
+@patch('boss.api.ssh.resolve_client')
 @patch('boss.api.ssh.state.get')
-def test_resolve_sftp_client_new_client(get_m):
+def test_sftp_session_opens_new_sessions_when_in_use(get_m, resolve_client_m):
     '''
-    Test resolve_sftp_client() returns
-    a new sftp connection if it doesn't exists.
+    Test sftp_session() opens a new sftp session if the
+    pooled sessions are in use or closed.
     '''
+    get_m.return_value = Mock(host_string='sftp-test-host-2')
+    sessions = [
+        Mock(**{'get_channel.return_value.closed': False}) for _ in range(3)
+    ]
+    resolve_client_m.return_value.open_sftp.side_effect = sessions
+
+    with sftp_session() as first:
+        with sftp_session() as second:
+            assert (first, second) == (sessions[0], sessions[1])
+
+    sessions[1].get_channel.return_value.closed = True
+    sessions[0].get_channel.return_value.closed = True
+
+    with sftp_session() as third:
+        assert third == sessions[2]
+
+
+@patch('boss.api.ssh.remote.stream')
+@patch('boss.api.ssh.resolve_client')
+def test_extract_stream(resolve_client_m, stream_m):
+    ''' Test extract_stream() streams the archive to the remote tar command. '''
+    stream_m.return_value = (0, '')
+
+    extract_stream('build/', '/app/builds/build-1')
+
+    (client, command, _) = stream_m.call_args[0]
+
+    assert client == resolve_client_m.return_value
+    assert command == (
+        'mkdir -p /app/builds/build-1 && ' +
+        'tar xzf - --strip-components=1 -C /app/builds/build-1'
+    )
+
+
+@patch('boss.api.ssh.remote.stream')
+@patch('boss.api.ssh.resolve_client')
+def test_extract_stream_failure(_, stream_m):
+    ''' Test extract_stream() halts if the remote command fails. '''
+    stream_m.return_value = (2, 'tar: error')
+
+    with pytest.raises(SystemExit):
+        extract_stream('build/', '/app/builds/build-1')
+
+
+@patch('boss.api.ssh.remote.stream')
+@patch('boss.api.ssh.resolve_client')
+def test_extract_stream_with_unlink(_, stream_m):
+    ''' Test extract_stream() unlinks the existing files before extracting if required. '''
+    stream_m.return_value = (0, '')
+
+    extract_stream('build/', '/app/builds/build-1', unlink=True)
+
+    (_, command, _) = stream_m.call_args[0]
+
+    assert command == (
+        'mkdir -p /app/builds/build-1 && ' +
+        'tar xzf - --unlink-first --strip-components=1 -C /app/builds/build-1'
+    )
+
+
+@patch('boss.api.ssh.remote.stream')
+@patch('boss.api.ssh.resolve_client')
+def test_extract_stream_with_codec(_, stream_m):
+    ''' Test extract_stream() decompresses the stream with the given codec. '''
+    stream_m.return_value = (0, '')
+
+    extract_stream('build/', '/app/builds/build-1', codec={'name': 'zstd', 'level': 3})
+
+    (_, command, _) = stream_m.call_args[0]
+
+    assert command == (
+        'mkdir -p /app/builds/build-1 && zstd -q -dc | ' +
+        'tar xf - --strip-components=1 -C /app/builds/build-1'
+    )
+
+
+def test_run(shell_m, capsys):
+    ''' Test run() runs the command in the shell session under the fabric contexts. '''
+    with settings(host_string='example.com'), cd('/tmp'), shell_env(FOO='foo'):
+        result = run('pwd && echo $FOO')
+
+    (out, _) = capsys.readouterr()
+
+    assert result == '/tmp\nfoo'
+    assert result.succeeded
+    assert '[example.com] out: /tmp\n[example.com] out: foo\n' in out
+
+
+def test_run_failure(shell_m):
+    ''' Test run() aborts if the command fails. '''
+    with settings(host_string='example.com'), pytest.raises(SystemExit):
+        run('exit 2')
+
+
+def test_run_with_warn_only(shell_m, capsys):
+    ''' Test run() returns the failed result with warn_only or quiet. '''
+    with settings(host_string='example.com'):
+        result = run('echo foo && exit 2', warn_only=True)
+        quiet_result = run('echo bar && exit 1', quiet=True)
+
+    (out, _) = capsys.readouterr()
+
+    assert result.failed
+    assert result.return_code == 2
+    assert quiet_result.failed
+    assert 'bar' not in out
+
+
+def test_run_all(shell_m, capsys):
+    ''' Test run_all() runs the commands in a single round trip. '''
+    with settings(host_string='example.com'), cd('/tmp'):
+        results = run_all(['pwd', 'echo foo'])
 
-    sftp_client = Mock(foo='bar')
-    attrs = {'open_sftp.return_value': sftp_client}
-    client = Mock(**attrs)
+    (out, _) = capsys.readouterr()
 
-    def side_effect(x):
-        d = {
-            'env': Mock(host_string='localhost'),
-            'sftp_connections': {},
-            'connections': {
-                'localhost': client
-            }
-        }
+    shell_m.assert_called_once()
+    assert results == ['/tmp', 'foo']
+    assert [x.command for x in results] == ['pwd', 'echo foo']
+    assert '[example.com] run: pwd\n[example.com] run: echo foo\n' in out
 
-        return d[x]
 
-    get_m.side_effect = side_effect
-    result = resolve_sftp_client()
+def test_run_all_with_warn_only(shell_m):
+    ''' Test run_all() returns the results until the failed command with warn_only. '''
+    with settings(host_string='example.com'):
+        results = run_all(['echo foo', 'exit 2', 'echo bar'], warn_only=True)
 
-    assert result == sftp_client
+    assert results == ['foo', '']
+    assert results[1].failed
+    assert results[1].return_code == 2
@@ -0,0 +1,95 @@
+''' Tests for boss.core.cache module. '''
+
+import os
+from tempfile import mkdtemp
+
+from boss.core import cache, fs
+
+
+def make_build(files):
+    ''' Create a build directory with the given files. '''
+    build_dir = mkdtemp()
+
+    for (name, data) in files.items():
+        fs.write(os.path.join(build_dir, name), data)
+
+    return build_dir
+
+
+def test_get_key():
+    ''' Test get_key() doesn't depend on the order of the inputs. '''
+    a = cache.get_key({'commit': 'abc', 'stage': 'dev'})
+    b = cache.get_key({'stage': 'dev', 'commit': 'abc'})
+
+    assert a == b
+    assert a != cache.get_key({'commit': 'abc', 'stage': 'prod'})
+
+
+def test_store_and_restore():
+    ''' Test a stored build could be restored over an existing directory. '''
+    cache_dir = os.path.join(mkdtemp(), 'builds')
+    build_dir = make_build({'index.html': 'hello'})
+    dest_dir = make_build({'stale.html': 'stale'})
+
+    cache.store(cache_dir, 'key1', build_dir)
+
+    assert cache.restore(cache_dir, 'key1', dest_dir) is True
+    assert os.listdir(dest_dir) == ['index.html']
+    assert fs.read(os.path.join(dest_dir, 'index.html')) == 'hello'
+
+
+def test_restore_miss():
+    ''' Test restore() returns False if the key isn't cached. '''
+    dest_dir = make_build({'index.html': 'hello'})
+
+    assert cache.restore(mkdtemp(), 'key1', dest_dir) is False
+    assert os.listdir(dest_dir) == ['index.html']
+
+
+def test_evict():
+    ''' Test evict() removes the least recently used entries beyond the limit. '''
+    cache_dir = mkdtemp()
+
+    for (i, key) in enumerate(['a', 'b', 'c']):
+        cache.store(cache_dir, key, make_build({'file': 'x' * 10}))
+        os.utime(cache.get_entry_path(cache_dir, key), (i, i))
+
+    # Restoring an entry marks it as recently used.
+    cache.restore(cache_dir, 'a', mkdtemp())
+
+    assert cache.evict(cache_dir, 20) == ['b']
+    assert sorted(os.listdir(cache_dir)) == ['a', 'c']
+
+
+def test_write_and_read():
+    ''' Test the data written for a key could be read back. '''
+    cache_dir = os.path.join(mkdtemp(), 'config')
+
+    assert cache.read(cache_dir, 'abc') is None
+
+    cache.write(cache_dir, 'abc', {'stages': {'dev': {'port': 22}}})
+
+    assert cache.read(cache_dir, 'abc') == {'stages': {'dev': {'port': 22}}}
+    assert os.listdir(cache_dir) == ['abc']
+
+
+def test_read_returns_none_for_a_corrupt_entry():
+    ''' Test read() ignores an entry that can't be unpickled. '''
+    cache_dir = mkdtemp()
+    fs.write(os.path.join(cache_dir, 'abc'), 'not a pickle')
+
+    assert cache.read(cache_dir, 'abc') is None
+
+
+def test_prune():
+    ''' Test prune() keeps only the most recently used entries. '''
+    cache_dir = mkdtemp()
+
+    for (index, key) in enumerate(['a', 'b', 'c']):
+        cache.write(cache_dir, key, index)
+        os.utime(os.path.join(cache_dir, key), (index, index))
+
+    cache.read(cache_dir, 'a')
+
+    assert cache.prune(cache_dir, 2) == ['b']
+    assert sorted(os.listdir(cache_dir)) == ['a', 'c']
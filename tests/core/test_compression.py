@@ -0,0 +1,85 @@
+''' Tests for boss.core.compression module. '''
+
+import pytest
+from mock import patch
+
+from boss.core import compression
+from boss.core.constants import codecs
+
+
+def test_get_codec_unsupported():
+    ''' Test get_codec() raises an error for an unsupported codec. '''
+    with pytest.raises(RuntimeError):
+        compression.get_codec('rar')
+
+
+def test_compress_command():
+    ''' Test compress_command() adds the compression level if provided. '''
+    assert compression.compress_command(compression.get_codec()) == 'gzip'
+    assert compression.compress_command(
+        compression.get_codec(codecs.ZSTD, 9)
+    ) == 'zstd -q -T0 -9'
+    assert compression.compress_command(compression.get_codec(codecs.NONE)) is None
+
+
+def test_archive_command():
+    ''' Test archive_command() builds the tar command for each of the codecs. '''
+    assert compression.archive_command('a.tar.gz', 'build') == 'tar -czvf a.tar.gz build'
+    assert compression.archive_command(
+        'a.tar', 'build', compression.get_codec(codecs.NONE)
+    ) == 'tar -cvf a.tar build'
+    assert compression.archive_command(
+        'a.tar.lz4', 'build', compression.get_codec(codecs.LZ4, 1)
+    ) == 'tar -cvf - build | lz4 -q -1 > a.tar.lz4'
+
+
+def test_extract_command():
+    ''' Test extract_command() builds the tar command for each of the codecs. '''
+    assert compression.extract_command('a.tar.gz', 'dist') == (
+        'tar xzvf a.tar.gz --strip-components=1 -C dist'
+    )
+    assert compression.extract_command(
+        'a.tar', 'dist', compression.get_codec(codecs.NONE), unlink=True
+    ) == 'tar xvf a.tar --unlink-first --strip-components=1 -C dist'
+    assert compression.extract_command(
+        'a.tar.zst', 'dist', compression.get_codec(codecs.ZSTD)
+    ) == 'zstd -q -dc < a.tar.zst | tar xvf - --strip-components=1 -C dist'
+
+
+@patch('boss.core.compression.is_available', return_value=True)
+def test_get_candidates(_):
+    ''' Test get_candidates() includes only the codecs available on the remote. '''
+    result = compression.get_candidates(['gzip'])
+
+    assert [x['name'] for x in result] == ['gzip', 'gzip', 'none']
+    assert [x['level'] for x in result] == [1, 6, None]
+
+
+def test_measure():
+    ''' Test measure() measures the ratio of compressing the sample. '''
+    codec = compression.get_codec(codecs.GZIP, 1)
+    (ratio, speed) = compression.measure(codec, b'a' * 10000)
+
+    assert ratio < 0.1
+    assert speed > 0
+    assert compression.measure(compression.get_codec(codecs.NONE), b'a') == (
+        1.0, float('inf')
+    )
+
+
+def test_select():
+    ''' Test select() favours the ratio on slow links and the speed on fast ones. '''
+    size = 100 * 1024 * 1024
+    fast = compression.get_codec(codecs.LZ4, 1)
+    strong = compression.get_codec(codecs.ZSTD, 9)
+    measurements = [
+        (compression.get_codec(codecs.NONE), 1.0, float('inf')),
+        (fast, 0.5, 500 * 1024 * 1024),
+        (strong, 0.2, 20 * 1024 * 1024)
+    ]
+
+    assert compression.select(measurements, size, 1024 * 1024) == strong
+    assert compression.select(measurements, size, 200 * 1024 * 1024) == fast
+    assert compression.select(
+        measurements, size, 10 * 1024 * 1024 * 1024
+    ) == compression.get_codec(codecs.NONE)
@@ -0,0 +1,85 @@
+''' Tests for boss.core.dispatcher module. '''
+
+from threading import Event
+
+from mock import patch
+
+from boss.core import dispatcher
+
+
+def test_dispatch_runs_in_order_per_key():
+    ''' Test dispatch() runs the calls for a key in the order dispatched. '''
+    calls = []
+
+    for i in range(10):
+        dispatcher.dispatch('test-order', calls.append, i)
+
+    assert dispatcher.flush() is True
+    assert calls == range(10)
+
+
+def test_dispatch_does_not_block():
+    ''' Test dispatch() returns without waiting for the call to complete. '''
+    event = Event()
+    calls = []
+
+    dispatcher.dispatch('test-block', event.wait, 5)
+    dispatcher.dispatch('test-block', calls.append, 'done')
+
+    assert calls == []
+
+    event.set()
+    dispatcher.flush()
+
+    assert calls == ['done']
+
+
+def test_dispatch_keys_run_concurrently():
+    ''' Test a blocked call for a key doesn't hold up the other keys. '''
+    event = Event()
+    calls = []
+
+    dispatcher.dispatch('test-slow', event.wait, 5)
+    dispatcher.dispatch('test-fast', calls.append, 'fast')
+
+    assert dispatcher.get_queue('test-fast').join() is None
+    assert calls == ['fast']
+
+    event.set()
+    dispatcher.flush()
+
+
+def test_dispatch_survives_errors():
+    ''' Test the worker keeps running the calls after a failed one. '''
+    calls = []
+
+    def fail():
+        raise RuntimeError('Failed')
+
+    dispatcher.dispatch('test-errors', fail)
+    dispatcher.dispatch('test-errors', calls.append, 'after')
+    dispatcher.flush()
+
+    assert calls == ['after']
+
+
+def test_flush_times_out():
+    ''' Test flush() gives up waiting after the timeout. '''
+    event = Event()
+
+    dispatcher.dispatch('test-timeout', event.wait, 5)
+
+    assert dispatcher.flush(timeout=0.1) is False
+
+    event.set()
+    dispatcher.flush()
+
+
+def test_dispatch_in_forked_process():
+    ''' Test dispatch() runs the call right away in a forked process. '''
+    calls = []
+
+    with patch('boss.core.dispatcher._pid', -1):
+        dispatcher.dispatch('test-fork', calls.append, 'now')
+
+    assert calls == ['now']
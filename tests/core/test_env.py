@@ -1,5 +1,7 @@
 ''' Tests for boss.core.env module '''
 
+import os
+
 from boss.core import env
 
 ENV_DEF_SIMPLE = '''
@@ -51,3 +53,17 @@ def test_parse_env_def_with_quoted_values():
 
     assert result['VAR1'] == 'Foo'
     assert result['VAR2'] == 'Bar'
+
+
+def test_override():
+    ''' Test override() sets the env vars and restores them afterwards. '''
+    os.environ['BOSS_TEST_OVERRIDDEN'] = 'before'
+
+    with env.override({'BOSS_TEST_OVERRIDDEN': 'during', 'BOSS_TEST_NEW': 'new'}):
+        assert os.environ['BOSS_TEST_OVERRIDDEN'] == 'during'
+        assert os.environ['BOSS_TEST_NEW'] == 'new'
+
+    assert os.environ['BOSS_TEST_OVERRIDDEN'] == 'before'
+    assert 'BOSS_TEST_NEW' not in os.environ
+
+    del os.environ['BOSS_TEST_OVERRIDDEN']
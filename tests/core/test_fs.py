@@ -1,5 +1,9 @@
 ''' Tests for boss.core.fs module. '''
 
+import os
+import tarfile
+from io import BytesIO
+from tempfile import mkdtemp
 from mock import patch, mock_open
 from boss.core import fs
 
@@ -32,3 +36,44 @@ def test_write():
         fs.write(filename, data)
         mock_file.assert_called_with(filename, 'w')
         m().write.assert_called_with(data)
+
+
+def test_write_archive():
+    ''' Test fs.write_archive() writes a tar zipped stream of the given files. '''
+    source_dir = mkdtemp()
+    fs.write(os.path.join(source_dir, 'a.txt'), 'a')
+    fs.write(os.path.join(source_dir, 'b.txt'), 'b')
+    stream = BytesIO()
+
+    fs.write_archive(stream, source_dir, ['b.txt'])
+
+    stream.seek(0)
+    with tarfile.open(fileobj=stream, mode='r:gz') as tar:
+        assert tar.getnames() == ['build/b.txt']
+
+
+
+def test_write_archive_with_compressor():
+    ''' Test fs.write_archive() pipes the archive through the compressor command. '''
+    source_dir = mkdtemp()
+    fs.write(os.path.join(source_dir, 'a.txt'), 'a')
+    stream = BytesIO()
+
+    fs.write_archive(stream, source_dir, ['a.txt'], compressor='gzip -1')
+
+    stream.seek(0)
+    with tarfile.open(fileobj=stream, mode='r:gz') as tar:
+        assert tar.getnames() == ['build/a.txt']
+
+
+def test_write_archive_without_compression():
+    ''' Test fs.write_archive() writes a plain tar stream if compression is disabled. '''
+    source_dir = mkdtemp()
+    fs.write(os.path.join(source_dir, 'a.txt'), 'a')
+    stream = BytesIO()
+
+    fs.write_archive(stream, source_dir, ['a.txt'], compress=False)
+
+    stream.seek(0)
+    with tarfile.open(fileobj=stream, mode='r:') as tar:
+        assert tar.getnames() == ['build/a.txt']
@@ -0,0 +1,34 @@
+''' Tests for boss.core.http module. '''
+
+from threading import Thread
+
+from mock import patch
+
+from boss.core import http
+
+
+def test_get_session_is_reused():
+    ''' Test get_session() returns the same session within a thread. '''
+    assert http.get_session() is http.get_session()
+
+
+def test_get_session_per_thread():
+    ''' Test get_session() returns a separate session for each thread. '''
+    sessions = []
+    thread = Thread(target=lambda: sessions.append(http.get_session()))
+    thread.start()
+    thread.join()
+
+    assert sessions[0] is not http.get_session()
+
+
+@patch('boss.core.http.get_session')
+def test_post(get_session_m):
+    ''' Test post() sends the request with the default timeout. '''
+    http.post('http://example.com', json={'text': 'Hello'})
+
+    get_session_m.return_value.post.assert_called_once_with(
+        'http://example.com',
+        json={'text': 'Hello'},
+        timeout=http.TIMEOUT
+    )
@@ -0,0 +1,108 @@
+''' Tests for boss.core.inventory module. '''
+
+import pytest
+from mock import patch
+
+from boss.core import inventory
+
+YAML_INVENTORY = '''
+hosts:
+  app2.example.com:
+  app1.example.com:
+    user: deploy
+    port: 2222
+    key_filename: ~/.ssh/app1.pem
+groups:
+  web: [app1.example.com, app2.example.com]
+  workers: [worker1.example.com]
+'''
+
+INI_INVENTORY = '''
+# Production hosts
+[web]
+app1.example.com user=deploy port=2222 key_filename=~/.ssh/app1.pem
+app2.example.com
+
+[workers]
+worker1.example.com
+'''
+
+EXPECTED_HOSTS = {
+    'app1.example.com': {
+        'user': 'deploy',
+        'port': 2222,
+        'key_filename': '~/.ssh/app1.pem'
+    },
+    'app2.example.com': {},
+    'worker1.example.com': {}
+}
+
+EXPECTED_GROUPS = {
+    'web': ['app1.example.com', 'app2.example.com'],
+    'workers': ['worker1.example.com']
+}
+
+
+def test_parse_yaml():
+    ''' Test parse_yaml() parses the hosts with their vars and the groups. '''
+    result = inventory.parse_yaml(YAML_INVENTORY)
+
+    assert result['hosts'] == EXPECTED_HOSTS
+    assert result['groups'] == EXPECTED_GROUPS
+
+
+def test_parse_yaml_with_a_list_of_hosts():
+    ''' Test parse_yaml() parses the hosts listed just by their names. '''
+    result = inventory.parse_yaml('hosts: [app1.example.com, app2.example.com]')
+
+    assert result['hosts'].keys() == ['app1.example.com', 'app2.example.com']
+    assert result['groups'] == {}
+
+
+def test_parse_ini():
+    ''' Test parse_ini() parses the hosts with their vars and the groups. '''
+    result = inventory.parse_ini(INI_INVENTORY)
+
+    assert result['hosts'] == EXPECTED_HOSTS
+    assert result['groups'] == EXPECTED_GROUPS
+
+
+@patch('boss.core.fs.read')
+def test_load_parses_the_inventory_by_its_extension(read_mock):
+    ''' Test load() parses the INI and YAML inventories. '''
+    read_mock.return_value = INI_INVENTORY
+    assert inventory.load('hosts.ini')['groups'] == EXPECTED_GROUPS
+
+    read_mock.return_value = YAML_INVENTORY
+    assert inventory.load('hosts.yml')['groups'] == EXPECTED_GROUPS
+
+
+def test_select():
+    ''' Test select() selects the hosts of a group filtered by the pattern. '''
+    parsed = inventory.parse_ini(INI_INVENTORY)
+
+    assert [x['name'] for x in inventory.select(parsed)] == [
+        'app1.example.com', 'app2.example.com', 'worker1.example.com'
+    ]
+    assert inventory.select(parsed, 'web', 'app1*') == [{
+        'name': 'app1.example.com',
+        'user': 'deploy',
+        'port': 2222,
+        'key_filename': '~/.ssh/app1.pem'
+    }]
+    assert inventory.select(parsed, 'all', 'app2*;worker*') == [
+        {'name': 'app2.example.com'},
+        {'name': 'worker1.example.com'}
+    ]
+
+    with pytest.raises(KeyError):
+        inventory.select(parsed, 'db')
+
+
+def test_get_host_string():
+    ''' Test get_host_string() includes the user and the port if set. '''
+    assert inventory.get_host_string({'name': 'app'}) == 'app'
+    assert inventory.get_host_string({'name': 'app', 'user': 'u'}) == 'u@app'
+    assert inventory.get_host_string(
+        {'name': 'app', 'user': 'u', 'port': 2222}
+    ) == 'u@app:2222'
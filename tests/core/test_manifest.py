@@ -0,0 +1,60 @@
+''' Tests for boss.core.manifest module. '''
+
+import os
+from tempfile import mkdtemp
+
+from boss.core import fs, manifest
+from boss.core.hashing import md5
+
+
+def test_generate():
+    ''' Test manifest.generate() returns hashes of all the files relative to the directory. '''
+    source_dir = mkdtemp()
+    os.mkdir(os.path.join(source_dir, 'js'))
+    fs.write(os.path.join(source_dir, 'index.html'), '<html></html>')
+    fs.write(os.path.join(source_dir, 'js/app.js'), 'alert(1);')
+
+    result = manifest.generate(source_dir)
+
+    assert result == {
+        'index.html': md5('<html></html>'),
+        'js/app.js': md5('alert(1);')
+    }
+
+
+def test_generate_with_symlinks():
+    ''' Test manifest.generate() records symlinks by their target. '''
+    source_dir = mkdtemp()
+    os.mkdir(os.path.join(source_dir, 'assets'))
+    os.symlink('assets', os.path.join(source_dir, 'static'))
+
+    result = manifest.generate(source_dir)
+
+    assert result == {'static': manifest.LINK_PREFIX + md5('assets')}
+
+
+def test_diff():
+    ''' Test manifest.diff() returns the changed and removed files. '''
+    old = {
+        'index.html': 'a',
+        'app.js': 'b',
+        'old.js': 'c'
+    }
+    new = {
+        'index.html': 'a',
+        'app.js': 'changed',
+        'new.js': 'd'
+    }
+
+    (changed, removed) = manifest.diff(old, new)
+
+    assert changed == ['app.js', 'new.js']
+    assert removed == ['old.js']
+
+
+def test_diff_without_old_manifest():
+    ''' Test manifest.diff() treats all the files as changed if there is no old manifest. '''
+    (changed, removed) = manifest.diff(None, {'b': '1', 'a': '2'})
+
+    assert changed == ['a', 'b']
+    assert removed == []
@@ -6,13 +6,15 @@ from os import environ as env
 from boss.core.constants.config import DEFAULT_CONFIG
 from boss.core.constants.notification_types import (
     DEPLOYMENT_STARTED,
-    DEPLOYMENT_FINISHED
+    DEPLOYMENT_FINISHED,
+    RUNNING_SCRIPTS_FINISHED
 )
 from boss.core.notification import (
     get,
     get_color,
     get_message,
     get_ci_prefix,
+    get_notification_params
 )
 
 
@@ -84,6 +86,25 @@ def test_get_message_deployed_with_branch():
     assert result == expected_message
 
 
+def test_get_message_scripts_summary():
+    '''
+    Test get_message() constructs the summary message
+    of the scripts run, with the scripts listed.
+    '''
+    notification = get_notification_params(
+        user='kabir',
+        project_name='project',
+        server_name='server',
+        scripts=['migrate', 'reload'],
+        pre_format=lambda x: '`' + x + '`',
+        create_link=lambda url, title: title
+    )
+    result = get_message(RUNNING_SCRIPTS_FINISHED, **notification)
+    expected_message = 'kabir ran `migrate`, `reload` for project on server server.'
+
+    assert result == expected_message
+
+
 def test_get_color_on_non_ci_env():
     ''' Test get_color() on non-CI environment. '''
 
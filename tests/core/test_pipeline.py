@@ -0,0 +1,62 @@
+''' Tests for boss.core.pipeline module. '''
+
+import os
+import time
+
+from boss.core import pipeline
+
+
+def test_scan(tmpdir):
+    ''' Test scan() gets the stat of each of the files, by their relative paths. '''
+    tmpdir.join('index.html').write('<html></html>')
+    tmpdir.mkdir('js').join('app.js').write('app();')
+
+    result = pipeline.scan(str(tmpdir))
+
+    assert sorted(result.keys()) == ['index.html', 'js/app.js']
+    assert result['js/app.js'][1] == len('app();')
+
+
+def test_scan_since(tmpdir):
+    ''' Test scan() skips the files not modified since the given time. '''
+    old = tmpdir.join('old.js')
+    old.write('old();')
+    os.utime(str(old), (time.time() - 60, time.time() - 60))
+    tmpdir.join('new.js').write('new();')
+
+    result = pipeline.scan(str(tmpdir), time.time() - 30)
+
+    assert result.keys() == ['new.js']
+
+
+def test_get_settled():
+    ''' Test get_settled() picks the files unchanged since the previous scan. '''
+    previous = {'a.js': (1, 10), 'b.js': (1, 10), 'c.js': (1, 10)}
+    current = {'a.js': (1, 10), 'b.js': (2, 20), 'c.js': (1, 10), 'd.js': (2, 5)}
+    uploaded = {'c.js': (1, 10)}
+
+    assert pipeline.get_settled(previous, current, uploaded) == ['a.js']
+
+
+def test_get_settled_with_manifest():
+    ''' Test get_settled() picks only the files listed by the build. '''
+    scan = {'a.js': (1, 10), 'b.js': (1, 10)}
+
+    assert pipeline.get_settled(scan, scan, {}, ['b.js', 'missing.js']) == ['b.js']
+
+
+def test_read_manifest(tmpdir):
+    ''' Test read_manifest() reads the files listed, skipping blank lines. '''
+    path = tmpdir.join('manifest.txt')
+    path.write('index.html\n\njs/app.js\n')
+
+    assert pipeline.read_manifest(str(path)) == ['index.html', 'js/app.js']
+    assert pipeline.read_manifest(str(tmpdir.join('missing.txt'))) == []
+
+
+def test_get_remaining():
+    ''' Test get_remaining() gets the files changed or removed since uploaded. '''
+    final = {'a.js': (1, 10), 'b.js': (2, 20), 'd.js': (2, 5)}
+    uploaded = {'a.js': (1, 10), 'b.js': (1, 10), 'c.js': (1, 10)}
+
+    assert pipeline.get_remaining(final, uploaded) == (['b.js', 'd.js'], ['c.js'])
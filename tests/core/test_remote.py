@@ -3,10 +3,22 @@ Tests for the boss.core.remote module.
 '''
 
 import pytest
+from subprocess import Popen, PIPE, STDOUT
 from mock import Mock
 from boss.core import remote
 
 
+@pytest.fixture()
+def session():
+    ''' A shell session backed by a local shell instead of a remote one. '''
+    process = Popen(['/bin/bash', '-s'], stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+
+    yield {'stdin': process.stdin, 'stdout': process.stdout}
+
+    process.stdin.close()
+    process.wait()
+
+
 @pytest.fixture()
 def callback():
     ''' Callback to be used for sftp get() and put(). '''
@@ -76,3 +88,103 @@ def test_run_with_environment(client):
         timeout=None,
         environment={'NODE_ENV': 'production'}
     )
+
+
+def test_stream(client):
+    ''' Test stream() writes the data to the standard input of the command. '''
+    (stdin, stdout, stderr) = (Mock(), Mock(), Mock())
+    stdout.channel.recv_exit_status.return_value = 0
+    stderr.read.return_value = ''
+    client.exec_command.return_value = (stdin, stdout, stderr)
+
+    result = remote.stream(client, 'tar xzf -', lambda f: f.write('data'))
+
+    client.exec_command.assert_called_with(
+        'tar xzf -',
+        bufsize=None,
+        timeout=None,
+        environment=None
+    )
+    stdin.write.assert_called_with('data')
+    stdin.channel.shutdown_write.assert_called_once()
+    assert result == (0, '')
+
+
+def test_open_shell():
+    ''' Test open_shell() starts a shell on a new channel. '''
+    client = Mock()
+    channel = client.get_transport.return_value.open_session.return_value
+
+    session = remote.open_shell(client)
+
+    channel.set_combine_stderr.assert_called_with(True)
+    channel.exec_command.assert_called_with(remote.SHELL_COMMAND)
+    assert session['channel'] == channel
+
+
+def test_execute(session):
+    ''' Test execute() runs the command and returns its status and output. '''
+    lines = []
+
+    assert remote.execute(session, 'echo foo; echo bar', lines.append) == (
+        0, 'foo\nbar\n'
+    )
+    assert remote.execute(session, 'printf baz', lines.append) == (0, 'baz')
+    assert remote.execute(session, 'echo error >&2', lines.append) == (
+        0, 'error\n'
+    )
+    assert lines == ['foo\n', 'bar\n', 'baz\n', 'error\n']
+
+
+def test_execute_isolates_commands(session):
+    '''
+    Test execute() runs each command in a subshell, so that it could neither
+    change the state of the session nor read the commands following it.
+    '''
+    first = remote.execute(session, 'cd / && export BOSS_SHELL_TEST=1 && exit 0')
+    second = remote.execute(session, 'cat')
+    (_, pwd) = remote.execute(session, 'pwd')
+    (_, cwd) = remote.execute(session, 'echo $BOSS_SHELL_TEST && pwd')
+
+    assert first == (0, '')
+    assert second == (0, '')
+    assert cwd == '\n' + pwd
+
+
+def test_execute_after_failure(session):
+    ''' Test execute() returns the status of a failed command. '''
+    assert remote.execute(session, 'echo a; exit 3') == (3, 'a\n')
+
+    # The session could still be used for the next commands.
+    assert remote.execute(session, 'echo c') == (0, 'c\n')
+
+
+def test_execute_all(session):
+    ''' Test execute_all() pipelines the commands and returns their results. '''
+    lines = []
+
+    results = remote.execute_all(session, ['echo a', 'printf b', 'echo c'], lines.append)
+
+    assert results == [(0, 'a\n'), (0, 'b'), (0, 'c\n')]
+    assert lines == ['a\n', 'b\n', 'c\n']
+
+
+def test_execute_all_stops_at_failure(session):
+    ''' Test execute_all() skips the commands following a failed one. '''
+    results = remote.execute_all(session, ['echo a', 'exit 2', 'touch /tmp/x; echo c'])
+
+    assert results == [(0, 'a\n'), (2, '')]
+
+    # The next batch isn't affected by the failure of the previous one.
+    assert remote.execute_all(session, ['echo d', 'echo e']) == [
+        (0, 'd\n'), (0, 'e\n')
+    ]
+
+
+def test_execute_when_session_closed():
+    ''' Test execute() raises an error if the session has been closed. '''
+    session = {'stdin': Mock(), 'stdout': Mock()}
+    session['stdout'].readline.return_value = ''
+
+    with pytest.raises(RuntimeError):
+        remote.execute(session, 'echo a')
@@ -0,0 +1,113 @@
+''' Tests for boss.core.scheduler module. '''
+
+import time
+import pytest
+from threading import Event
+
+from boss.core import scheduler
+
+
+def test_run_in_order_of_requirements():
+    ''' Test run() runs each phase only after the phases it requires. '''
+    calls = []
+    phases = [
+        scheduler.phase('build', lambda _: calls.append('build') or 'dist'),
+        scheduler.phase(
+            'package',
+            lambda x: calls.append('package') or x['build'] + '.tar.gz',
+            ['build']
+        ),
+        scheduler.phase('release', lambda _: calls.append('release'), ['package'])
+    ]
+    results = {}
+
+    timings = scheduler.run(phases, results)
+
+    assert calls == ['build', 'package', 'release']
+    assert results['package'] == 'dist.tar.gz'
+    assert sorted(timings.keys()) == ['build', 'package', 'release']
+
+
+def test_run_independent_phases_concurrently():
+    ''' Test run() runs the phases that don't depend on each other concurrently. '''
+    started = Event()
+
+    def build(_):
+        # Would time out if the other phase isn't run at the same time.
+        assert started.wait(5)
+
+    phases = [
+        scheduler.phase('build', build),
+        scheduler.phase('prepare', lambda _: started.set()),
+        scheduler.phase('release', lambda _: None, ['build', 'prepare'])
+    ]
+
+    scheduler.run(phases)
+
+
+def test_run_stops_on_failure():
+    ''' Test run() doesn't start any more phases after a phase fails. '''
+    calls = []
+
+    def build(_):
+        raise SystemExit('Build failed')
+
+    phases = [
+        scheduler.phase('build', build),
+        scheduler.phase('prepare', lambda _: calls.append('prepare')),
+        scheduler.phase('release', lambda _: calls.append('release'), ['build'])
+    ]
+
+    with pytest.raises(SystemExit, match='Build failed'):
+        scheduler.run(phases)
+
+    assert 'release' not in calls
+
+
+def test_run_with_unknown_requirement():
+    ''' Test run() raises an error if a phase requires an unknown phase. '''
+    phases = [scheduler.phase('release', lambda _: None, ['build'])]
+
+    with pytest.raises(ValueError, match='requires unknown phase'):
+        scheduler.run(phases)
+
+
+def test_get_critical_path():
+    ''' Test get_critical_path() follows the required phases that ended last. '''
+    phases = [
+        scheduler.phase('build', None),
+        scheduler.phase('package', None, ['build']),
+        scheduler.phase('prepare', None),
+        scheduler.phase('release', None, ['package', 'prepare'])
+    ]
+    timings = {
+        'build': (0, 10),
+        'package': (10, 12),
+        'prepare': (0, 3),
+        'release': (12, 20)
+    }
+
+    assert scheduler.get_critical_path(phases, timings) == [
+        'build', 'package', 'release'
+    ]
+    assert scheduler.format_timings(phases, timings) == (
+        'Critical path: build (10.0s) -> package (2.0s) -> release (8.0s)'
+        ' | Total: 20.0s'
+    )
+
+
+def test_get_critical_path_with_the_other_branch():
+    ''' Test get_critical_path() when the preparation outlasts the build. '''
+    phases = [
+        scheduler.phase('build', None),
+        scheduler.phase('prepare', None),
+        scheduler.phase('release', None, ['build', 'prepare'])
+    ]
+    now = time.time()
+    timings = {
+        'build': (now, now + 2),
+        'prepare': (now, now + 5),
+        'release': (now + 5, now + 6)
+    }
+
+    assert scheduler.get_critical_path(phases, timings) == ['prepare', 'release']
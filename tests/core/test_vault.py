@@ -1,7 +1,9 @@
 ''' Unit tests for boss.core.vault. '''
 
 import os
+import time
 import pytest
+from threading import Condition
 from mock import Mock, patch
 from requests.exceptions import ConnectionError
 from hvac.exceptions import Forbidden, VaultError
@@ -10,6 +12,12 @@ from boss.core import vault
 from boss.core.util.types import is_dict
 
 
+@pytest.fixture(autouse=True)
+def clients():
+    ''' Clear the vault clients connected by the previous tests. '''
+    vault._clients.clear()
+
+
 @patch('boss.core.vault.connect')
 def test_read_secrets(connect_m):
     '''
@@ -187,3 +195,192 @@ def test_read_secrets_shows_vault_vault_error(connect_m):
     error_message = 'Vault Error: Boom!'
     with pytest.raises(SystemExit, match=error_message):
         vault.read_secrets('test/vault/path')
+
+
+@patch('boss.core.vault.connect')
+def test_read_cached_secrets(connect_m, tmpdir):
+    '''
+    Test read_cached_secrets() reads the secrets from vault only once,
+    and from the cache after that, until they expire.
+    '''
+    os.environ['VAULT_ADDR'] = 'https://test.vaultserver'
+    os.environ['VAULT_TOKEN'] = 'token'
+    client = Mock()
+    connect_m.return_value = client
+    client.read.return_value = {'data': {'FOO': 'foo'}, 'lease_duration': 0}
+
+    with patch('boss.core.vault.BOSS_VAULT_CACHE_PATH', str(tmpdir)):
+        result1 = vault.read_cached_secrets('test/vault/path', 60)
+        result2 = vault.read_cached_secrets('test/vault/path', 60)
+
+        with patch('time.time', return_value=time.time() + 61):
+            result3 = vault.read_cached_secrets('test/vault/path', 60)
+
+    assert result1 == ({'FOO': 'foo'}, False)
+    assert result2 == ({'FOO': 'foo'}, True)
+    assert result3 == ({'FOO': 'foo'}, False)
+    assert client.read.call_count == 2
+
+
+@patch('boss.core.vault.connect')
+def test_read_cached_secrets_honors_lease_duration(connect_m, tmpdir):
+    ''' Test the secrets are cached only for their lease duration, if shorter. '''
+    os.environ['VAULT_ADDR'] = 'https://test.vaultserver'
+    os.environ['VAULT_TOKEN'] = 'token'
+    client = Mock()
+    connect_m.return_value = client
+    client.read.return_value = {'data': {'FOO': 'foo'}, 'lease_duration': 10}
+
+    with patch('boss.core.vault.BOSS_VAULT_CACHE_PATH', str(tmpdir)):
+        vault.read_cached_secrets('test/vault/path', 60)
+
+        with patch('time.time', return_value=time.time() + 11):
+            (_, is_cached) = vault.read_cached_secrets('test/vault/path', 60)
+
+    assert not is_cached
+    assert client.read.call_count == 2
+
+
+@patch('boss.core.vault.connect')
+def test_read_cached_secrets_with_refresh(connect_m, tmpdir):
+    ''' Test read_cached_secrets() with refresh=True bypasses the cache. '''
+    os.environ['VAULT_ADDR'] = 'https://test.vaultserver'
+    os.environ['VAULT_TOKEN'] = 'token'
+    client = Mock()
+    connect_m.return_value = client
+    client.read.return_value = {'data': {'FOO': 'foo'}}
+
+    with patch('boss.core.vault.BOSS_VAULT_CACHE_PATH', str(tmpdir)):
+        vault.read_cached_secrets('test/vault/path', 60)
+        (_, is_cached) = vault.read_cached_secrets(
+            'test/vault/path', 60, refresh=True
+        )
+
+    assert not is_cached
+    assert client.read.call_count == 2
+
+
+@patch('boss.core.vault.connect')
+def test_cached_secrets_are_encrypted(connect_m, tmpdir):
+    '''
+    Test the cached secrets are encrypted, readable only by the user,
+    and can't be read with a different vault token.
+    '''
+    os.environ['VAULT_ADDR'] = 'https://test.vaultserver'
+    os.environ['VAULT_TOKEN'] = 'token'
+    client = Mock()
+    connect_m.return_value = client
+    client.read.return_value = {'data': {'FOO': 'top-secret'}}
+
+    with patch('boss.core.vault.BOSS_VAULT_CACHE_PATH', str(tmpdir)):
+        vault.read_cached_secrets('test/vault/path', 60)
+        os.environ['VAULT_TOKEN'] = 'another-token'
+        (_, is_cached) = vault.read_cached_secrets('test/vault/path', 60)
+
+    (entry,) = tmpdir.listdir()
+
+    assert not is_cached
+    assert 'top-secret' not in entry.read('rb')
+    assert oct(entry.stat().mode & 0o777) == oct(0o600)
+
+
+@patch('boss.core.vault.Client')
+def test_connect_reuses_the_client(client_m):
+    ''' Test connect() returns the same client for the same address and token. '''
+    os.environ['VAULT_ADDR'] = 'vault_addr'
+    os.environ['VAULT_TOKEN'] = 'vault_token'
+
+    assert vault.connect() is vault.connect()
+    client_m.assert_called_once_with(url='vault_addr', token='vault_token')
+
+
+@patch('boss.core.vault.connect')
+def test_env_inject_secrets_from_multiple_paths(connect_m, capsys):
+    '''
+    Test env_inject_secrets() reads all of the paths concurrently,
+    with the secrets of the later paths taking precedence.
+    '''
+    barrier = Barrier(3)
+    secrets = {
+        'app/db': {'TEST_DB_HOST': 'db', 'TEST_SHARED': 'db'},
+        'app/queue': {'TEST_QUEUE_HOST': 'queue', 'TEST_SHARED': 'queue'},
+        'app/keys': {'TEST_API_KEY': 'key'}
+    }
+
+    def read(path):
+        # Each of the reads waits until all of them have started.
+        barrier.wait()
+
+        return {'data': secrets[path]}
+
+    connect_m.return_value.read.side_effect = read
+
+    vault.env_inject_secrets(['app/db', 'app/queue', 'app/keys'])
+
+    out, _ = capsys.readouterr()
+
+    assert 'Using secrets from vault (app/db, app/queue, app/keys) in' in out
+    assert os.environ['TEST_DB_HOST'] == 'db'
+    assert os.environ['TEST_QUEUE_HOST'] == 'queue'
+    assert os.environ['TEST_API_KEY'] == 'key'
+    assert os.environ['TEST_SHARED'] == 'queue'
+
+    for key in ['TEST_DB_HOST', 'TEST_QUEUE_HOST', 'TEST_API_KEY', 'TEST_SHARED']:
+        os.environ[key] = ''
+
+
+@patch('boss.core.vault.connect')
+def test_env_inject_secrets_from_multiple_paths_with_error(connect_m):
+    ''' Test env_inject_secrets() halts if reading any of the paths fails. '''
+    os.environ['VAULT_ADDR'] = 'https://test.vaultserver'
+
+    def read(path):
+        if path == 'app/queue':
+            raise Forbidden('Boom!')
+
+        return {'data': {'TEST_DB_HOST': 'db'}}
+
+    connect_m.return_value.read.side_effect = read
+
+    error_message = 'Permission denied. .*`app/queue`'
+    with pytest.raises(SystemExit, match=error_message):
+        vault.env_inject_secrets(['app/db', 'app/queue'], silent=True)
+
+
+class Barrier(object):
+    ''' A barrier for the tests, as python 2 has none of its own. '''
+
+    def __init__(self, parties, timeout=5):
+        self.parties = parties
+        self.timeout = timeout
+        self.count = 0
+        self.condition = Condition()
+
+    def wait(self):
+        ''' Wait until all of the parties are waiting, or fail on timeout. '''
+        deadline = time.time() + self.timeout
+
+        with self.condition:
+            self.count += 1
+            self.condition.notify_all()
+
+            while self.count < self.parties:
+                if time.time() > deadline:
+                    raise RuntimeError('The reads were not concurrent')
+
+                self.condition.wait(deadline - time.time())
+
+
+@patch('boss.core.vault.connect')
+def test_env_inject_secrets_with_keys(connect_m):
+    ''' Test env_inject_secrets() injects only the given keys. '''
+    connect_m.return_value.read.return_value = {
+        'data': {'TEST_KEYS_FOO': 'foo', 'TEST_KEYS_BAR': 'bar'}
+    }
+
+    vault.env_inject_secrets('path', silent=True, keys=set(['TEST_KEYS_FOO']))
+
+    assert os.environ['TEST_KEYS_FOO'] == 'foo'
+    assert 'TEST_KEYS_BAR' not in os.environ
+
+    os.environ['TEST_KEYS_FOO'] = ''
@@ -1,6 +1,11 @@
 ''' Tests for boss.core.util.object module. '''
 
-from boss.core.util.object import merge
+import pickle
+from copy import copy, deepcopy
+
+import pytest
+
+from boss.core.util.object import merge, freeze, FrozenDict, FrozenList, LazyDict
 
 
 def test_merge_v0():
@@ -70,3 +75,161 @@ def test_merge_v1():
     merged = merge(dict1, dict2)
 
     assert merged == expectedmerge
+
+
+def test_merge_does_not_mutate_the_source_dicts():
+    ''' Test merge() leaves both of the source dicts unchanged. '''
+    dict1 = {'key1': 'value1', 'key2': {'key3': 'value3'}}
+    dict2 = {'key2': {'key3': 'valueB'}}
+
+    merged = merge(dict1, dict2)
+    merged['key1'] = 'valueA'
+
+    assert dict1 == {'key1': 'value1', 'key2': {'key3': 'value3'}}
+    assert dict2 == {'key2': {'key3': 'valueB'}}
+    assert merged['key2'] == {'key3': 'valueB'}
+
+
+def test_merge_shares_unchanged_subtrees():
+    ''' Test merge() shares the subtrees that aren't changed by the merge. '''
+    dict1 = {'key1': {'key3': 'value3'}, 'key2': ['value4']}
+    dict2 = {'keyA': {'keyB': 'valueB'}}
+
+    merged = merge(dict1, dict2)
+
+    assert merged['key1'] is dict1['key1']
+    assert merged['key2'] is dict1['key2']
+    assert merged['keyA'] is not dict2['keyA']
+
+
+def test_merge_with_frozen_dicts():
+    ''' Test merge() returns a mutable dict even if the sources are frozen. '''
+    dict1 = freeze({'key1': {'key2': 'value2'}})
+    dict2 = freeze({'key1': {'key3': 'value3'}})
+
+    merged = merge(dict1, dict2)
+    merged['key4'] = 'value4'
+
+    assert merged == {
+        'key1': {'key2': 'value2', 'key3': 'value3'},
+        'key4': 'value4'
+    }
+
+
+def test_freeze():
+    ''' Test freeze() freezes the dicts and lists recursively. '''
+    frozen = freeze({
+        'key1': 'value1',
+        'key2': {'key3': ['value3', {'key4': 'value4'}]}
+    })
+
+    assert frozen == {
+        'key1': 'value1',
+        'key2': {'key3': ['value3', {'key4': 'value4'}]}
+    }
+    assert isinstance(frozen, FrozenDict)
+    assert isinstance(frozen['key2'], FrozenDict)
+    assert isinstance(frozen['key2']['key3'], FrozenList)
+    assert isinstance(frozen['key2']['key3'][1], FrozenDict)
+
+
+def test_freeze_keeps_shared_subtrees_shared():
+    ''' Test freeze() freezes a subtree shared by multiple parents only once. '''
+    shared = {'key1': 'value1'}
+    frozen = freeze({'key2': shared, 'key3': {'key4': shared}})
+
+    assert frozen['key2'] is frozen['key3']['key4']
+    assert freeze(frozen) is frozen
+
+
+def test_frozen_dict_is_read_only():
+    ''' Test mutating a FrozenDict raises an error. '''
+    frozen = freeze({'key1': 'value1'})
+    mutations = [
+        lambda: frozen.__setitem__('key1', 'valueA'),
+        lambda: frozen.__delitem__('key1'),
+        lambda: frozen.update({'key1': 'valueA'}),
+        lambda: frozen.setdefault('key2', 'value2'),
+        lambda: frozen.pop('key1'),
+        lambda: frozen.popitem(),
+        lambda: frozen.clear()
+    ]
+
+    for mutate in mutations:
+        with pytest.raises(TypeError):
+            mutate()
+
+    assert frozen == {'key1': 'value1'}
+
+
+def test_frozen_list_is_read_only():
+    ''' Test mutating a FrozenList raises an error. '''
+    frozen = freeze(['value1', 'value2'])
+    mutations = [
+        lambda: frozen.__setitem__(0, 'valueA'),
+        lambda: frozen.__delitem__(0),
+        lambda: frozen.append('value3'),
+        lambda: frozen.extend(['value3']),
+        lambda: frozen.insert(0, 'value3'),
+        lambda: frozen.remove('value1'),
+        lambda: frozen.pop(),
+        lambda: frozen.sort(),
+        lambda: frozen.reverse()
+    ]
+
+    for mutate in mutations:
+        with pytest.raises(TypeError):
+            mutate()
+
+    assert frozen == ['value1', 'value2']
+
+
+def test_frozen_objects_are_not_copied():
+    ''' Test copying frozen objects returns the same objects. '''
+    frozen = freeze({'key1': ['value1']})
+
+    assert copy(frozen) is frozen
+    assert deepcopy(frozen) is frozen
+    assert deepcopy(frozen['key1']) is frozen['key1']
+
+
+def test_frozen_objects_could_be_pickled():
+    ''' Test frozen objects survive a round trip through pickle. '''
+    frozen = freeze({'key1': ['value1', {'key2': 'value2'}]})
+    result = pickle.loads(pickle.dumps(frozen, pickle.HIGHEST_PROTOCOL))
+
+    assert result == frozen
+    assert isinstance(result, FrozenDict)
+    assert isinstance(result['key1'], FrozenList)
+
+
+def test_lazy_dict_resolves_the_values_on_first_access():
+    ''' Test LazyDict resolves each of the values once, when it's accessed. '''
+    resolved = []
+
+    def resolve(value):
+        resolved.append(value)
+        return value * 2
+
+    lazy = LazyDict({'key1': 1, 'key2': 2}, resolve)
+
+    assert sorted(lazy.keys()) == ['key1', 'key2']
+    assert 'key1' in lazy
+    assert resolved == []
+
+    assert lazy['key1'] == 2
+    assert lazy['key1'] == 2
+    assert resolved == [1]
+    assert lazy == {'key1': 2, 'key2': 4}
+
+    with pytest.raises(KeyError):
+        lazy['key3']
+
+
+def test_lazy_dict_is_not_copied_or_frozen_again():
+    ''' Test LazyDict is shared instead of copied or frozen. '''
+    lazy = LazyDict({'key1': 1}, str)
+
+    assert deepcopy(lazy) is lazy
+    assert freeze({'key2': lazy})['key2'] is lazy
+    assert pickle.loads(pickle.dumps(lazy))['key1'] == '1'
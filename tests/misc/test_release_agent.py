@@ -0,0 +1,132 @@
+''' Tests for the release agent (misc/release_agent.py). '''
+
+import os
+import sys
+import json
+from pipes import quote
+from tempfile import mkdtemp
+from subprocess import Popen, PIPE
+
+from boss.core import fs
+from boss.api.deployment import agent
+
+
+def setup_deploy_dir(builds):
+    ''' Setup a deployment directory with the given builds. '''
+    deploy_dir = mkdtemp()
+    os.mkdir(os.path.join(deploy_dir, 'builds'))
+
+    for build in builds:
+        os.mkdir(os.path.join(deploy_dir, 'builds', 'build-' + build['id']))
+
+    fs.write(os.path.join(deploy_dir, 'builds.json'), json.dumps({
+        'current': builds[0]['id'] if builds else None,
+        'builds': builds
+    }))
+
+    return deploy_dir
+
+
+def run_agent(cmd):
+    ''' Run the agent command in a shell and return its status and output. '''
+    process = Popen(['/bin/bash', '-c', cmd], stdout=PIPE)
+    (out, _) = process.communicate()
+
+    return (process.returncode, out)
+
+
+def get_activate_payload(deploy_dir, build_id, keep_builds=2):
+    ''' Get the payload to activate the build. '''
+    return {
+        'owner': None,
+        'release_path': deploy_dir + '/builds/build-' + build_id,
+        'release_dir': deploy_dir + '/builds',
+        'current_path': deploy_dir + '/current',
+        'builds_file': deploy_dir + '/builds.json',
+        'keep_builds': keep_builds,
+        'build': {'id': build_id, 'path': deploy_dir + '/builds/build-' + build_id}
+    }
+
+
+def test_activate():
+    ''' Test the agent activates the release, records the history and prunes. '''
+    deploy_dir = setup_deploy_dir([{'id': '2'}, {'id': '1'}])
+    os.mkdir(deploy_dir + '/builds/build-3')
+    payload = get_activate_payload(deploy_dir, '3')
+
+    (status, out) = run_agent('{} {} activate {}'.format(
+        sys.executable, agent.AGENT_SCRIPT, quote(json.dumps(payload))
+    ))
+    result = agent.parse_result(out)
+    history = json.loads(fs.read(deploy_dir + '/builds.json'))
+
+    assert status == 0
+    assert result['current'] == '3'
+    assert result['pruned'] == ['build-1']
+    assert os.readlink(deploy_dir + '/current') == deploy_dir + '/builds/build-3'
+    assert history['current'] == '3'
+    assert [x['id'] for x in history['builds']] == ['3', '2']
+    assert sorted(os.listdir(deploy_dir + '/builds')) == ['build-2', 'build-3']
+
+
+def test_activate_prunes_files_and_links():
+    ''' Test the agent deletes the stray files and symlinks with the old builds. '''
+    deploy_dir = setup_deploy_dir([{'id': '2'}, {'id': '1'}])
+    fs.write(deploy_dir + '/builds/build-0.tar.gz', 'data')
+    os.symlink(deploy_dir + '/builds/build-2', deploy_dir + '/builds/latest')
+    payload = get_activate_payload(deploy_dir, '2')
+
+    (status, out) = run_agent('{} {} activate {}'.format(
+        sys.executable, agent.AGENT_SCRIPT, quote(json.dumps(payload))
+    ))
+    result = agent.parse_result(out)
+
+    assert status == 0
+    assert result['pruned'] == ['build-0.tar.gz', 'build-1', 'latest']
+    assert result['warnings'] == []
+    assert os.listdir(deploy_dir + '/builds') == ['build-2']
+
+
+def test_activate_prunes_staged_builds():
+    ''' Test the agent deletes the builds left staged in the pipeline mode. '''
+    deploy_dir = setup_deploy_dir([{'id': '1'}])
+    staging_dir = deploy_dir + '/.boss/pipeline'
+    os.makedirs(staging_dir + '/build-0')
+    payload = dict(get_activate_payload(deploy_dir, '1'), staging_dir=staging_dir)
+
+    (status, out) = run_agent('{} {} activate {}'.format(
+        sys.executable, agent.AGENT_SCRIPT, quote(json.dumps(payload))
+    ))
+    result = agent.parse_result(out)
+
+    assert status == 0
+    assert result['unstaged'] == ['build-0']
+    assert os.listdir(staging_dir) == []
+
+
+def test_activate_failure():
+    ''' Test the agent returns the error as JSON if it fails. '''
+    deploy_dir = mkdtemp()
+    payload = get_activate_payload(deploy_dir, '1')
+
+    (status, out) = run_agent('{} {} activate {}'.format(
+        sys.executable, agent.AGENT_SCRIPT, quote(json.dumps(payload))
+    ))
+
+    assert status == 1
+    assert 'error' in agent.parse_result(out)
+
+
+def test_agent_command_when_agent_missing():
+    ''' Test the agent command exits with a specific code if the agent is missing. '''
+    cmd = agent.AGENT_CMD.format(
+        agent=os.path.join(mkdtemp(), 'release-agent.py'),
+        command='activate',
+        payload='{}',
+        agent_missing=agent.AGENT_MISSING,
+        python_missing=agent.PYTHON_MISSING
+    )
+
+    (status, _) = run_agent(cmd)
+
+    assert status == agent.AGENT_MISSING
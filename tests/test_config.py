@@ -2,19 +2,41 @@
 
 import os
 from mock import patch
+from pytest import yield_fixture
+from boss.core import fs
 from boss.core.util.string import strip_ansi
 from boss.core.constants.config import DEFAULT_CONFIG
+from boss.core.util.object import FrozenDict
 from boss.config import (
+    get,
     load,
+    prepare,
+    inject_secrets,
+    get_stage_config,
+    parse_yaml,
     parse_config,
     merge_config,
+    merge_stage_config,
     is_vault_enabled,
     resolve_dotenv_file,
     use_vault_if_enabled,
-    get_deployment_preset
+    get_deployment_preset,
+    get_hosts,
+    get_stage_hosts
 )
 
 
+@yield_fixture(autouse=True)
+def config_cache(tmpdir):
+    ''' Use a temporary directory for the config cache. '''
+    cache_dir = str(tmpdir.join('config'))
+
+    with patch('boss.config.BOSS_CONFIG_CACHE_PATH', cache_dir), \
+            patch('boss.config._pending_load', None), \
+            patch('boss.config._pending_secrets', None):
+        yield cache_dir
+
+
 SAMPLE_BOSS_YAML = '''
 project_name: test-project
 user: test-user
@@ -177,6 +199,114 @@ def test_load(read_mock):
     assert boss_config['port'] == 22
 
 
+@patch('boss.core.fs.read')
+def test_load_returns_a_frozen_snapshot(read_mock):
+    ''' Test the loaded config is frozen and shared instead of copied. '''
+    read_mock.return_value = SAMPLE_BOSS_YAML + '''
+stages:
+    dev:
+        host: dev.example.com
+'''
+    boss_config = load('test.yml')
+
+    assert isinstance(boss_config, FrozenDict)
+    assert get() is boss_config
+    assert get_stage_config('dev') is boss_config['stages']['dev']
+    assert get_stage_config('dev')['deployment'] is boss_config['deployment']
+    assert DEFAULT_CONFIG['user'] == 'app'
+
+
+@patch('boss.config.merge_stage_config', wraps=merge_stage_config)
+def test_parse_config_merges_the_stage_configs_lazily(merge_mock):
+    ''' Test the stage configs are merged only when they're used. '''
+    stages = ''.join(
+        '  stage{}:\n    host: stage{}.example.com\n'.format(x, x) for x in range(100)
+    )
+    result = parse_config('port: 2222\nstages:\n' + stages)
+
+    assert len(result['stages']) == 100
+    assert merge_mock.call_count == 0
+
+    assert result['stages']['stage7']['port'] == 2222
+    assert result['stages']['stage7']['host'] == 'stage7.example.com'
+    assert result['stages']['stage7'] is result['stages']['stage7']
+    assert merge_mock.call_count == 1
+
+
+@patch('boss.config.parse_yaml', wraps=parse_yaml)
+@patch('boss.core.fs.read')
+def test_load_uses_the_parsed_config_from_the_cache(read_mock, parse_mock):
+    ''' Test load() doesn't parse the config again if it's been parsed. '''
+    read_mock.return_value = SAMPLE_BOSS_YAML
+
+    first = load('test.yml')
+    assert parse_mock.call_count == 1
+
+    second = load('test.yml')
+    assert parse_mock.call_count == 1
+    assert second == first
+    assert isinstance(second, FrozenDict)
+
+
+@patch('boss.config.parse_yaml', wraps=parse_yaml)
+@patch('boss.core.fs.read')
+def test_load_expands_the_env_vars_of_the_cached_config(read_mock, parse_mock):
+    ''' Test the env vars are expanded each time the cached config is loaded. '''
+    read_mock.return_value = 'user: ${BOSS_TEST_USER}'
+
+    os.environ['BOSS_TEST_USER'] = 'user1'
+    assert load('test.yml')['user'] == 'user1'
+
+    os.environ['BOSS_TEST_USER'] = 'user2'
+    assert load('test.yml')['user'] == 'user2'
+    assert parse_mock.call_count == 1
+
+    del os.environ['BOSS_TEST_USER']
+
+
+@patch('boss.core.fs.read')
+def test_load_does_not_cache_the_env_vars(read_mock, config_cache):
+    ''' Test the values of the env vars aren't written to the config cache. '''
+    read_mock.return_value = 'user: ${BOSS_TEST_USER}'
+    os.environ['BOSS_TEST_USER'] = 'SuperSecretToken123'
+
+    assert load('test.yml')['user'] == 'SuperSecretToken123'
+
+    [entry] = os.listdir(config_cache)
+    path = os.path.join(config_cache, entry)
+
+    assert 'SuperSecretToken123' not in fs.read(path)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    del os.environ['BOSS_TEST_USER']
+
+
+@patch('boss.core.fs.read')
+def test_load_resolves_the_expanded_env_vars_as_yaml(read_mock):
+    '''
+    Test the plain values using env vars are resolved as yaml scalars once
+    expanded, as if the env vars were expanded before parsing the yaml.
+    '''
+    read_mock.return_value = '''
+    port: ${BOSS_TEST_PORT}
+    project_name: "${BOSS_TEST_PORT}"
+    user: ${BOSS_TEST_UNSET}
+    repository_url: git@${BOSS_TEST_HOST}:app.git # The repository
+    '''
+    os.environ['BOSS_TEST_PORT'] = '2222'
+    os.environ['BOSS_TEST_HOST'] = 'example.com'
+
+    config = load('test.yml')
+
+    assert config['port'] == 2222
+    assert config['project_name'] == '2222'
+    assert config['user'] == '${BOSS_TEST_UNSET}'
+    assert config['repository_url'] == 'git@example.com:app.git'
+
+    del os.environ['BOSS_TEST_PORT']
+    del os.environ['BOSS_TEST_HOST']
+
+
 @patch('boss.core.fs.read')
 def test_load_with_env_vars(read_mock):
     '''
@@ -217,7 +347,7 @@ def test_load_with_env_vars(read_mock):
 def test_load_with_env_vars_from_vault(read_secrets_mock, read_mock):
     '''
     Test load() function loads yaml file with
-    env vars interpolation from vault.
+    env vars interpolation from vault, once the secrets are injected.
     '''
     read_mock.return_value = '''
     user: ${TEST_USER}
@@ -250,7 +380,9 @@ def test_load_with_env_vars_from_vault(read_secrets_mock, read_mock):
     }
 
     config_filename = 'test.yml'
-    boss_config = load(config_filename)
+    load(config_filename)
+    inject_secrets()
+    boss_config = get()
 
     read_mock.assert_called_with(config_filename)
     read_secrets_mock.assert_called_with(DEFAULT_CONFIG['vault']['path'])
@@ -391,6 +523,90 @@ def test_use_vault_if_enabled(read_secrets_mock):
     os.environ['TEST_PROJECT'] = ''
 
 
+@patch('boss.core.vault.env_inject_secrets')
+def test_use_vault_if_enabled_with_cache(env_inject_secrets_mock):
+    ''' Test use_vault_if_enabled() caches the secrets if the cache is enabled. '''
+    config_str = '''
+    vault:
+        enabled: true
+        path: root/path
+        cache: true
+        cache_ttl: 600
+    '''
+
+    use_vault_if_enabled(config_str)
+
+    env_inject_secrets_mock.assert_called_with(
+        'root/path',
+        silent=False,
+        cache_ttl=600,
+        keys=None
+    )
+
+
+@patch('boss.core.vault.env_inject_secrets')
+def test_use_vault_if_enabled_with_multiple_paths(env_inject_secrets_mock):
+    ''' Test use_vault_if_enabled() reads the secrets from the list of paths. '''
+    config_str = '''
+    vault:
+        enabled: true
+        path: [app/db, app/queue]
+    '''
+
+    use_vault_if_enabled(config_str)
+
+    env_inject_secrets_mock.assert_called_with(
+        ['app/db', 'app/queue'],
+        silent=False,
+        cache_ttl=None,
+        keys=None
+    )
+
+
+@patch('boss.core.vault.env_inject_secrets')
+def test_use_vault_if_enabled_with_referenced_only(env_inject_secrets_mock):
+    ''' Test use_vault_if_enabled() injects only the secrets referenced. '''
+    config_str = '''
+    user: ${BOSS_TEST_DEPLOY_USER}
+    vault:
+        enabled: true
+        path: root/path
+        referenced_only: true
+    scripts:
+        migrate: DB_PASSWORD=$BOSS_TEST_DB_PASSWORD yarn migrate
+    '''
+
+    use_vault_if_enabled(config_str)
+
+    env_inject_secrets_mock.assert_called_with(
+        'root/path',
+        silent=False,
+        cache_ttl=None,
+        keys=set(['BOSS_TEST_DEPLOY_USER', 'BOSS_TEST_DB_PASSWORD'])
+    )
+
+
+@patch('boss.core.vault.env_inject_secrets')
+def test_use_vault_if_enabled_with_referenced_only_skips_vault(env_inject_secrets_mock):
+    '''
+    Test use_vault_if_enabled() skips vault if the secrets referenced
+    are all set already, or if there are none.
+    '''
+    config_str = '''
+    user: ${BOSS_TEST_DEPLOY_USER}
+    vault:
+        enabled: true
+        referenced_only: true
+    '''
+
+    with patch.dict('os.environ', {'BOSS_TEST_DEPLOY_USER': 'deployer'}):
+        use_vault_if_enabled(config_str)
+
+    use_vault_if_enabled(config_str.replace('${BOSS_TEST_DEPLOY_USER}', 'app'))
+
+    env_inject_secrets_mock.assert_not_called()
+
+
 @patch('boss.core.vault.read_secrets')
 def test_use_vault_if_enabled_with_stage(read_secrets_mock):
     '''
@@ -467,3 +683,116 @@ def test_use_vault_if_enabled_when_not_enabled(read_secrets_mock):
 
     # Teardown
     os.environ['TEST_USER'] = ''
+
+
+def test_get_hosts_with_single_host():
+    ''' Test get_hosts() returns a list for a single host. '''
+    assert get_hosts({'host': 'example.com'}) == ['example.com']
+
+
+def test_get_hosts_with_multiple_hosts():
+    ''' Test get_hosts() returns all the hosts if a list of hosts is configured. '''
+    stage_config = {'host': ['web1.example.com', 'web2.example.com']}
+
+    assert get_hosts(stage_config) == ['web1.example.com', 'web2.example.com']
+
+
+def test_get_hosts_without_host():
+    ''' Test get_hosts() returns an empty list if host is not configured. '''
+    assert get_hosts({}) == []
+
+
+def test_get_hosts_filtered_by_pattern():
+    ''' Test get_hosts() filters the hosts by the pattern. '''
+    stage_config = {'host': ['app1.example.com', 'app2.example.com']}
+
+    assert get_hosts(stage_config, pattern='*2*') == ['app2.example.com']
+
+
+@patch('boss.config._inventories', {})
+@patch('boss.core.fs.read')
+def test_get_stage_hosts_from_inventory(read_mock):
+    ''' Test get_stage_hosts() selects the hosts from the inventory. '''
+    read_mock.return_value = '''
+    [web]
+    app1.example.com user=deploy port=2222
+    app2.example.com
+
+    [workers]
+    worker1.example.com
+    '''
+    stage_config = {'inventory': 'hosts.ini', 'group': 'web'}
+
+    assert get_stage_hosts(stage_config) == [
+        {'name': 'app1.example.com', 'user': 'deploy', 'port': 2222},
+        {'name': 'app2.example.com'}
+    ]
+    assert get_hosts(stage_config, 'workers') == ['worker1.example.com']
+    assert get_hosts(stage_config, 'all', 'app2*') == ['app2.example.com']
+    read_mock.assert_called_once_with('hosts.ini')
+
+
+VAULT_BOSS_YAML = '''
+user: ${BOSS_TEST_VAULT_USER}
+vault:
+    enabled: true
+    silent: true
+stages:
+    dev:
+        host: dev.example.com
+'''
+
+
+@patch('boss.config.resolve_dotenv_file')
+@patch('boss.core.vault.read_secrets')
+@patch('boss.core.fs.read')
+def test_prepare_defers_loading_the_config(read_mock, read_secrets_mock, dotenv_mock):
+    '''
+    Test prepare() loads the config only when it's first used,
+    and the secrets only when they're injected.
+    '''
+    read_mock.return_value = VAULT_BOSS_YAML
+    read_secrets_mock.return_value = {'BOSS_TEST_VAULT_USER': 'vault-user'}
+
+    outline = prepare('test.yml', 'dev')
+
+    assert outline['stages'].keys() == ['dev']
+    assert outline['user'] == '${BOSS_TEST_VAULT_USER}'
+    dotenv_mock.assert_not_called()
+    read_secrets_mock.assert_not_called()
+
+    assert get_stage_config('dev')['host'] == 'dev.example.com'
+    dotenv_mock.assert_called_once_with('', 'dev')
+    read_secrets_mock.assert_not_called()
+
+    inject_secrets()
+
+    assert get_stage_config('dev')['user'] == 'vault-user'
+    assert get()['user'] == 'vault-user'
+    read_secrets_mock.assert_called_once_with('secret')
+
+    del os.environ['BOSS_TEST_VAULT_USER']
+
+
+@patch('boss.core.vault.read_secrets')
+@patch('boss.core.fs.read')
+def test_inject_secrets_over_the_env_vars(read_mock, read_secrets_mock):
+    '''
+    Test the secrets from vault take precedence over the env vars already set,
+    for the config and for the commands run afterwards alike.
+    '''
+    read_mock.return_value = VAULT_BOSS_YAML
+    read_secrets_mock.return_value = {'BOSS_TEST_VAULT_USER': 'vault-user'}
+    os.environ['BOSS_TEST_VAULT_USER'] = 'host-user'
+
+    assert load('test.yml')['user'] == 'host-user'
+    read_secrets_mock.assert_not_called()
+
+    inject_secrets()
+    inject_secrets()
+
+    read_secrets_mock.assert_called_once_with('secret')
+    assert get()['user'] == 'vault-user'
+    assert os.environ['BOSS_TEST_VAULT_USER'] == 'vault-user'
+
+    del os.environ['BOSS_TEST_VAULT_USER']
@@ -0,0 +1,62 @@
+''' Tests for boss.init module. '''
+
+import os
+from mock import patch
+from pytest import yield_fixture
+from fabric.api import env
+
+from boss import init
+from boss.api.deployment import buildman
+from boss.config import prepare, inject_secrets
+
+VAULT_BOSS_YAML = '''
+user: ${BOSS_TEST_INIT_USER}
+vault:
+    enabled: true
+    silent: true
+stages:
+    dev:
+        host: dev.example.com
+        port: 2222
+'''
+
+
+@yield_fixture(autouse=True)
+def config_cache(tmpdir):
+    ''' Use a temporary directory for the config cache and keep the env. '''
+    cache_dir = str(tmpdir.join('config'))
+
+    with patch('boss.config.BOSS_CONFIG_CACHE_PATH', cache_dir), \
+            patch('boss.config._pending_load', None), \
+            patch('boss.config._pending_secrets', None), \
+            patch('boss.config._config'), \
+            patch.dict(env, {}), \
+            patch.dict(os.environ, {}):
+        yield cache_dir
+
+
+@patch('boss.config.resolve_dotenv_file')
+@patch('boss.core.vault.read_secrets')
+@patch('boss.core.fs.read', return_value=VAULT_BOSS_YAML)
+@patch('boss.api.deployment.buildman.shell.get_stage', return_value='dev')
+@patch('boss.init.get_stage', return_value='dev')
+def test_configure_env_without_vault(_, __, ___, read_secrets_mock, ____):
+    '''
+    Test configure_env() and the read-only tasks, ie: the ones listing the
+    builds, use the config without reading the secrets from vault.
+    '''
+    read_secrets_mock.return_value = {'BOSS_TEST_INIT_USER': 'vault-user'}
+    prepare('test.yml', 'dev')
+
+    init.configure_env()
+
+    assert env.hosts == ['dev.example.com']
+    assert env.port == 2222
+    assert buildman.get_deploy_dir() == '~/deployment'
+    read_secrets_mock.assert_not_called()
+
+    # The secrets are read only once a task needs them.
+    inject_secrets()
+
+    read_secrets_mock.assert_called_once_with('secret')
+    assert os.environ['BOSS_TEST_INIT_USER'] == 'vault-user'
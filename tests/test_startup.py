@@ -0,0 +1,107 @@
+''' Startup time benchmarks for `fab -l` and `boss --version`. '''
+
+import os
+import sys
+import json
+import shutil
+from tempfile import mkdtemp
+from subprocess import Popen, PIPE
+
+from boss import BASE_PATH
+
+# Time budget (in seconds) for each of the commands to start up and finish.
+STARTUP_BUDGET = 1.5
+
+# The dependencies that shouldn't be imported until they're used.
+HEAVY_MODULES = [
+    'requests', 'hvac', 'inquirer', 'terminaltables', 'yaml', 'dotenv'
+]
+
+BENCHMARK_SCRIPT = '''
+import sys, json, time
+
+start = time.time()
+sys.argv = {argv!r}
+
+from {module} import main
+
+try:
+    main()
+except SystemExit:
+    pass
+
+sys.stderr.write(json.dumps({{
+    'elapsed': time.time() - start,
+    'modules': [x for x in {modules!r} if x in sys.modules]
+}}))
+'''
+
+SAMPLE_BOSS_YAML = '''
+project_name: test-project
+vault:
+    enabled: true
+stages:
+    dev:
+        host: dev.example.com
+        user: ${DEV_USER}
+'''
+
+
+def benchmark(module, argv, cwd):
+    ''' Run the command's main() in a new interpreter and measure it. '''
+    script = BENCHMARK_SCRIPT.format(
+        module=module,
+        argv=argv,
+        modules=HEAVY_MODULES
+    )
+    env = dict(
+        os.environ,
+        HOME=cwd,
+        PYTHONPATH=os.path.dirname(BASE_PATH)
+    )
+    process = Popen(
+        [sys.executable, '-c', script],
+        cwd=cwd, env=env, stdout=PIPE, stderr=PIPE
+    )
+    (_, err) = process.communicate()
+
+    return json.loads(err.strip().splitlines()[-1])
+
+
+def test_fab_list_startup():
+    '''
+    Test `fab -l` lists the tasks within the budget, without importing
+    the heavy dependencies or reading the secrets from vault.
+    '''
+    cwd = mkdtemp()
+
+    try:
+        shutil.copy(
+            os.path.join(BASE_PATH, 'misc/fabfile.py_template'),
+            os.path.join(cwd, 'fabfile.py')
+        )
+
+        with open(os.path.join(cwd, 'boss.yml'), 'w') as f:
+            f.write(SAMPLE_BOSS_YAML)
+
+        # The first run compiles the config and caches it.
+        benchmark('fabric.main', ['fab', '-l'], cwd)
+        result = benchmark('fabric.main', ['fab', '-l'], cwd)
+    finally:
+        shutil.rmtree(cwd)
+
+    assert result['modules'] == []
+    assert result['elapsed'] < STARTUP_BUDGET
+
+
+def test_boss_version_startup():
+    ''' Test `boss --version` runs within the budget. '''
+    cwd = mkdtemp()
+
+    try:
+        result = benchmark('boss.cli', ['boss', '--version'], cwd)
+    finally:
+        shutil.rmtree(cwd)
+
+    assert result['modules'] == []
+    assert result['elapsed'] < STARTUP_BUDGET
@@ -0,0 +1,174 @@
+''' Tests for boss.state module. '''
+
+import os
+import time
+from threading import Thread, Event
+from mock import Mock, patch
+
+from boss import state
+
+
+def make_connections(active=True):
+    ''' Create a mock of fabric's connection cache. '''
+    connections = {}
+
+    def connect(host_string):
+        client = Mock()
+        client.get_transport.return_value.is_active.return_value = active
+        connections[host_string] = client
+
+    return Mock(
+        __contains__=Mock(side_effect=lambda x: x in connections),
+        __getitem__=Mock(side_effect=lambda x: connections[x]),
+        connect=Mock(side_effect=connect)
+    )
+
+
+@patch('fabric.state.env', Mock(keepalive=0))
+def test_get_connection_connects_once_for_each_host():
+    ''' Test get_connection() reuses the active connection of the host. '''
+    connections = make_connections()
+    stats = state.get_connection_stats()
+
+    with patch('fabric.state.connections', connections):
+        client = state.get_connection('user@host-a')
+
+        assert state.get_connection('user@host-a') is client
+        assert state.get_connection('user@host-b') is not client
+
+    assert connections.connect.call_count == 2
+    client.get_transport.return_value.set_keepalive.assert_called_with(
+        state.KEEPALIVE_INTERVAL
+    )
+
+    result = state.get_connection_stats()
+    assert result['ssh']['hits'] == stats['ssh']['hits'] + 1
+    assert result['ssh']['misses'] == stats['ssh']['misses'] + 2
+
+
+@patch('fabric.state.env', Mock(keepalive=0))
+def test_get_connection_reconnects_if_inactive():
+    ''' Test get_connection() connects again if the connection was dropped. '''
+    connections = make_connections(active=False)
+
+    with patch('fabric.state.connections', connections):
+        state.get_connection('user@host-c')
+        state.get_connection('user@host-c')
+
+    assert connections.connect.call_count == 2
+
+
+def test_acquire_sftp_is_thread_safe():
+    '''
+    Test acquire_sftp() never hands the same session
+    to multiple threads at the same time.
+    '''
+    host_string = 'user@host-d'
+    in_use = set()
+    errors = []
+
+    def open_sftp():
+        return Mock(**{'get_channel.return_value.closed': False})
+
+    def work():
+        for _ in range(50):
+            sftp = state.acquire_sftp(host_string, open_sftp)
+
+            if id(sftp) in in_use:
+                errors.append(sftp)
+
+            in_use.add(id(sftp))
+            time.sleep(0.0001)
+            in_use.discard(id(sftp))
+            state.release_sftp(host_string, sftp)
+
+    threads = [Thread(target=work) for _ in range(8)]
+
+    for t in threads:
+        t.start()
+
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(state._sftp_pools[host_string]) <= 8
+
+
+def test_close_connections():
+    ''' Test close_connections() closes all of the sessions. '''
+    sftp = state.acquire_sftp('user@host-e', Mock)
+    broken = state.acquire_sftp('user@host-e', Mock)
+    broken.close.side_effect = EOFError()
+
+    state.close_connections()
+
+    sftp.close.assert_called_once_with()
+    assert state._sftp_pools == {}
+    assert state._sftp_sessions == []
+
+
+def test_get_does_not_copy_the_state():
+    ''' Test get() returns the live objects in the state. '''
+    assert state.get('shell_sessions') is state._shell_sessions
+    assert state.get('host_filter') is state._state['host_filter']
+
+
+@patch('fabric.state.env', Mock(host_string='user@host-f'))
+def test_timings():
+    ''' Test the timings of the local and the host phases are recorded. '''
+    state.start_timings()
+    state.record_timing('build', 2.0, local=True)
+    state.record_timing('upload', 1.0, upload_bytes=100)
+    state.record_timing('upload', 0.5, upload_bytes=50)
+    state.record_timing('upload', 3.0, host_string='user@host-g')
+
+    with state.timed('extract'):
+        pass
+
+    timings = state.get_timings()
+    state.stop_timings()
+
+    assert timings['build'] == 2.0
+    assert timings['upload'] == 1.5
+    assert timings['upload_bytes'] == 150
+    assert timings['extract'] >= 0
+    assert timings['total'] >= 0
+    assert state.get_timings() == {}
+
+
+def test_registry_is_reset_after_fork():
+    '''
+    Test the sessions and the locks of the parent process aren't used in
+    a forked process, even if a lock is held by another thread at the fork.
+    '''
+    acquired = Event()
+    release = Event()
+
+    def hold():
+        with state.host_lock('user@host-h'):
+            acquired.set()
+            release.wait()
+
+    thread = Thread(target=hold)
+    thread.start()
+    acquired.wait()
+    state.get('shell_sessions')['user@host-h'] = Mock()
+
+    pid = os.fork()
+
+    if pid == 0:
+        reset = False
+
+        try:
+            with state.host_lock('user@host-h'):
+                reset = state.get('shell_sessions') == {}
+        finally:
+            os._exit(0 if reset else 1)
+
+    (_, status) = os.waitpid(pid, 0)
+    release.set()
+    thread.join()
+
+    assert status == 0
+    assert 'user@host-h' in state.get('shell_sessions')
+    del state.get('shell_sessions')['user@host-h']
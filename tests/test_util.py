@@ -0,0 +1,38 @@
+''' Tests for boss.util module. '''
+
+from fabric.api import settings, hide
+from boss.util import host_print
+
+
+def test_host_print_remote(capsys):
+    ''' Test host_print() prints the message locally prefixed with the host. '''
+    with settings(host_string='user@example.com'):
+        host_print('Hello\nWorld')
+
+    (out, _) = capsys.readouterr()
+
+    assert out == (
+        '[user@example.com] out: \n' +
+        '[user@example.com] out: Hello\n' +
+        '[user@example.com] out: World\n'
+    )
+
+
+def test_host_print_local(capsys):
+    ''' Test host_print() prints the message without the prefix locally. '''
+    with settings(host_string='user@example.com'):
+        host_print('Hello', remote=False)
+
+    (out, _) = capsys.readouterr()
+
+    assert out == '\nHello\n'
+
+
+def test_host_print_hidden(capsys):
+    ''' Test host_print() doesn't print anything if the output is hidden. '''
+    with hide('stdout'):
+        host_print('Hello')
+
+    (out, _) = capsys.readouterr()
+
+    assert out == ''